@@ -0,0 +1,105 @@
+"""Cost of matching listed paths against a `--base-path` pattern
+
+Matches synthetic paths like ``/dataset-12/run-3/sample-0042.csv`` against
+patterns with exact, prefix (``abc%``), suffix (``%abc``), contains
+(``%abc%``) and glob segments and prints the time per million paths for:
+
+* the old `is_path_matched`, which split the pattern on every call,
+* `is_path_matched` as it is now, with the pattern compiled once,
+* calling a `filters.PathPattern` directly.
+
+Run from the repository root::
+
+    python benchmarks/path_match.py --paths 1000000
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from osfclient.filters import PathPattern  # noqa: E402
+from osfclient.utils import is_path_matched  # noqa: E402
+
+
+PATTERNS = ['/dataset-1/run-2/',
+            '/dataset-1%/run-2/',
+            '/%-7/%-3/',
+            '/%set-1%/%un%/%.csv',
+            '/dataset-[12]/run-*/sample-00??.csv']
+
+
+def _old_is_path_matched(target_file_path, fileobj):
+    """`is_path_matched` before patterns were compiled."""
+    file_path = fileobj['attributes']['materialized_path']
+    if target_file_path is None:
+        return True
+    file_path_segs = file_path.split('/')
+    target_file_path_segs = target_file_path.split('/')
+    if file_path_segs[-1] == '':
+        file_path_segs = file_path_segs[:-1]
+    if target_file_path_segs[-1] == '':
+        target_file_path_segs = target_file_path_segs[:-1]
+    for target_file_path_seg, file_path_seg in zip(target_file_path_segs,
+                                                   file_path_segs):
+        if target_file_path_seg.startswith('%') and \
+           target_file_path_seg.endswith('%'):
+            if target_file_path_seg[1:-1] not in file_path_seg:
+                return False
+        elif target_file_path_seg.startswith('%'):
+            if not file_path_seg.endswith(target_file_path_seg[1:]):
+                return False
+        elif target_file_path_seg.endswith('%'):
+            if not file_path_seg.startswith(target_file_path_seg[:-1]):
+                return False
+        else:
+            if file_path_seg != target_file_path_seg:
+                return False
+    return True
+
+
+def _children(n_paths):
+    """`n_paths` listing entries below 100 datasets with 10 runs each."""
+    per_run = max(n_paths // 1000, 1)
+    children = []
+    for i in range(n_paths):
+        run, sample = divmod(i, per_run)
+        dataset, run = divmod(run, 10)
+        path = '/dataset-{}/run-{}/sample-{:04d}.csv'.format(dataset, run,
+                                                             sample)
+        children.append({'attributes': {'materialized_path': path}})
+    return children
+
+
+def _timed(func, children):
+    start = time.time()
+    matched = sum(1 for child in children if func(child))
+    return time.time() - start, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--paths', type=int, default=1000000,
+                        help='Number of synthetic paths (default 1000000)')
+    args = parser.parse_args()
+
+    children = _children(args.paths)
+    scale = 1e6 / len(children)
+    print('{:<40} {:>9} {:>9} {:>9} {:>9}'.format(
+        'pattern', 'matched', 'old s/M', 'cached', 'compiled'))
+    for pattern in PATTERNS:
+        old, matched = _timed(
+            lambda child: _old_is_path_matched(pattern, child), children)
+        cached, _ = _timed(
+            lambda child: is_path_matched(pattern, child), children)
+        compiled, n = _timed(PathPattern(pattern), children)
+        assert n == matched or '[' in pattern or '*' in pattern
+        print('{:<40} {:>9} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+            pattern, n, old * scale, cached * scale, compiled * scale))
+
+
+if __name__ == '__main__':
+    main()
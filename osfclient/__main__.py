@@ -5,7 +5,9 @@ import argparse
 from textwrap import dedent
 
 from .cli import clone, fetch, list_, makefolder, remove, move, upload, init
+from .cli import apply_
 from . import __version__
+from .hashcache import default_path
 
 
 def main():
@@ -23,6 +25,7 @@ def main():
         makefolder Create a new folder
         remove     Remove a file from a project's storage
         move       Move a file to specified location on the project's storage.
+        apply      Run a transfer plan made with --dry-run --json
 
     See 'osf <command> -h' to read about a specific command.
     """)
@@ -38,12 +41,46 @@ def main():
                         help='OSF File Path (Default is /)')
     parser.add_argument('-p', '--project', default=None,
                         help='OSF project ID')
+    parser.add_argument('--limit-rate', default=None, metavar='RATE',
+                        help=('Limit up- and downloads to RATE bytes per '
+                              'second, shared by all transfers (e.g. 2M)'))
+    parser.add_argument('--hash-cache', action='store_true',
+                        help=('Remember hashes of unchanged local files to '
+                              'speed up --update (stored in {})'
+                              .format(default_path())))
+    parser.add_argument('--hash-cache-path', default=None, metavar='DB',
+                        help='Store the hashes of --hash-cache in DB')
     parser.add_argument('-v', '--version', action='version',
                         version='%(prog)s {}'.format(__version__))
     # dest=command stores the name of the command in a variable, this is
     # used later on to retrieve the correct sub-parser
     subparsers = parser.add_subparsers(dest='command')
 
+    def _add_filter_arguments(parser):
+        parser.add_argument('--include', action='append', metavar='GLOB',
+                            help='Only files matching GLOB, e.g. **/*.csv '
+                                 '(repeatable, !GLOB excludes)')
+        parser.add_argument('--exclude', action='append', metavar='GLOB',
+                            help='Skip files and folders matching GLOB '
+                                 '(repeatable)')
+
+    def _add_plan_arguments(parser):
+        parser.add_argument('--dry-run',
+                            help='Only report what would be transferred',
+                            action='store_true')
+        parser.add_argument('--json',
+                            help='With --dry-run print the plan as JSON '
+                                 'for `osf apply`',
+                            action='store_true')
+
+    def _add_cache_arguments(parser):
+        parser.add_argument('--cache', default=None, metavar='DIR',
+                            help='Reuse downloads via a content-addressed '
+                                 'store in DIR')
+        parser.add_argument('--cache-size', default=None, metavar='SIZE',
+                            help='Evict least recently used files to keep '
+                                 'the store below SIZE (e.g. 10G)')
+
     # Clone project
     clone_parser = subparsers.add_parser(
         'clone', description=clone.__doc__,
@@ -54,6 +91,45 @@ def main():
     clone_parser.add_argument('-U', '--update',
                                help='Overwrite only if local and remote files differ',
                                action='store_true')
+    clone_parser.add_argument('--trust-mtime',
+                              help=('With --update, assume local files newer '
+                                    'than the remote file are unchanged'),
+                              action='store_true')
+    clone_parser.add_argument('--dedupe',
+                              help='Download identical files once and '
+                                   'hard-link the copies',
+                              action='store_true')
+    clone_parser.add_argument('--projects', metavar='IDS',
+                              help='Comma separated IDs of projects to clone '
+                                   'into sub-directories of the output')
+    clone_parser.add_argument('--projects-from', metavar='FILE',
+                              help='Clone the projects whose IDs are listed '
+                                   'in FILE, one per line (- for stdin)')
+    clone_parser.add_argument('--children',
+                              help='Also clone all child components',
+                              action='store_true')
+    clone_parser.add_argument('--delete',
+                              help=('Delete local files whose remote file '
+                                    'was removed since the last clone'),
+                              action='store_true')
+    # where the files go, a directory is the default
+    archive_group = clone_parser.add_mutually_exclusive_group()
+    archive_group.add_argument('--archive',
+                               help='Download each storage as one zip '
+                                    'archive and extract it on the fly',
+                               action='store_true')
+    archive_group.add_argument('--to-tar', metavar='FILE',
+                               help='Stream all files into a tar archive '
+                                    'instead of a directory (- for stdout)')
+    archive_group.add_argument('--to-zip', metavar='FILE',
+                               help='Stream all files into a zip archive '
+                                    'instead of a directory (- for stdout)')
+    clone_parser.add_argument('-j', '--jobs', type=int, default=1,
+                              help='Number of files to download concurrently',
+                              metavar='N')
+    _add_cache_arguments(clone_parser)
+    _add_filter_arguments(clone_parser)
+    _add_plan_arguments(clone_parser)
 
     def _add_subparser(name, description, aliases=[]):
         options = {
@@ -76,6 +152,13 @@ def main():
     fetch_parser.add_argument('-U', '--update',
                                help='Overwrite only if local and remote files differ',
                                action='store_true')
+    fetch_parser.add_argument('--trust-mtime',
+                              help=('With --update, assume a local file newer '
+                                    'than the remote file is unchanged'),
+                              action='store_true')
+    _add_cache_arguments(fetch_parser)
+    _add_filter_arguments(fetch_parser)
+    _add_plan_arguments(fetch_parser)
     fetch_parser.add_argument('remote', help='Remote path',
                               default=None)
     fetch_parser.add_argument('local', help='Local path',
@@ -86,6 +169,7 @@ def main():
     list_parser.add_argument('-l', '--long-format',
                               help='Listing in long format',
                               action='store_true')
+    _add_filter_arguments(list_parser)
     list_parser.set_defaults(func=list_)
 
     # Upload a single file or a directory tree
@@ -100,7 +184,21 @@ def main():
     upload_parser.add_argument('-r', '--recursive',
                                help='Recursively upload entire directories',
                                action='store_true')
-    upload_parser.add_argument('source', help='Local file')
+    upload_parser.add_argument('-j', '--jobs', type=int, default=1,
+                               help='Number of files to upload concurrently '
+                                    'in recursive mode',
+                               metavar='N')
+    upload_parser.add_argument('--retries', type=int, default=0,
+                               help='Retry failed uploads N times',
+                               metavar='N')
+    upload_parser.add_argument('--resume',
+                               help=('Keep a journal of uploaded files and '
+                                     'skip them when the recursive upload '
+                                     'is run again'),
+                               action='store_true')
+    _add_plan_arguments(upload_parser)
+    upload_parser.add_argument('source',
+                               help='Local file, - for standard input')
     upload_parser.add_argument('destination', help='Remote file path')
 
     # Create a folder
@@ -122,6 +220,13 @@ def main():
                              help='Force overwriting of target file',
                              action='store_true')
 
+    # Run a transfer plan
+    apply_parser = _add_subparser('apply', apply_.__doc__)
+    apply_parser.set_defaults(func=apply_)
+    apply_parser.add_argument('plan',
+                              help='Plan file written by --dry-run --json, '
+                                   '- for standard input')
+
     # Python2 argparse exits with an error when no command is given
     if six.PY2 and len(sys.argv) == 1:
         parser.print_help()
@@ -1,6 +1,7 @@
 from .exceptions import OSFException
 from .models import OSFCore
 from .models import Project
+from .throttle import set_bandwidth_limit
 
 
 class OSF(OSFCore):
@@ -9,11 +10,17 @@ class OSF(OSFCore):
     This is the main point of contact for interactions with the
     OSF. Use the methods of this class to find projects, login
     to the OSF, etc.
+
+    Set `bandwidth_limit` (bytes per second) to limit the rate of all up-
+    and downloads. The limit is shared by all transfers of this process.
     """
-    def __init__(self, username=None, password=None, token=None, base_url=None):
+    def __init__(self, username=None, password=None, token=None, base_url=None,
+                 bandwidth_limit=None):
         super(OSF, self).__init__({})
         if base_url is not None:
             self.session.set_endpoint(base_url)
+        if bandwidth_limit is not None:
+            set_bandwidth_limit(bandwidth_limit)
         if username is not None and password is not None:
             self.login(username, password)
         elif token is not None:
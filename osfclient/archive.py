@@ -0,0 +1,406 @@
+"""Zip and tar archives streamed to and from the server
+
+WaterButler serves a whole folder as one zip archive. `zipfile` needs to
+seek to the central directory at the end of an archive, `extract_stream`
+instead reads the local headers in order, so files are written while the
+archive is still arriving and nothing is stored twice.
+
+Archives written for streaming put the sizes of an entry in a data
+descriptor after its data. The end of compressed data is found by the
+decompressor, the end of stored data by looking for a descriptor that
+matches the data in front of it.
+
+`TarStreamWriter` and `ZipStreamWriter` go the other way: they write
+downloaded files into an archive on a stream that can not seek, like
+standard output. Member headers use the size the server reports, so files
+go straight from the response into the archive.
+"""
+import os
+import struct
+import tarfile
+import tempfile
+import time
+import zipfile
+import zlib
+
+from .utils import makedirs
+
+
+LOCAL_HEADER = b'PK\x03\x04'
+DATA_DESCRIPTOR = b'PK\x07\x08'
+# signatures of the records after the last entry
+CENTRAL_DIRECTORY = (b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06',
+                     b'PK\x06\x07')
+
+_LOCAL_HEADER = struct.Struct('<HHHHHIIIHH')
+
+# general purpose flags
+_HAS_DESCRIPTOR = 0x08
+_UTF8 = 0x800
+
+_ZIP64 = 0x0001
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Stream(object):
+    """Read exact amounts from `fp` and push back what was read too far."""
+    def __init__(self, fp):
+        self._fp = fp
+        self._buffer = b''
+
+    def read(self, n=CHUNK_SIZE):
+        """Up to `n` bytes, fewer only at the end of the stream."""
+        data = self._buffer
+        while len(data) < n:
+            chunk = self._fp.read(max(n - len(data), CHUNK_SIZE))
+            if not chunk:
+                break
+            data += chunk
+        self._buffer = data[n:]
+        return data[:n]
+
+    def read_exactly(self, n):
+        data = self.read(n)
+        if len(data) != n:
+            raise zipfile.BadZipfile('Archive ends unexpectedly.')
+        return data
+
+    def unread(self, data):
+        self._buffer = data + self._buffer
+
+
+def _entry_name(raw, flags):
+    name = raw.decode('utf-8' if flags & _UTF8 else 'cp437')
+    return name.replace('\\', '/')
+
+
+def _zip64_sizes(extra):
+    """(uncompressed, compressed) sizes from a zip64 extra field or None."""
+    while len(extra) >= 4:
+        header_id, size = struct.unpack('<HH', extra[:4])
+        if header_id == _ZIP64 and size >= 16:
+            return struct.unpack('<QQ', extra[4:20])
+        extra = extra[4 + size:]
+    return None
+
+
+def _safe_path(dest, name):
+    """Local path of the entry `name` below `dest`."""
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or '..' in parts or os.path.isabs(name) or ':' in parts[0]:
+        raise zipfile.BadZipfile('Unsafe path in archive: {}'.format(name))
+    return os.path.join(dest, *parts)
+
+
+class _Entry(object):
+    def __init__(self, stream, name, flags, method, crc, compressed_size,
+                 size, zip64):
+        self._stream = stream
+        self.name = name
+        self.method = method
+        self._flags = flags
+        self._crc = crc
+        self._compressed_size = compressed_size
+        self.size = size
+        self._zip64 = zip64
+        self._chunks = None
+
+    @property
+    def is_dir(self):
+        return self.name.endswith('/')
+
+    def _descriptor(self):
+        """Read the data descriptor, return (crc, compressed size, size)."""
+        fmt = '<IQQ' if self._zip64 else '<III'
+        head = self._stream.read_exactly(4)
+        if head != DATA_DESCRIPTOR:
+            # the signature is optional
+            self._stream.unread(head)
+        return struct.unpack(fmt, self._stream.read_exactly(
+            struct.calcsize(fmt)))
+
+    def _compressed_chunks(self):
+        """Yield the compressed data, read up to the end of the entry."""
+        if not self._flags & _HAS_DESCRIPTOR:
+            left = self._compressed_size
+            while left:
+                chunk = self._stream.read_exactly(min(left, CHUNK_SIZE))
+                left -= len(chunk)
+                yield chunk
+
+    def _deflated(self):
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        if self._flags & _HAS_DESCRIPTOR:
+            # the end of the data is where the deflate stream ends
+            while not decompressor.eof:
+                chunk = self._stream.read()
+                if not chunk:
+                    raise zipfile.BadZipfile('Archive ends unexpectedly.')
+                data = decompressor.decompress(chunk)
+                if data:
+                    yield data
+            self._stream.unread(decompressor.unused_data)
+        else:
+            for chunk in self._compressed_chunks():
+                data = decompressor.decompress(chunk)
+                if data:
+                    yield data
+        data = decompressor.flush()
+        if data:
+            yield data
+
+    def _stored_until_descriptor(self):
+        """Stored data of unknown size, ends with a matching descriptor."""
+        fmt = '<IQQ' if self._zip64 else '<III'
+        size = struct.calcsize(fmt)
+        crc = 0
+        n_bytes = 0
+        pending = b''
+        while True:
+            chunk = self._stream.read()
+            if not chunk:
+                raise zipfile.BadZipfile('Archive ends unexpectedly.')
+            pending += chunk
+            start = 0
+            while True:
+                index = pending.find(DATA_DESCRIPTOR, start)
+                if index < 0 or len(pending) < index + 4 + size:
+                    break
+                data = pending[:index]
+                found = struct.unpack(fmt, pending[index + 4:
+                                                   index + 4 + size])
+                if found[1] == n_bytes + len(data) and \
+                   found[0] == zlib.crc32(data, crc) & 0xffffffff:
+                    self._stream.unread(pending[index + 4 + size:])
+                    self._crc, self._compressed_size, self.size = found
+                    if data:
+                        yield data
+                    return
+                start = index + 1
+            # keep what could be the start of a descriptor
+            keep = index if 0 <= index else max(len(pending) - 3, 0)
+            data, pending = pending[:keep], pending[keep:]
+            if data:
+                crc = zlib.crc32(data, crc)
+                n_bytes += len(data)
+                yield data
+
+    def chunks(self):
+        """Iterator over the uncompressed contents, checks their CRC-32.
+
+        Can only be read once, calling it again continues where the last
+        iterator stopped.
+        """
+        if self._chunks is None:
+            self._chunks = self._read()
+        return self._chunks
+
+    def _read(self):
+        if self.method == zipfile.ZIP_DEFLATED:
+            data = self._deflated()
+        elif self.method != zipfile.ZIP_STORED:
+            raise zipfile.BadZipfile('Unsupported compression method {} '
+                                     'of {}.'.format(self.method, self.name))
+        elif self._flags & _HAS_DESCRIPTOR:
+            data = self._stored_until_descriptor()
+        else:
+            data = self._compressed_chunks()
+
+        crc = 0
+        for chunk in data:
+            crc = zlib.crc32(chunk, crc)
+            yield chunk
+
+        if self._flags & _HAS_DESCRIPTOR and \
+           self.method != zipfile.ZIP_STORED:
+            self._crc, self._compressed_size, self.size = self._descriptor()
+        if crc & 0xffffffff != self._crc:
+            raise zipfile.BadZipfile('Bad CRC-32 for {}.'.format(self.name))
+
+
+def iter_entries(fp):
+    """Yield the entries of the zip archive read from the stream `fp`.
+
+    The contents of an entry can only be read with its `chunks()` until
+    the next entry is requested.
+    """
+    stream = _Stream(fp)
+    while True:
+        signature = stream.read(4)
+        if not signature or signature in CENTRAL_DIRECTORY:
+            return
+        if signature != LOCAL_HEADER:
+            raise zipfile.BadZipfile('Not a zip archive.')
+        (_, flags, method, _, _, crc, compressed_size, size, name_length,
+         extra_length) = _LOCAL_HEADER.unpack(
+             stream.read_exactly(_LOCAL_HEADER.size))
+        name = _entry_name(stream.read_exactly(name_length), flags)
+        extra = stream.read_exactly(extra_length)
+        zip64 = _zip64_sizes(extra)
+        if zip64 is not None:
+            size, compressed_size = zip64
+        entry = _Entry(stream, name, flags, method, crc, compressed_size,
+                       size, zip64 is not None)
+        yield entry
+        # skip what the caller did not read
+        for _ in entry.chunks():
+            pass
+
+
+def extract_stream(fp, dest, progress=None):
+    """Extract the zip archive read from the stream `fp` below `dest`.
+
+    Entries are written as they arrive, `progress` is called with the
+    number of bytes written. Returns the paths of the extracted files.
+    """
+    paths = []
+    for entry in iter_entries(fp):
+        path = _safe_path(dest, entry.name)
+        if entry.is_dir:
+            makedirs(path, exist_ok=True)
+            continue
+        makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            for chunk in entry.chunks():
+                f.write(chunk)
+                if progress is not None:
+                    progress(len(chunk))
+        paths.append(path)
+    return paths
+
+
+# files of unknown size are spooled to disk above this size
+SPOOL_SIZE = 16 * 2**20
+
+
+class _SizedWriter(object):
+    """Binary writer calling `write` that expects exactly `size` bytes."""
+    mode = 'wb'
+
+    def __init__(self, write, name, size):
+        self._write = write
+        self._name = name
+        self._size = size
+        self.n_bytes = 0
+
+    def write(self, data):
+        self.n_bytes += len(data)
+        if self.n_bytes > self._size:
+            raise RuntimeError('{} is larger than the {} bytes the server '
+                               'reported.'.format(self._name, self._size))
+        self._write(data)
+
+    def check(self):
+        if self.n_bytes != self._size:
+            raise RuntimeError('{} is {} bytes instead of the {} the server '
+                               'reported.'.format(self._name, self.n_bytes,
+                                                  self._size))
+
+
+class _Writer(object):
+    """Binary writer to `fp` that can not seek."""
+    mode = 'wb'
+
+    def __init__(self, fp):
+        self._fp = fp
+
+    def write(self, data):
+        self._fp.write(data)
+        # python 2 files return None
+        return len(data)
+
+    def flush(self):
+        self._fp.flush()
+
+
+def _spool(write):
+    """Temporary file with what `write` writes and its size."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    write(_Writer(spool))
+    size = spool.tell()
+    spool.seek(0)
+    return spool, size
+
+
+class TarStreamWriter(object):
+    """Write a tar archive to the stream `fp`, one member at a time."""
+    def __init__(self, fp):
+        self._fp = fp
+        self._offset = 0
+
+    def _write(self, data):
+        self._fp.write(data)
+        self._offset += len(data)
+
+    def _pad(self, size):
+        remainder = self._offset % size
+        if remainder:
+            self._write(b'\0' * (size - remainder))
+
+    def add(self, name, size, mtime, write):
+        """Add the file `name` of `size` bytes modified at `mtime`.
+
+        `write` is called with a binary file object to write the contents
+        to. Contents of unknown `size` (None) are spooled first.
+        """
+        spool = None
+        if size is None:
+            spool, size = _spool(write)
+
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        self._write(info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'strict'))
+
+        writer = _SizedWriter(self._write, name, size)
+        if spool is None:
+            write(writer)
+        else:
+            with spool:
+                for chunk in iter(lambda: spool.read(CHUNK_SIZE), b''):
+                    writer.write(chunk)
+        writer.check()
+        self._pad(tarfile.BLOCKSIZE)
+
+    def close(self):
+        """Write the end of archive marker."""
+        self._write(b'\0' * (2 * tarfile.BLOCKSIZE))
+        self._pad(tarfile.RECORDSIZE)
+        self._fp.flush()
+
+
+class ZipStreamWriter(object):
+    """Write a zip archive to the stream `fp`, one member at a time.
+
+    Members are stored without compression, their sizes and CRC-32 follow
+    the data in data descriptors.
+    """
+    def __init__(self, fp):
+        self._zip = zipfile.ZipFile(_Writer(fp), 'w', zipfile.ZIP_STORED,
+                                    allowZip64=True)
+
+    def add(self, name, size, mtime, write):
+        """Add the file `name` of `size` bytes modified at `mtime`.
+
+        `write` is called with a binary file object to write the contents
+        to. `size` may be None if it is unknown.
+        """
+        # zip can not store dates before 1980
+        date_time = time.localtime(max(mtime, 315532800))[:6]
+        info = zipfile.ZipInfo(name, date_time=date_time)
+        info.compress_type = zipfile.ZIP_STORED
+        info.external_attr = 0o644 << 16
+        info.file_size = size or 0
+        with self._zip.open(info, 'w', force_zip64=size is None) as dest:
+            if size is None:
+                write(_Writer(dest))
+            else:
+                writer = _SizedWriter(dest.write, name, size)
+                write(writer)
+                writer.check()
+
+    def close(self):
+        """Write the central directory."""
+        self._zip.close()
@@ -0,0 +1,248 @@
+"""Content-addressed store of downloaded files
+
+Files on the OSF come with md5 and sha256 hashes. A `BlobStore` keeps a
+copy of every file it has seen, named after its hash, so downloading the
+same content again (in another project, another clone or another CI run)
+becomes a local hard link or copy.
+
+The store is safe to share between processes on one host: blobs are
+written to a temporary name and renamed into place, eviction holds an
+exclusive lock on the store. Each store keeps a running total of what it
+added, the store is only scanned when that total exceeds its size limit.
+"""
+import errno
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # no advisory locking on Windows, concurrent evictions are still safe
+    # as removing a blob twice is not an error
+    fcntl = None
+
+from .utils import link_or_copy
+from .utils import makedirs
+
+
+# prefer the stronger hash if the provider supplies both
+HASH_TYPES = ('sha256', 'md5')
+
+# eviction makes room down to this fraction of `max_size`, so a full store
+# is not scanned again for every blob added
+LOW_WATER = 0.9
+
+
+class BlobStore(object):
+    """Local content-addressed store keyed by remote file hashes.
+
+    Blobs live in `root` as ``<hash_type>/<first two digits>/<digest>``.
+    When `max_size` (in bytes) is set, the least recently used blobs are
+    removed once the blobs added push the store over it. Blobs that are
+    also hard-linked elsewhere do not count and are kept, removing them
+    would not free any space.
+
+    Retrieved blobs are hard-linked to their destination where possible.
+    Blobs are read-only so a hard-linked file can not be modified by
+    accident, which would corrupt the store.
+    """
+    def __init__(self, root, max_size=None):
+        self.root = os.path.abspath(root)
+        self.max_size = max_size
+        makedirs(self.root, exist_ok=True)
+        # bytes only the store holds, None until the store was scanned
+        self._held = None
+        self._held_lock = threading.Lock()
+
+    def _key(self, hashes):
+        """Pick the hash type and digest to store a file under."""
+        if not hashes:
+            return None
+        for hash_type in HASH_TYPES:
+            digest = hashes.get(hash_type)
+            if digest:
+                return hash_type, digest.lower()
+        return None
+
+    def _path(self, hash_type, digest):
+        return os.path.join(self.root, hash_type, digest[:2], digest)
+
+    def path_for(self, hashes):
+        """Path of the blob for a file with `hashes` or None if not stored."""
+        key = self._key(hashes)
+        if key is None:
+            return None
+        path = self._path(*key)
+        if os.path.exists(path):
+            return path
+        return None
+
+    def _touch(self, path):
+        # use the access time to track usage, the modification time is
+        # shared with all hard links and should reflect the content
+        try:
+            st = os.stat(path)
+            os.utime(path, (time.time(), st.st_mtime))
+        except OSError:
+            pass
+
+    def get(self, hashes, dest):
+        """Create `dest` from the store. Returns False on a cache miss."""
+        path = self.path_for(hashes)
+        if path is None:
+            return False
+
+        if os.path.lexists(dest):
+            os.remove(dest)
+        try:
+            link_or_copy(path, dest)
+        except (IOError, OSError) as e:
+            # evicted by another process after we looked
+            if e.errno == errno.ENOENT:
+                return False
+            raise
+        self._touch(path)
+        return True
+
+    def open(self, hashes):
+        """Open the blob for reading. Returns None on a cache miss."""
+        path = self.path_for(hashes)
+        if path is None:
+            return None
+        try:
+            fp = open(path, 'rb')
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+        self._touch(path)
+        return fp
+
+    def writer(self, hashes):
+        """Return a writer that adds content with `hashes` to the store.
+
+        Returns None if `hashes` contains no usable digest.
+        """
+        key = self._key(hashes)
+        if key is None:
+            return None
+        return BlobWriter(self, key[0], key[1])
+
+    def add(self, path, hashes):
+        """Add the local file at `path` which should have `hashes`.
+
+        Returns False if the content does not match the hashes.
+        """
+        writer = self.writer(hashes)
+        if writer is None:
+            return False
+        with open(path, 'rb') as fp:
+            shutil.copyfileobj(fp, writer, 1024 * 1024)
+        return writer.commit()
+
+    def _lock(self):
+        lock = open(os.path.join(self.root, '.lock'), 'a')
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        return lock
+
+    def _blobs(self):
+        for hash_type in HASH_TYPES:
+            for dirpath, _, fnames in os.walk(os.path.join(self.root,
+                                                           hash_type)):
+                for fname in fnames:
+                    if fname.startswith('.'):
+                        continue
+                    path = os.path.join(dirpath, fname)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st
+
+    def size(self):
+        """Total size of all blobs in bytes."""
+        return sum(st.st_size for _, st in self._blobs())
+
+    def _added(self, size):
+        """Count a new blob of `size` bytes, evict if the store is full."""
+        if self.max_size is None:
+            return
+        with self._held_lock:
+            if self._held is not None:
+                self._held += size
+                if self._held <= self.max_size:
+                    return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used blobs until the store fits `max_size`."""
+        if self.max_size is None:
+            return
+        lock = self._lock()
+        try:
+            blobs = sorted(((path, st) for path, st in self._blobs()
+                            if st.st_nlink == 1),
+                           key=lambda b: b[1].st_atime)
+            total = sum(st.st_size for _, st in blobs)
+            if total > self.max_size:
+                for path, st in blobs:
+                    if total <= self.max_size * LOW_WATER:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= st.st_size
+        finally:
+            lock.close()
+        with self._held_lock:
+            self._held = total
+
+
+class BlobWriter(object):
+    """Stream content into a `BlobStore`.
+
+    Data is written to a temporary file next to its final location and
+    hashed on the way. `commit()` moves it into place if the digest
+    matches, `abort()` throws it away.
+    """
+    def __init__(self, store, hash_type, digest):
+        self.store = store
+        self.digest = digest
+        self._path = store._path(hash_type, digest)
+        directory = os.path.dirname(self._path)
+        makedirs(directory, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        self._fp = os.fdopen(fd, 'wb')
+        self._hash = hashlib.new(hash_type)
+        self._n_bytes = 0
+
+    def write(self, data):
+        self._fp.write(data)
+        self._hash.update(data)
+        self._n_bytes += len(data)
+
+    def commit(self):
+        self._fp.close()
+        if self._hash.hexdigest() != self.digest:
+            self.abort()
+            return False
+        os.chmod(self._tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        # atomic, if another process stored the same blob in the meantime
+        # one of the identical copies wins
+        os.rename(self._tmp_path, self._path)
+        self.store._added(self._n_bytes)
+        return True
+
+    def abort(self):
+        self._fp.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
@@ -8,7 +8,9 @@ from functools import wraps
 import getpass
 import os
 import sys
+import time
 
+import six
 from six.moves import configparser
 from six.moves import input
 
@@ -17,8 +19,20 @@ import dateutil.parser
 from tzlocal import get_localzone
 
 from .api import OSF
+from .archive import TarStreamWriter, ZipStreamWriter
+from .blobstore import BlobStore
+from .compare import Comparer, _remote_mtime
 from .exceptions import UnauthorizedException
-from .utils import norm_remote_path, split_storage, makedirs, checksum, is_path_matched
+from .filters import PathFilter, PathPattern, PathSet, glob_escape
+from .hashcache import HashCache, default_path, get_hash_cache
+from .hashcache import set_hash_cache
+from .journal import UploadJournal, journal_path
+from .manifest import Manifest
+from .plan import TransferPlan, load_model, save_model
+from .throttle import set_bandwidth_limit
+from .transfer import Progress, run_bounded, upload_files
+from .utils import norm_remote_path, split_storage, makedirs
+from .utils import checksum, checksum_many, link_or_copy, parse_size
 
 
 def config_from_file():
@@ -77,8 +91,9 @@ def _setup_osf(args):
     project = config.get('project')
     if args.project is None:
         args.project = project
-    # still None? We are in trouble
-    if args.project is None:
+    # still None? We are in trouble, unless clone got a list of projects
+    if args.project is None and not getattr(args, 'projects', None) and \
+       not getattr(args, 'projects_from', None):
         sys.exit('You have to specify a project ID via the command line,'
                  ' configuration file or environment variable.')
 
@@ -94,10 +109,135 @@ def _setup_osf(args):
     else:
         token = _get_token()
 
+    if args.limit_rate is not None:
+        set_bandwidth_limit(parse_size(args.limit_rate))
+    if args.hash_cache or args.hash_cache_path is not None:
+        set_hash_cache(HashCache(args.hash_cache_path or default_path()))
+
     return OSF(username=username, password=password, token=token,
                base_url=base_url)
 
 
+def _setup_cache(args):
+    """Open the blob store selected with `--cache`, if any."""
+    if args.cache is None:
+        return None
+    max_size = None
+    if args.cache_size is not None:
+        max_size = parse_size(args.cache_size)
+    return BlobStore(args.cache, max_size=max_size)
+
+
+def _path_filter(args, *extra):
+    """Listing filter for `--include` and `--exclude` and `extra` filters.
+
+    Returns None if nothing is filtered.
+    """
+    filters = [PathFilter(args.include, args.exclude)] + list(extra)
+    filters = [f for f in filters if f]
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    return lambda child: all(f(child) for f in filters)
+
+
+def _matched_files(store, target_filter):
+    """Files of `store`, only those accepted by `target_filter` if any."""
+    if target_filter is None:
+        return store.files
+    return store.matched_files(target_filter)
+
+
+def _listed(path_filter):
+    """Test of manifest entries for files `path_filter` lets through.
+
+    Returns None if nothing is filtered.
+    """
+    if path_filter is None:
+        return None
+
+    def listed(key):
+        # entries start with the name of the storage
+        _, _, path = key.partition('/')
+        return path_filter.match(path)
+    return listed
+
+
+def _download(file_, path, cache=None, progress=None):
+    """Write the remote `file_` to the local `path`.
+
+    With a blob store as `cache` the file is linked from the store when
+    its contents are already there. `progress` is passed on to
+    `File.write_to`. Returns False if nothing was downloaded.
+    """
+    kwargs = {}
+    if progress is not None:
+        kwargs['progress'] = progress
+    try:
+        if os.stat(path).st_nlink > 1:
+            # never write through a hard link, it might point into the
+            # blob store or at another file
+            os.remove(path)
+    except OSError:
+        pass
+
+    if cache is None:
+        with open(path, "wb") as f:
+            file_.write_to(f, **kwargs)
+    elif cache.get(file_.hashes, path):
+        return False
+    else:
+        with open(path, "wb") as f:
+            file_.write_to(f, cache=cache, **kwargs)
+    return True
+
+
+def _prehash(paths):
+    """Hash the existing local files in `paths` concurrently.
+
+    The digests end up in the hash cache (the in-memory one of
+    `_scoped_hash_cache` unless `--hash-cache` is used), where later
+    `checksum` calls find them.
+    """
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths or get_hash_cache() is None:
+        return
+    for _ in checksum_many(paths, ignore_errors=True):
+        pass
+
+
+def _local_path(prefix, file_):
+    path = file_.path
+    if path.startswith('/'):
+        path = path[1:]
+    return os.path.join(prefix, path)
+
+
+def _observe(model, path, start):
+    """Fit `model` to the transfer of the local file `path` begun at `start`.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    model.observe(size, time.time() - start)
+
+
+def _plan_options(args, *names):
+    """The options `names` of `args` as stored in a `TransferPlan`."""
+    return dict((name, getattr(args, name)) for name in names)
+
+
+def _report_plan(plan, args, direction):
+    """Print `plan`, as JSON with `--json`, estimated for `direction`."""
+    model = load_model(direction)
+    if args.json:
+        plan.dump(sys.stdout, model)
+    else:
+        print(plan.describe(model))
+
+
 def might_need_auth(f):
     """Decorate a CLI function that might require authentication.
 
@@ -124,6 +264,31 @@ def might_need_auth(f):
     return wrapper
 
 
+def _scoped_hash_cache(f):
+    """Run the command `f` with an in-memory hash cache for `_prehash`.
+
+    The hash cache in use when `f` returns, this one or the one of
+    `--hash-cache`, is closed and unset. Nothing changes if a hash cache
+    was in use already.
+    """
+    @wraps(f)
+    def wrapper(cli_args):
+        if get_hash_cache() is not None:
+            return f(cli_args)
+        memory = HashCache(':memory:')
+        set_hash_cache(memory)
+        try:
+            return f(cli_args)
+        finally:
+            cache = get_hash_cache()
+            set_hash_cache(None)
+            memory.close()
+            if cache is not None and cache is not memory:
+                cache.close()
+
+    return wrapper
+
+
 def init(args):
     """Initialize or edit an existing .osfcli.config file."""
     # reading existing config file, convert to configparser object
@@ -158,6 +323,7 @@ def init(args):
 
 
 @might_need_auth
+@_scoped_hash_cache
 def clone(args):
     """Copy all files from all storages of a project.
 
@@ -166,34 +332,411 @@ def clone(args):
     If the project is private you need to specify a username or token.
 
     If args.update is True, overwrite any existing local files only if local and
-    remote files differ.
+    remote files differ. Files of different size differ, with
+    args.trust_mtime local files modified after the remote file are assumed
+    to be unchanged, all other files are compared by hash.
+
+    With `--cache DIR` downloaded files are kept in a content-addressed store
+    in DIR and files already in the store are linked instead of downloaded.
+
+    If args.dedupe is True, files with identical contents are downloaded only
+    once, the other copies are hard-linked (or reflinked) to it.
+
+    Use `--jobs N` to download N files at a time while the project is still
+    being listed. Files that fail do not stop the others, they are listed at
+    the end and the exit code is nonzero.
+
+    The files written are recorded in a manifest in the output directory.
+    With args.update files unchanged on both sides since they were recorded
+    are skipped without reading them. If args.delete is True, local files
+    whose remote file was removed since they were recorded are deleted.
+
+    Several projects can be cloned at once with `--projects ID,ID,...` or
+    `--projects-from FILE` (one ID per line), `--children` also clones all
+    components of the projects. Each project is written to a directory
+    named after its ID in the output directory. All projects share one
+    session and the `--jobs` limit.
+
+    Use `--include` and `--exclude` (repeatable) to clone only files
+    matching glob patterns like `**/*.csv` or `!raw/**`. Excluded folders
+    are not listed at all.
+
+    With `--dry-run` nothing is written, the files that would be
+    downloaded, linked, skipped and deleted are counted and the duration
+    is estimated from the rates observed by earlier clones. Add `--json`
+    to print the plan as JSON, `osf apply` runs it later.
+
+    With `--archive` every storage is downloaded as one zip archive built by
+    the server and extracted while it arrives, which takes one request per
+    storage instead of several per file. Listing options, `--update` and
+    the other options that look at single files can not be used with it.
+
+    With `--to-tar FILE` or `--to-zip FILE` nothing is written to the
+    output directory. The files are streamed in listing order into one
+    archive, with the paths they would have in the output directory. Use
+    `-` as FILE to write the archive to standard output:
+    $ osf -p <projectid> clone --to-tar - | zstd > project.tar.zst
     """
+    if args.archive:
+        _clone_archives(args)
+        return
+    if args.to_tar is not None or args.to_zip is not None:
+        _clone_to_stream(args)
+        return
+
     osf = _setup_osf(args)
-    project = osf.project(args.project)
-    output_dir = args.project
-    if args.output is not None:
-        output_dir = args.output
-
-    with tqdm(unit='files') as pbar:
-        for store in project.storages:
-            prefix = os.path.join(output_dir, store.name)
-
-            for file_ in store.files:
-                path = file_.path
-                if path.startswith('/'):
-                    path = path[1:]
-
-                path = os.path.join(prefix, path)
-                if os.path.exists(path) and args.update:
-                    if checksum(path) == file_.hashes.get('md5'):
-                        continue
+    cache = _setup_cache(args)
+    # local path of the first copy of each md5 when deduplicating
+    local_copies = {}
+    comparer = Comparer(trust_mtime=args.trust_mtime)
+    path_filter = _path_filter(args)
+    targets = []
+
+    if args.dry_run:
+        plan = _clone_plan(osf, args, cache, comparer, path_filter)
+        _report_plan(plan, args, 'download')
+        return
+
+    model = load_model('download')
+
+    def plan():
+        """Yield (file, local path, md5, target) of the files to write."""
+        for target in _clone_targets(osf, args):
+            targets.append(target)
+            for item in _plan_project(target, args, comparer, local_copies,
+                                      path_filter):
+                yield item
+
+    try:
+        if args.jobs > 1:
+            osf.session.set_pool_size(args.jobs)
+            failed = _clone_concurrently(plan(), args.jobs, cache,
+                                         local_copies, model)
+        else:
+            failed = []
+            with tqdm(unit='files') as pbar:
+                for file_, path, md5, target in plan():
+                    if md5 in local_copies:
+                        _link_copy(local_copies[md5], path)
+                    else:
+                        start = time.time()
+                        if _download(file_, path, cache):
+                            _observe(model, path, start)
+                        if md5:
+                            local_copies[md5] = path
+                    target.record(file_, path)
+
+                    pbar.update()
+
+        if args.delete:
+            for target in targets:
+                for path in target.manifest.remove_stale(
+                        target.seen, _listed(path_filter)):
+                    print('Deleted {}'.format(path))
+    finally:
+        # keep what was done so far even if the clone did not finish
+        for target in targets:
+            target.manifest.save()
+        if model.n_observed:
+            save_model('download', model)
+
+    if len(targets) > 1:
+        for target in targets:
+            print(target.summary())
+    if args.update:
+        print('Skipped {} files unchanged since the last clone.'.format(
+            sum(target.unchanged for target in targets)))
+        print(comparer.summary())
+
+    if failed:
+        for path, error in failed:
+            print('Could not download {}: {}'.format(path, error),
+                  file=sys.stderr)
+        sys.exit('{} files could not be downloaded.'.format(len(failed)))
+
+
+class _CloneTarget(object):
+    """A project cloned into `output_dir` and what happened to its files."""
+    def __init__(self, project, output_dir):
+        self.project = project
+        self.output_dir = output_dir
+        self.manifest = Manifest(output_dir)
+        # local paths of all remote files
+        self.seen = set()
+        # provider of each storage by name, the local folder of a storage
+        # is named after it but the API finds storages by provider
+        self.providers = {}
+        self.unchanged = 0
+        self.written = 0
+        self.failed = 0
+
+    def record(self, file_, path):
+        self.manifest.record(file_, path)
+        self.written += 1
+
+    def summary(self):
+        return '{}: {} files, {} written, {} unchanged, {} failed.'.format(
+            self.project.id, len(self.seen), self.written, self.unchanged,
+            self.failed)
+
+
+def _project_ids(args):
+    """IDs of the projects to clone, `args.project` if no list is given."""
+    ids = []
+    if args.projects:
+        ids.extend(args.projects.split(','))
+    if args.projects_from:
+        if args.projects_from == '-':
+            lines = sys.stdin.readlines()
+        else:
+            with open(args.projects_from) as f:
+                lines = f.readlines()
+        ids.extend(line.split('#')[0] for line in lines)
+    ids = [project_id.strip() for project_id in ids if project_id.strip()]
+    if not ids:
+        ids = [args.project]
+    return ids
+
+
+def _clone_targets(osf, args):
+    """Yield a `_CloneTarget` for each project (and component) to clone."""
+    ids = _project_ids(args)
+    if len(ids) == 1 and not args.children:
+        output_dir = ids[0] if args.output is None else args.output
+        yield _CloneTarget(osf.project(ids[0]), output_dir)
+        return
+
+    base = '.' if args.output is None else args.output
+    for project_id in ids:
+        projects = [osf.project(project_id)]
+        while projects:
+            project = projects.pop()
+            yield _CloneTarget(project, os.path.join(base, project.id))
+            if args.children:
+                projects.extend(project.children)
+
+
+def _plan_project(target, args, comparer, local_copies, path_filter=None,
+                  dry_run=False):
+    """Yield (file, local path, md5, target) of the files to write.
+
+    With `dry_run` the folders of the files are not created.
+    """
+    manifest = target.manifest
+    for store in target.project.storages:
+        prefix = os.path.join(target.output_dir, store.name)
+        target.providers[store.name] = store.provider
+
+        files = ((file_, _local_path(prefix, file_))
+                 for file_ in _matched_files(store, path_filter))
+        fresh = set()
+        if args.update:
+            files = list(files)
+            fresh = set(path for file_, path in files
+                        if manifest.unchanged(file_, path))
+            # only files the cheaper checks can not decide are hashed
+            _prehash([path for file_, path in files
+                      if path not in fresh and os.path.exists(path) and
+                      comparer.needs_hash(path, file_)])
+
+        for file_, path in files:
+            target.seen.add(path)
+            md5 = file_.hashes.get('md5') if args.dedupe else None
+            if path in fresh:
+                target.unchanged += 1
+                if md5:
+                    local_copies.setdefault(md5, path)
+                continue
+            if os.path.exists(path) and args.update:
+                if comparer.matches(path, file_):
+                    manifest.record(file_, path)
+                    target.unchanged += 1
+                    if md5:
+                        local_copies.setdefault(md5, path)
+                    continue
+            if not dry_run:
                 directory, _ = os.path.split(path)
                 makedirs(directory, exist_ok=True)
+            yield file_, path, md5, target
+
+
+def _clone_archives(args):
+    """Clone every storage of each target by extracting its zip archive."""
+    conflicts = [option for option in ('update', 'delete', 'dedupe', 'cache',
+                                       'include', 'exclude', 'dry_run')
+                 if getattr(args, option)]
+    if conflicts:
+        sys.exit('--archive can not be used with {}.'.format(
+            ', '.join('--' + option.replace('_', '-')
+                      for option in conflicts)))
+
+    osf = _setup_osf(args)
+    n_files = 0
+    with tqdm(unit='bytes', unit_scale=True) as pbar:
+        for target in _clone_targets(osf, args):
+            for store in target.project.storages:
+                path = os.path.join(target.output_dir, store.name)
+                makedirs(path, exist_ok=True)
+                n_files += len(store.extract_zip(path, progress=pbar.update))
+        n_bytes = pbar.n
+
+    print('Extracted {} files ({:.1f} MB).'.format(n_files, n_bytes / 1e6))
+
+
+def _clone_to_stream(args):
+    """Stream the files of all targets into one tar or zip archive."""
+    if args.to_tar is not None and args.to_zip is not None:
+        sys.exit('Use either --to-tar or --to-zip.')
+    conflicts = [option for option in ('update', 'delete', 'dedupe',
+                                       'dry_run')
+                 if getattr(args, option)]
+    if args.jobs > 1:
+        conflicts.append('jobs')
+    if conflicts:
+        option = '--to-tar' if args.to_tar is not None else '--to-zip'
+        sys.exit('{} can not be used with {}.'.format(option, ', '.join(
+            '--' + conflict.replace('_', '-') for conflict in conflicts)))
+    if args.to_zip is not None and six.PY2:
+        sys.exit('--to-zip needs Python 3.')
 
-                with open(path, "wb") as f:
-                    file_.write_to(f)
+    osf = _setup_osf(args)
+    cache = _setup_cache(args)
+    path_filter = _path_filter(args)
+
+    # only create the archive once the arguments and credentials are fine
+    path = args.to_tar if args.to_tar is not None else args.to_zip
+    if path == '-':
+        # python 2 writes bytes to sys.stdout
+        fp = getattr(sys.stdout, 'buffer', sys.stdout)
+    else:
+        fp = open(path, 'wb')
+    if args.to_tar is not None:
+        archive = TarStreamWriter(fp)
+    else:
+        archive = ZipStreamWriter(fp)
+    try:
+        with Progress() as progress:
+            for target in _clone_targets(osf, args):
+                for store in target.project.storages:
+                    prefix = os.path.join(target.output_dir, store.name)
+                    for file_ in _matched_files(store, path_filter):
+                        name = os.path.normpath(_local_path(prefix, file_))
+                        archive.add(name.replace(os.sep, '/'), file_.size,
+                                    _remote_mtime(file_, time.time()),
+                                    lambda out: file_.write_to(
+                                        out, cache=cache,
+                                        progress=progress.sent))
+                        progress.update()
+        archive.close()
+    except BaseException:
+        # do not leave a truncated archive behind
+        if path != '-':
+            fp.close()
+            os.remove(path)
+        raise
+    if path != '-':
+        fp.close()
+
+    # standard output might be the archive
+    print('Archived {} files ({:.1f} MB).'.format(
+        progress.n_files, progress.n_bytes / 1e6), file=sys.stderr)
+
+
+def _clone_plan(osf, args, cache, comparer, path_filter):
+    """`TransferPlan` of a clone, nothing is written."""
+    plan = TransferPlan('clone', _plan_options(args, 'update', 'trust_mtime',
+                                               'dedupe', 'delete'),
+                        args.jobs)
+    local_copies = {}
+    for target in _clone_targets(osf, args):
+        for file_, path, md5, _ in _plan_project(target, args, comparer,
+                                                 local_copies, path_filter,
+                                                 dry_run=True):
+            # files are stored below <output dir>/<storage name>/
+            name = os.path.relpath(path, target.output_dir).split(os.sep)[0]
+            entry = dict(project=target.project.id,
+                         storage=target.providers[name],
+                         remote=norm_remote_path(file_.path),
+                         size=file_.size, root=target.output_dir)
+            cached = cache.path_for(file_.hashes) if cache else None
+            if md5 in local_copies:
+                plan.add('link', path, source=local_copies[md5], **entry)
+            elif cached is not None:
+                plan.add('link', path, source=cached, **entry)
+            else:
+                plan.add('download', path, **entry)
+                if md5:
+                    local_copies[md5] = path
+        plan.skip('unchanged', target.unchanged)
+        if args.delete:
+            for path in target.manifest.stale(target.seen,
+                                              _listed(path_filter)):
+                plan.add('delete', path, project=target.project.id,
+                         root=target.output_dir)
+    return plan
+
+
+def _link_copy(source, path):
+    """Make `path` a copy of the local file `source`."""
+    if os.path.lexists(path):
+        os.remove(path)
+    link_or_copy(source, path)
+
+
+def _clone_concurrently(plan, jobs, cache, local_copies, model=None):
+    """Download the (file, path, md5, target) of `plan` on `jobs` threads.
+
+    Duplicates are linked once all downloads are done. Downloads are
+    observed by the `CostModel` `model` if given. Returns a list of
+    (local path, exception) of the files that failed.
+    """
+    links = []
 
-                pbar.update()
+    def downloads():
+        for file_, path, md5, target in plan:
+            if md5 in local_copies:
+                links.append((file_, local_copies[md5], path, target))
+            else:
+                if md5:
+                    local_copies[md5] = path
+                yield file_, path, target
+
+    with Progress() as progress:
+        def download(item):
+            file_, path, _ = item
+            start = time.time()
+            if _download(file_, path, cache, progress=progress.sent) and \
+               model is not None:
+                _observe(model, path, start)
+
+        def done(item):
+            file_, path, target = item
+            target.record(file_, path)
+            progress.update()
+
+        failed = []
+        for (_, path, target), error in run_bounded(download, downloads(),
+                                                    jobs, done=done):
+            target.failed += 1
+            failed.append((path, error))
+
+        failed_paths = set(path for path, _ in failed)
+        for file_, source, path, target in links:
+            try:
+                if source in failed_paths:
+                    raise RuntimeError('the download of the identical file '
+                                       '{} failed'.format(source))
+                _link_copy(source, path)
+            except (OSError, RuntimeError) as error:
+                target.failed += 1
+                failed.append((path, error))
+            else:
+                target.record(file_, path)
+                progress.update()
+
+    print('Downloaded {} files ({:.1f} MB), {} failed.'.format(
+        progress.n_files, progress.n_bytes / 1e6, len(failed)))
+    return failed
 
 
 @might_need_auth
@@ -210,7 +753,13 @@ def fetch(args):
 
     If args.force is True, write local file even if that file already exists.
     If args.force is False but args.update is True, overwrite an existing local
-    file only if local and remote files differ.
+    file only if local and remote files differ (see `clone` for
+    args.trust_mtime).
+
+    With `--cache DIR` the file is taken from the content-addressed store in
+    DIR if possible.
+
+    With `--dry-run` nothing is written, see `clone`.
     """
     storage, remote_path = split_storage(args.remote)
 
@@ -223,7 +772,7 @@ def fetch(args):
         sys.exit("Local file %s already exists, not overwriting." % local_path)
 
     directory, _ = os.path.split(local_path)
-    if directory:
+    if directory and not args.dry_run:
         makedirs(directory, exist_ok=True)
 
     osf = _setup_osf(args)
@@ -235,31 +784,49 @@ def fetch(args):
         base_file_path = base_path[base_path.index('/'):]
         if not base_file_path.endswith('/'):
             base_file_path = base_file_path + '/'
-        path_filter = lambda f: is_path_matched(base_file_path, f)
+        path_filter = _path_filter(args, PathPattern(base_file_path))
     else:
-        path_filter = None
+        # only folders on the way to the file are listed
+        path_filter = _path_filter(args,
+                                   PathFilter([glob_escape(remote_path)]))
 
+    plan = TransferPlan('fetch', _plan_options(args, 'force', 'update',
+                                               'trust_mtime'))
+    comparer = Comparer(trust_mtime=args.trust_mtime)
     store = project.storage(storage)
-    files = store.files if path_filter is None \
-            else store.matched_files(path_filter)
-    for file_ in files:
+    for file_ in _matched_files(store, path_filter):
         if norm_remote_path(file_.path) == remote_path:
             if local_path_exists and not args.force and args.update:
-                if file_.hashes.get('md5') == checksum(local_path):
-                    print("Local file %s already matches remote." % local_path)
+                if comparer.matches(local_path, file_):
+                    plan.skip('unchanged')
+                    if not args.dry_run:
+                        print("Local file %s already matches remote." %
+                              local_path)
                     break
-            with open(local_path, 'wb') as fp:
-                file_.write_to(fp)
+            if args.dry_run:
+                plan.add('download', local_path, project=args.project,
+                         storage=storage, remote=remote_path,
+                         size=file_.size)
+            else:
+                _download(file_, local_path, _setup_cache(args))
 
             # only fetching one file so we are done
             break
 
+    if args.dry_run:
+        _report_plan(plan, args, 'download')
+    elif args.update:
+        print(comparer.summary())
+
 
 @might_need_auth
 def list_(args):
     """List all files from all storages for project.
 
     If the project is private you need to specify a username or token.
+
+    Use `--include` and `--exclude` to list only files matching glob
+    patterns, see `clone`.
     """
     osf = _setup_osf(args)
 
@@ -272,18 +839,16 @@ def list_(args):
         if not base_file_path.endswith('/'):
             base_file_path = base_file_path + '/'
         base_provider = base_path.split('/')[0]
-        path_filter = lambda f: is_path_matched(base_file_path, f)
+        path_filter = _path_filter(args, PathPattern(base_file_path))
     else:
         base_provider = None
-        path_filter = None
+        path_filter = _path_filter(args)
 
     for store in project.storages:
         prefix = store.name
         if base_provider is not None and base_provider != prefix:
             continue
-        files = store.files if path_filter is None \
-                else store.matched_files(path_filter)
-        for file_ in files:
+        for file_ in _matched_files(store, path_filter):
             path = file_.path
             if path.startswith('/'):
                 path = path[1:]
@@ -304,7 +869,20 @@ def list_(args):
                 print(full_path)
 
 
+def _upload_bar(paths):
+    """Progress bar for the bytes of the local files `paths`."""
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            total = None
+            break
+    return tqdm(unit='bytes', total=total, unit_scale=True)
+
+
 @might_need_auth
+@_scoped_hash_cache
 def upload(args):
     """Upload a new file to an existing project.
 
@@ -324,17 +902,54 @@ def upload(args):
     $ osf upload -r foo bar
     To place contents of local directory `foo` in remote directory `bar`:
     $ osf upload -r foo/ bar
+
+    Use `--jobs N` to upload N files of a directory at a time. Large files
+    are started first on their own workers while the other workers go
+    through the small files. The predicted and the actual time are printed
+    at the end.
+
+    Use `--retries N` to retry failed uploads N times. With `--resume` a
+    recursive upload keeps a journal of uploaded files, running the same
+    command again after a failure skips the files that are done.
+
+    Uploads are hashed while they are sent and checked against the hashes
+    the server reports for the stored file.
+
+    Use `-` as source to upload what is read from standard input, without
+    storing it locally first:
+    $ tar c data | osf upload - backups/data.tar
+
+    With `--dry-run` nothing is uploaded, the files that would be uploaded
+    and skipped are counted and the duration is estimated, see `clone`.
     """
     osf = _setup_osf(args)
     if not osf.has_auth:
         sys.exit('To upload a file you need to provide a username and'
                  ' password or token.')
 
+    if args.retries:
+        osf.session.set_upload_retries(args.retries)
+
     project = osf.project(args.project)
     storage, remote_path = split_storage(args.destination)
 
     store = project.storage(storage)
-    if args.recursive:
+    model = load_model('upload')
+    if args.source == '-':
+        if args.recursive:
+            raise RuntimeError("Can not upload standard input recursively.")
+        if args.dry_run:
+            sys.exit("Can not plan an upload from standard input.")
+        if args.update and not args.force:
+            sys.exit("Can not compare standard input with the remote file,"
+                     " use --force instead of --update.")
+        # python 2 reads bytes from sys.stdin
+        stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+        with tqdm(unit='bytes', unit_scale=True) as pbar:
+            store.create_file(remote_path, stdin, force=args.force,
+                              update=args.update, progress=pbar.update)
+
+    elif args.recursive:
         if not os.path.isdir(args.source):
             raise RuntimeError("Expected source ({}) to be a directory when "
                                "using recursive mode.".format(args.source))
@@ -342,21 +957,253 @@ def upload(args):
         # local name of the directory that is being uploaded
         _, dir_name = os.path.split(args.source)
 
+        uploads = []
         for root, _, files in os.walk(args.source):
             subdir_path = os.path.relpath(root, args.source)
             for fname in files:
                 local_path = os.path.join(root, fname)
-                with open(local_path, 'rb') as fp:
-                    # build the remote path + fname
-                    name = os.path.join(remote_path, dir_name, subdir_path,
-                                        fname)
-                    store.create_file(name, fp, force=args.force,
-                                      update=args.update)
+                # build the remote path + fname
+                name = os.path.join(remote_path, dir_name, subdir_path,
+                                    fname)
+                uploads.append((local_path, name))
+
+        journal = None
+        n_resumed = 0
+        path = journal_path(args.project, storage, remote_path,
+                            os.path.abspath(args.source))
+        # a dry run only reads an existing journal
+        if args.resume and (not args.dry_run or os.path.exists(path)):
+            journal = UploadJournal(path)
+            n_uploads = len(uploads)
+            uploads = [(local_path, name) for local_path, name in uploads
+                       if not journal.done(local_path, name)]
+            n_resumed = n_uploads - len(uploads)
+
+        if args.dry_run:
+            plan = _upload_plan(store, args, storage, uploads)
+            plan.skip('uploaded', n_resumed)
+            _report_plan(plan, args, 'upload')
+            return
+
+        if args.jobs > 1:
+            scheduler = upload_files(store, uploads, args.jobs,
+                                     force=args.force, update=args.update,
+                                     journal=journal, model=model)
+            print(scheduler.summary())
+        else:
+            with _upload_bar(local_path for local_path, _ in uploads) as pbar:
+                for local_path, name in uploads:
+                    if journal is not None:
+                        st = os.stat(local_path)
+                    start = time.time()
+                    with open(local_path, 'rb') as fp:
+                        uploaded = store.create_file(name, fp,
+                                                     force=args.force,
+                                                     update=args.update,
+                                                     progress=pbar.update)
+                    if uploaded is not False:
+                        _observe(model, local_path, start)
+                    if journal is not None:
+                        journal.record(local_path, name, st)
+
+        if journal is not None:
+            # everything is uploaded, the next run starts from scratch
+            journal.remove()
+
+    elif args.dry_run:
+        plan = _upload_plan(store, args, storage, [(args.source, remote_path)])
+        _report_plan(plan, args, 'upload')
+        return
+
+    else:
+        start = time.time()
+        with _upload_bar([args.source]) as pbar, \
+                open(args.source, 'rb') as fp:
+            uploaded = store.create_file(remote_path, fp, force=args.force,
+                                         update=args.update,
+                                         progress=pbar.update)
+        # unchanged files were not transferred, do not learn from them
+        if uploaded is not False:
+            _observe(model, args.source, start)
+
+    if model.n_observed:
+        save_model('upload', model)
+
 
+def _upload_plan(store, args, storage, uploads):
+    """`TransferPlan` of uploading the (local path, remote path) `uploads`.
+
+    The remote folders of the files are listed to find the files that
+    exist, nothing is created.
+    """
+    plan = TransferPlan('upload', _plan_options(args, 'force', 'update'),
+                        args.jobs)
+    names = [norm_remote_path(name) for _, name in uploads]
+    existing = dict((norm_remote_path(file_.path), file_)
+                    for file_ in store.matched_files(PathSet(names)))
+    for (local_path, _), name in zip(uploads, names):
+        entry = dict(project=args.project, storage=storage, remote=name,
+                     size=os.path.getsize(local_path))
+        file_ = existing.get(name)
+        if file_ is None:
+            plan.add('upload', local_path, **entry)
+        elif args.force:
+            plan.add('upload', local_path, replace=True, **entry)
+        elif not args.update:
+            plan.skip('existing')
+        elif checksum(local_path) == file_.hashes.get('md5'):
+            plan.skip('unchanged')
+        else:
+            plan.add('upload', local_path, replace=True, **entry)
+    return plan
+
+
+@might_need_auth
+def apply_(args):
+    """Run a transfer plan made with `--dry-run --json`.
+
+    Plans of `clone`, `fetch` and `upload` can be run. The planned files
+    are transferred, linked and deleted with the options the plan was made
+    with. Remote files are listed again, so downloads get their current
+    contents and uploads are checked against the current remote files.
+    Read the plan from standard input with `-`.
+    """
+    if args.plan == '-':
+        plan = TransferPlan.load(sys.stdin)
     else:
-        with open(args.source, 'rb') as fp:
-            store.create_file(remote_path, fp, force=args.force,
-                              update=args.update)
+        with open(args.plan) as f:
+            plan = TransferPlan.load(f)
+
+    projects = [entry['project'] for entry in plan.files if entry['project']]
+    if args.project is None and projects:
+        args.project = projects[0]
+    osf = _setup_osf(args)
+    if plan.jobs > 1:
+        osf.session.set_pool_size(plan.jobs)
+
+    if plan.command == 'upload':
+        _apply_uploads(osf, plan)
+        return
+
+    failed = _apply_downloads(osf, plan)
+    if failed:
+        for path, error in failed:
+            print('Could not download {}: {}'.format(path, error),
+                  file=sys.stderr)
+        sys.exit('{} files could not be downloaded.'.format(len(failed)))
+
+
+def _by_store(entries):
+    """Group `entries` of a plan by (project, storage)."""
+    stores = {}
+    for entry in entries:
+        stores.setdefault((entry['project'], entry['storage']),
+                          []).append(entry)
+    return sorted(stores.items())
+
+
+def _apply_uploads(osf, plan):
+    """Upload the files of `plan`."""
+    force = plan.options.get('force', False)
+    update = plan.options.get('update', False)
+    for (project_id, storage), entries in _by_store(plan.transfers):
+        store = osf.project(project_id).storage(storage)
+        uploads = [(entry['local'], entry['remote']) for entry in entries]
+        if plan.jobs > 1:
+            upload_files(store, uploads, plan.jobs, force=force,
+                         update=update)
+            continue
+        with _upload_bar(local_path for local_path, _ in uploads) as pbar:
+            for local_path, name in uploads:
+                with open(local_path, 'rb') as fp:
+                    store.create_file(name, fp, force=force, update=update,
+                                      progress=pbar.update)
+
+
+def _apply_downloads(osf, plan):
+    """Download, link and delete the files of `plan`.
+
+    Returns a list of (local path, exception) of the files that failed.
+    """
+    manifests = {}
+
+    def record(entry, file_):
+        root = entry.get('root')
+        if root is None:
+            return
+        if root not in manifests:
+            manifests[root] = Manifest(root)
+        manifests[root].record(file_, entry['local'])
+
+    failed = []
+    # remote files of the downloads and links by local path
+    remote = {}
+
+    def listed():
+        for (project_id, storage), entries in _by_store(
+                entry for entry in plan.files
+                if entry['action'] in ('download', 'link')):
+            store = osf.project(project_id).storage(storage)
+            wanted = {}
+            for entry in entries:
+                wanted.setdefault(entry['remote'], []).append(entry)
+            for file_ in store.matched_files(PathSet(wanted)):
+                for entry in wanted.pop(norm_remote_path(file_.path), []):
+                    remote[entry['local']] = file_
+                    if entry['action'] == 'download':
+                        yield file_, entry
+            for entries in wanted.values():
+                for entry in entries:
+                    failed.append((entry['local'],
+                                   RuntimeError('the remote file is gone')))
+
+    def download(item):
+        file_, entry = item
+        directory, _ = os.path.split(entry['local'])
+        if directory:
+            makedirs(directory, exist_ok=True)
+        _download(file_, entry['local'], progress=progress.sent)
+
+    def done(item):
+        file_, entry = item
+        record(entry, file_)
+        progress.update()
+
+    try:
+        with Progress(total=len(plan.transfers)) as progress:
+            for (_, entry), error in run_bounded(download, listed(),
+                                                 plan.jobs, done=done):
+                failed.append((entry['local'], error))
+
+        failed_paths = set(path for path, _ in failed)
+        for entry in plan.files:
+            path = entry['local']
+            try:
+                if entry['action'] == 'link' and path in remote:
+                    if entry['source'] in failed_paths:
+                        raise RuntimeError('the download of the identical '
+                                           'file {} failed'.format(
+                                               entry['source']))
+                    directory, _ = os.path.split(path)
+                    if directory:
+                        makedirs(directory, exist_ok=True)
+                    _link_copy(entry['source'], path)
+                    record(entry, remote[path])
+                elif entry['action'] == 'delete':
+                    if os.path.exists(path):
+                        os.remove(path)
+                        print('Deleted {}'.format(path))
+                    if entry.get('root') is not None:
+                        manifests.setdefault(
+                            entry['root'],
+                            Manifest(entry['root'])).forget(path)
+            except (OSError, RuntimeError) as error:
+                failed.append((path, error))
+    finally:
+        for manifest in manifests.values():
+            manifest.save()
+
+    return failed
 
 
 @might_need_auth
@@ -377,20 +1224,8 @@ def makefolder(args):
     storage, remote_path = split_storage(args.target)
 
     store = project.storage(storage)
-    folders = []
-    for f in store.folders:
-        if remote_path.startswith(norm_remote_path(f.path) + os.path.sep):
-            folders.append(f)
-    if len(folders) == 0:
-        parent = store
-        parent_path_segments = []
-    else:
-        folders = sorted(folders, key=lambda f: len(norm_remote_path(f.path)))
-        parent = folders[-1]
-        parent_path_segments = norm_remote_path(parent.path).split(os.path.sep)
-    remote_path_segments = remote_path.split(os.path.sep)
-    for foldername in remote_path_segments[len(parent_path_segments):]:
-        parent = parent.create_folder(foldername)
+    # missing parent folders are created on the way
+    store.create_folder(remote_path)
 
 
 @might_need_auth
@@ -0,0 +1,91 @@
+"""Compare local files with their remote counterparts
+
+Hashing a local file reads all of it. `Comparer` tries cheaper checks
+first and only hashes files it can not decide otherwise.
+"""
+import calendar
+import os
+
+import dateutil.parser
+from dateutil import tz
+
+from .utils import checksum
+
+
+TIERS = ('size', 'mtime', 'hash')
+
+
+def _remote_mtime(file_, default=None):
+    """Remote modification time of `file_` in seconds since the epoch.
+
+    Returns `default` if the time is unknown.
+    """
+    if not file_.date_modified:
+        return default
+    try:
+        modified = dateutil.parser.parse(file_.date_modified)
+    except (ValueError, OverflowError):
+        return default
+    # naive timestamps are in UTC
+    if modified.tzinfo is not None:
+        modified = modified.astimezone(tz.tzutc())
+    return calendar.timegm(modified.timetuple()) + \
+        modified.microsecond / 1e6
+
+
+class Comparer(object):
+    """Decide whether local files match remote `File`s.
+
+    The checks, cheapest first:
+
+    1. size: files of different size differ
+    2. mtime (only with `trust_mtime`): a local file modified after the
+       remote one is assumed to match, e.g. because it was downloaded
+    3. hash: the md5 (or sha256) of the local file is compared with the
+       remote hash
+
+    `counts` records how many comparisons each check decided.
+    """
+    def __init__(self, trust_mtime=False):
+        self.trust_mtime = trust_mtime
+        self.counts = dict((tier, 0) for tier in TIERS)
+
+    def _quick(self, path, file_):
+        """Return (tier, matches) if a check short of hashing decides."""
+        if file_.size is None and not self.trust_mtime:
+            return None
+        st = os.stat(path)
+        if file_.size is not None and st.st_size != int(file_.size):
+            return 'size', False
+        if self.trust_mtime:
+            remote_mtime = _remote_mtime(file_)
+            if remote_mtime is not None and st.st_mtime >= remote_mtime:
+                return 'mtime', True
+        return None
+
+    def needs_hash(self, path, file_):
+        """True if comparing `path` with `file_` means hashing `path`."""
+        return self._quick(path, file_) is None
+
+    def matches(self, path, file_):
+        """True if the local file at `path` has the contents of `file_`."""
+        decided = self._quick(path, file_)
+        if decided is None:
+            hashes = file_.hashes or {}
+            if hashes.get('md5'):
+                same = checksum(path) == hashes['md5']
+            elif hashes.get('sha256'):
+                same = checksum(path, 'sha256') == hashes['sha256']
+            else:
+                same = False
+            decided = 'hash', same
+        tier, same = decided
+        self.counts[tier] += 1
+        return same
+
+    def summary(self):
+        """Human readable counts of the decisions made by each check."""
+        return 'Compared {} local files: {}.'.format(
+            sum(self.counts.values()),
+            ', '.join('{} by {}'.format(self.counts[tier], tier)
+                      for tier in TIERS))
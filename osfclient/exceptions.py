@@ -9,3 +9,9 @@ class UnauthorizedException(OSFException):
 class FolderExistsException(OSFException):
     def __init__(self, name):
         self.args = ('Folder %s already exists.' % name,)
+
+
+class ChecksumMismatchException(OSFException):
+    def __init__(self, path, hash_type, local, remote):
+        self.args = ('The {} of the uploaded file {} is {} but the server '
+                     'stored {}.'.format(hash_type, path, local, remote),)
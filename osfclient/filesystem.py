@@ -0,0 +1,327 @@
+"""fsspec filesystem for OSF projects
+
+Exposes the files of OSF projects to anything that speaks `fsspec`
+(pandas, xarray, dask, ...). Paths have the form
+``osf://<project>/<provider>/<path>``::
+
+    import fsspec
+    fs = fsspec.filesystem('osf', token='...')
+    fs.ls('9zpcy/osfstorage')
+    with fs.open('9zpcy/osfstorage/data/table.csv') as f:
+        header = f.readline()
+
+This module requires the optional `fsspec` package
+(``pip install osfclient[fsspec]``).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import posixpath
+import tempfile
+import threading
+
+from fsspec.callbacks import DEFAULT_CALLBACK
+from fsspec.spec import AbstractBufferedFile
+from fsspec.spec import AbstractFileSystem
+
+from .api import OSF
+from .models import File
+from .models import Folder
+from .utils import makedirs
+
+
+class OSFFileSystem(AbstractFileSystem):
+    """Access files stored in OSF projects via fsspec.
+
+    Directory listings are fetched one folder at a time and cached, so
+    opening a file deep in a project only lists the folders on the way
+    there. Use `invalidate_cache()` to forget cached listings.
+
+    Bulk downloads with `get()` run `max_workers` downloads concurrently.
+    """
+    protocol = 'osf'
+    root_marker = ''
+
+    def __init__(self, username=None, password=None, token=None,
+                 base_url=None, max_workers=8, **kwargs):
+        super(OSFFileSystem, self).__init__(**kwargs)
+        self.osf = OSF(username=username, password=password, token=token,
+                       base_url=base_url)
+        self.max_workers = max_workers
+        # model instance (Storage, Folder or File) for every path we listed
+        self._objects = {}
+        self._projects = {}
+        self._lock = threading.RLock()
+        self._collecting = threading.local()
+
+    @classmethod
+    def _strip_protocol(cls, path):
+        path = super(OSFFileSystem, cls)._strip_protocol(path)
+        return path.strip('/')
+
+    def _split(self, path):
+        """Split `path` into project ID, storage provider and remote path."""
+        parts = self._strip_protocol(path).split('/', 2)
+        while len(parts) < 3:
+            parts.append('')
+        return parts[0], parts[1], parts[2]
+
+    def _project(self, project_id):
+        with self._lock:
+            if project_id not in self._projects:
+                self._projects[project_id] = self.osf.project(project_id)
+            return self._projects[project_id]
+
+    def _entry(self, path, obj):
+        if isinstance(obj, File):
+            hashes = obj.hashes or {}
+            return {'name': path, 'size': obj.size, 'type': 'file',
+                    'id': obj.id, 'modified': obj.date_modified,
+                    'md5': hashes.get('md5'),
+                    'sha256': hashes.get('sha256')}
+        return {'name': path, 'size': 0, 'type': 'directory'}
+
+    def _list_children(self, path):
+        """List and cache the children of the container at `path`."""
+        project_id, provider, _ = self._split(path)
+        if not provider:
+            children = [('{}/{}'.format(project_id, store.provider), store)
+                        for store in self._project(project_id).storages]
+        else:
+            container = self._resolve(path)
+            children = []
+            for child in container._follow_next(container._files_url):
+                name = child['attributes']['name']
+                if child['attributes']['kind'] == 'file':
+                    obj = File(child, container.session)
+                else:
+                    obj = Folder(child, container.session)
+                # lets removing or moving it update the storage's caches
+                obj._storage = container._storage
+                children.append((posixpath.join(path, name), obj))
+
+        entries = []
+        with self._lock:
+            for child_path, obj in children:
+                self._objects[child_path] = obj
+                entries.append(self._entry(child_path, obj))
+            self.dircache[path] = entries
+        return entries
+
+    def _resolve(self, path):
+        """Return the Storage, Folder or File instance for `path`."""
+        path = self._strip_protocol(path)
+        with self._lock:
+            if path in self._objects:
+                return self._objects[path]
+        parent = self._parent(path)
+        if not parent or parent == path:
+            raise FileNotFoundError(path)
+        if parent not in self.dircache:
+            self._list_children(parent)
+        with self._lock:
+            if path not in self._objects:
+                raise FileNotFoundError(path)
+            return self._objects[path]
+
+    def ls(self, path, detail=True, **kwargs):
+        path = self._strip_protocol(path)
+        if not path:
+            raise ValueError("Paths have to start with a project ID.")
+        entries = self.dircache.get(path)
+        if entries is None:
+            obj = self._resolve(path) if self._split(path)[2] else None
+            if isinstance(obj, File):
+                entries = [self._entry(path, obj)]
+            else:
+                entries = self._list_children(path)
+        if detail:
+            return entries
+        return [entry['name'] for entry in entries]
+
+    def info(self, path, **kwargs):
+        path = self._strip_protocol(path)
+        _, provider, remote_path = self._split(path)
+        if not remote_path:
+            return {'name': path, 'size': 0, 'type': 'directory'}
+        return self._entry(path, self._resolve(path))
+
+    def invalidate_cache(self, path=None):
+        with self._lock:
+            if path is None:
+                self.dircache.clear()
+                self._objects.clear()
+                return
+            path = self._strip_protocol(path)
+            for cached in list(self.dircache):
+                if cached == path or cached.startswith(path + '/'):
+                    del self.dircache[cached]
+            for cached in list(self._objects):
+                if cached.startswith(path + '/'):
+                    del self._objects[cached]
+            self.dircache.pop(self._parent(path), None)
+            self._objects.pop(path, None)
+
+    def _open(self, path, mode='rb', block_size=None, autocommit=True,
+              cache_options=None, **kwargs):
+        return OSFFile(self, path, mode=mode, block_size=block_size,
+                       autocommit=autocommit, cache_options=cache_options,
+                       **kwargs)
+
+    def _store(self, path):
+        project_id, provider, remote_path = self._split(path)
+        if not remote_path:
+            raise ValueError("{} is not a path inside a storage.".format(path))
+        return self._resolve('{}/{}'.format(project_id, provider)), \
+            remote_path
+
+    def _upload(self, fp, path):
+        store, remote_path = self._store(path)
+        store.create_file(remote_path, fp, force=True)
+        self.invalidate_cache(path)
+
+    def put_file(self, lpath, rpath, callback=DEFAULT_CALLBACK, **kwargs):
+        if os.path.isdir(lpath):
+            self.makedirs(rpath, exist_ok=True)
+            return
+        with open(lpath, 'rb') as fp:
+            self._upload(fp, self._strip_protocol(rpath))
+
+    def get_file(self, rpath, lpath, callback=DEFAULT_CALLBACK, **kwargs):
+        if self.isdir(rpath):
+            makedirs(lpath, exist_ok=True)
+            return
+        file_ = self._resolve(rpath)
+        pending = getattr(self._collecting, 'transfers', None)
+        if pending is not None:
+            pending.append((file_, lpath))
+            return
+        self._download(file_, lpath)
+
+    def _download(self, file_, lpath):
+        directory = os.path.dirname(lpath)
+        if directory:
+            makedirs(directory, exist_ok=True)
+        with open(lpath, 'wb') as fp:
+            file_.write_to(fp)
+
+    def get(self, rpath, lpath, recursive=False, callback=DEFAULT_CALLBACK,
+            maxdepth=None, **kwargs):
+        """Copy remote file(s) to local, downloading concurrently.
+
+        Paths are expanded from the cached listings first, then the
+        downloads run on a pool of `max_workers` threads sharing one
+        session.
+        """
+        self._collecting.transfers = []
+        try:
+            super(OSFFileSystem, self).get(rpath, lpath, recursive=recursive,
+                                           maxdepth=maxdepth, **kwargs)
+            transfers = self._collecting.transfers
+        finally:
+            self._collecting.transfers = None
+
+        callback.set_size(len(transfers))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._download, file_, local)
+                       for file_, local in transfers]
+            for future in futures:
+                future.result()
+                callback.relative_update(1)
+
+    def mkdir(self, path, create_parents=True, **kwargs):
+        path = self._strip_protocol(path)
+        parent = self._parent(path)
+        if not self.exists(parent):
+            if not create_parents:
+                raise FileNotFoundError(parent)
+            self.mkdir(parent, create_parents=True)
+        store, _ = self._store(path)
+        container = self._resolve(parent) if self._split(parent)[2] \
+            else store
+        container.create_folder(posixpath.basename(path))
+        self.invalidate_cache(path)
+
+    def makedirs(self, path, exist_ok=False):
+        path = self._strip_protocol(path)
+        if self.exists(path):
+            if not exist_ok:
+                raise FileExistsError(path)
+            return
+        self.mkdir(path, create_parents=True)
+
+    def rmdir(self, path):
+        path = self._strip_protocol(path)
+        if self.ls(path, detail=False):
+            raise OSError("Directory {} is not empty.".format(path))
+        self._rm(path)
+
+    def _rm(self, path):
+        path = self._strip_protocol(path)
+        obj = self._resolve(path)
+        if not isinstance(obj, (File, Folder)):
+            raise ValueError("Can not remove {}.".format(path))
+        obj.remove()
+        self.invalidate_cache(path)
+
+    def rm(self, path, recursive=False, maxdepth=None):
+        """Remove files or folders.
+
+        Removing a folder needs `recursive=True` and takes a single request,
+        no matter how many files it contains.
+        """
+        paths = path if isinstance(path, list) else [path]
+        for path in paths:
+            if self.isdir(path):
+                if not recursive:
+                    raise IsADirectoryError(path)
+            self._rm(path)
+
+    def mv(self, path1, path2, recursive=False, maxdepth=None, **kwargs):
+        """Move a file or folder within one storage."""
+        path1 = self._strip_protocol(path1)
+        path2 = self._strip_protocol(path2)
+        if path1 == path2:
+            return
+        if self._split(path1)[:2] != self._split(path2)[:2]:
+            raise NotImplementedError("Can only move within one storage.")
+
+        obj = self._resolve(path1)
+        store, _ = self._store(path1)
+        if self.isdir(path2):
+            target, new_name = path2, None
+        else:
+            target, new_name = self._parent(path2), posixpath.basename(path2)
+        to_folder = self._resolve(target) if self._split(target)[2] \
+            else store
+        if isinstance(obj, Folder):
+            obj.move_to(store, to_folder, to_foldername=new_name)
+        else:
+            obj.move_to(store, to_folder, to_filename=new_name)
+        self.invalidate_cache(path1)
+        self.invalidate_cache(path2)
+
+
+class OSFFile(AbstractBufferedFile):
+    """File opened through `OSFFileSystem`.
+
+    Reads go through fsspec's block caches, each cache miss fetches a byte
+    range with `File._get_range`. Writes are spooled to a temporary file
+    and uploaded when the file is closed.
+    """
+    def _fetch_range(self, start, end):
+        if start >= end:
+            return b''
+        return self.fs._resolve(self.path)._get_range(start, end - 1)
+
+    def _initiate_upload(self):
+        self._spool = tempfile.TemporaryFile()
+
+    def _upload_chunk(self, final=False):
+        self._spool.write(self.buffer.getvalue())
+        if final:
+            self._spool.seek(0)
+            try:
+                self.fs._upload(self._spool, self.path)
+            finally:
+                self._spool.close()
+        return True
@@ -0,0 +1,255 @@
+"""Include and exclude remote paths by glob patterns
+
+A `PathFilter` is compiled once from `--include` and `--exclude` patterns
+and used as the `target_filter` of a listing. Folders that can not contain
+an included file are not entered at all, so excluding a large tree saves
+listing it as well as downloading it.
+
+Patterns are matched against the path of a file inside its storage:
+
+* `*` matches anything except `/`, `?` matches one character and `[...]`
+  a character class
+* `**` matches any number of folders
+* patterns without a `/` match the name at any depth, others are anchored
+  at the root of the storage
+* an include pattern starting with `!` excludes
+* excluding a folder excludes everything below it
+
+`PathPattern` compiles the `%` patterns of `--base-path` the same way.
+"""
+import re
+
+
+def _translate(segment):
+    """Regular expression for the path segment glob `segment`."""
+    i, n = 0, len(segment)
+    parts = []
+    while i < n:
+        c = segment[i]
+        i += 1
+        if c == '*':
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and segment[j] in '!^':
+                j += 1
+            if j < n and segment[j] == ']':
+                j += 1
+            while j < n and segment[j] != ']':
+                j += 1
+            if j >= n:
+                parts.append('\\[')
+            else:
+                chars = segment[i:j].replace('\\', '\\\\').replace('[', '\\[')
+                i = j + 1
+                if chars[0] in '!^':
+                    chars = '^/' + chars[1:]
+                parts.append('[' + chars + ']')
+        else:
+            parts.append(re.escape(c))
+    return ''.join(parts)
+
+
+def _compile(segments):
+    regex = []
+    for index, segment in enumerate(segments):
+        last = index == len(segments) - 1
+        if segment == '**':
+            regex.append('.*' if last else '(?:[^/]+/)*')
+        else:
+            regex.append(_translate(segment) + ('' if last else '/'))
+    return re.compile(''.join(regex) + r'\Z')
+
+
+def glob_escape(path):
+    """Glob pattern matching exactly `path`."""
+    return re.sub(r'([*?[])', r'[\1]', path)
+
+
+class Glob(object):
+    """A compiled glob `pattern`."""
+    def __init__(self, pattern):
+        self.pattern = pattern
+        pattern = pattern.strip('/')
+        segments = pattern.split('/')
+        if len(segments) == 1:
+            # not anchored, match the name at any depth
+            segments = ['**'] + segments
+        self._segments = [None if segment == '**' else
+                          re.compile(_translate(segment) + r'\Z')
+                          for segment in segments]
+        self._regex = _compile(segments)
+        # a pattern ending in /** matches everything below its prefix
+        self._tree = None
+        if len(segments) > 1 and segments[-1] == '**':
+            self._tree = _compile(segments[:-1])
+
+    def match(self, path):
+        """True if `path` (without leading slash) matches."""
+        return self._regex.match(path) is not None
+
+    def covers(self, folder):
+        """True if the pattern matches `folder` or everything below it."""
+        return self.match(folder) or \
+            (self._tree is not None and self._tree.match(folder) is not None)
+
+    def may_match_below(self, folder):
+        """False if no path below `folder` can match."""
+        names = folder.split('/') if folder else []
+        segments = self._segments
+        for index, name in enumerate(names):
+            if index == len(segments):
+                return False
+            if segments[index] is None:
+                return True
+            if segments[index].match(name) is None:
+                return False
+        return len(names) < len(segments)
+
+
+class PathFilter(object):
+    """Filter remote files by `include` and `exclude` glob patterns.
+
+    Without include patterns every file not excluded is included. Call it
+    with the JSON of a file or folder from a listing, as done for the
+    `target_filter` of `Storage.matched_files`.
+    """
+    def __init__(self, include=(), exclude=()):
+        self.include = []
+        self.exclude = [Glob(pattern) for pattern in exclude or ()]
+        for pattern in include or ():
+            if pattern.startswith('!'):
+                self.exclude.append(Glob(pattern[1:]))
+            else:
+                self.include.append(Glob(pattern))
+        # folders that were not listed
+        self.pruned = []
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+    __nonzero__ = __bool__
+
+    def match(self, path):
+        """True if the file at `path` is included."""
+        path = path.strip('/')
+        if any(glob.match(path) for glob in self.exclude):
+            return False
+        # excluding a folder excludes everything below it
+        names = path.split('/')[:-1]
+        for depth in range(1, len(names) + 1):
+            folder = '/'.join(names[:depth])
+            if any(glob.covers(folder) for glob in self.exclude):
+                return False
+        if not self.include:
+            return True
+        return any(glob.match(path) for glob in self.include)
+
+    def may_contain(self, folder):
+        """False if nothing in the folder `folder` can be included."""
+        folder = folder.strip('/')
+        if any(glob.covers(folder) for glob in self.exclude):
+            return False
+        if not self.include:
+            return True
+        return any(glob.may_match_below(folder) for glob in self.include)
+
+    def __call__(self, child):
+        attributes = child['attributes']
+        path = attributes['materialized_path']
+        if attributes.get('kind', 'file') == 'folder':
+            if self.may_contain(path):
+                return True
+            self.pruned.append(path)
+            return False
+        return self.match(path)
+
+
+def _segment_matcher(segment):
+    """Callable testing a path segment against the pattern `segment`."""
+    if any(c in segment for c in '*?['):
+        return re.compile(_translate(segment) + r'\Z').match
+    if len(segment) > 1 and segment.startswith('%') and \
+       segment.endswith('%'):
+        part = segment[1:-1]
+        return lambda name: part in name
+    if segment.startswith('%'):
+        suffix = segment[1:]
+        return lambda name: name.endswith(suffix)
+    if segment.endswith('%'):
+        prefix = segment[:-1]
+        return lambda name: name.startswith(prefix)
+    return segment.__eq__
+
+
+def _split(path):
+    segments = path.split('/')
+    if segments[-1] == '':
+        segments.pop()
+    return segments
+
+
+class PathPattern(object):
+    """A compiled `--base-path` style `pattern`.
+
+    Each `/` separated segment is matched by itself: `%abc` matches names
+    ending in `abc`, `abc%` names starting with it, `%abc%` names
+    containing it, segments with `*`, `?` or `[` are globs and all others
+    have to be equal. A path matches if all the segments it shares with
+    the pattern match, so the folders leading to a match match as well.
+    """
+    def __init__(self, pattern):
+        self.pattern = pattern
+        segments = _split(pattern)
+        self._matchers = [_segment_matcher(segment) for segment in segments]
+        self._literal = None
+        if segments and not any(c in pattern for c in '%*?['):
+            # compare whole strings instead of segment by segment
+            self._literal = '/'.join(segments) + '/'
+
+    def match(self, path):
+        """True if all segments `path` shares with the pattern match."""
+        if self._literal is not None:
+            if not path:
+                return True
+            path = path if path.endswith('/') else path + '/'
+            if len(path) < len(self._literal):
+                return self._literal.startswith(path)
+            return path.startswith(self._literal)
+        for matcher, name in zip(self._matchers, _split(path)):
+            if not matcher(name):
+                return False
+        return True
+
+    def may_match_below(self, folder):
+        """False if no path below `folder` can match.
+
+        Paths share the segments of their folders, so this is `match`.
+        """
+        return self.match(folder)
+
+    def __call__(self, child):
+        return self.match(child['attributes']['materialized_path'])
+
+
+class PathSet(object):
+    """Listing filter for the files at exactly `paths`.
+
+    Only the folders leading to one of the files are listed.
+    """
+    def __init__(self, paths):
+        self.paths = set(path.strip('/') for path in paths)
+        self.folders = set()
+        for path in self.paths:
+            names = path.split('/')[:-1]
+            for depth in range(1, len(names) + 1):
+                self.folders.add('/'.join(names[:depth]))
+
+    def __call__(self, child):
+        attributes = child['attributes']
+        path = attributes['materialized_path'].strip('/')
+        if attributes.get('kind', 'file') == 'folder':
+            return path in self.folders
+        return path in self.paths
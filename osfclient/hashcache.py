@@ -0,0 +1,122 @@
+"""Persistent cache of local file hashes
+
+Finding out whether a local file differs from its remote copy means hashing
+it, which reads the whole file. A `HashCache` remembers the digests of local
+files in a small SQLite database. An entry is only used while the file's
+device, inode, size and modification time are unchanged, so an edited or
+replaced file is always hashed again.
+
+Enable it for a process with `set_hash_cache()` (or `osf --hash-cache`),
+`utils.checksum` then consults it.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from .utils import makedirs
+from .utils import mtime_ns
+from .utils import user_cache_dir
+
+
+HASH_TYPES = ('md5', 'sha256')
+
+# files modified this recently might still change within the resolution of
+# their mtime, don't trust their digests
+RACY_SECONDS = 2
+
+_cache = None
+
+
+def default_path():
+    """Location of the hash cache in the user's cache directory."""
+    return os.path.join(user_cache_dir(), 'hashes.sqlite')
+
+
+def _key(st):
+    return (st.st_dev, st.st_ino, st.st_size, mtime_ns(st))
+
+
+class HashCache(object):
+    """Digests of local files stored in the SQLite database at `path`.
+
+    Entries are keyed by device and inode, and are valid as long as size
+    and modification time (in nanoseconds) match. The database can be
+    shared by several threads and processes. Use ':memory:' as `path` for
+    a cache that lasts as long as the process.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = default_path()
+        if path != ':memory:':
+            path = os.path.abspath(path)
+            makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30,
+                                   check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS hashes ('
+                ' dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,'
+                ' path TEXT, md5 TEXT, sha256 TEXT,'
+                ' PRIMARY KEY (dev, ino))')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get(self, file_path, hash_type='md5'):
+        """Cached `hash_type` digest of `file_path` or None."""
+        if hash_type not in HASH_TYPES:
+            raise ValueError("{} is an invalid hash_type.".format(hash_type))
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                'SELECT {} FROM hashes WHERE dev = ? AND ino = ? AND '
+                'size = ? AND mtime_ns = ?'.format(hash_type),
+                _key(st)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def put(self, file_path, hashes, st):
+        """Remember `hashes` (a dict of digests) of `file_path`.
+
+        `st` is the `os.stat` result taken before the file was read. Nothing
+        is stored if the file changed since then or was modified so
+        recently that a change could go unnoticed.
+        """
+        try:
+            now = os.stat(file_path)
+        except OSError:
+            return
+        if _key(now) != _key(st) or \
+           now.st_mtime > time.time() - RACY_SECONDS:
+            return
+
+        dev, ino, size, mtime = _key(st)
+        with self._lock, self._db:
+            row = self._db.execute(
+                'SELECT md5, sha256 FROM hashes WHERE dev = ? AND ino = ? '
+                'AND size = ? AND mtime_ns = ?', _key(st)).fetchone()
+            # keep digests of the other type computed earlier
+            md5, sha256 = row if row is not None else (None, None)
+            self._db.execute(
+                'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (dev, ino, size, mtime, os.path.abspath(file_path),
+                 hashes.get('md5', md5), hashes.get('sha256', sha256)))
+
+
+def set_hash_cache(cache):
+    """Use the `HashCache` `cache` for all checksums. None disables it."""
+    global _cache
+    _cache = cache
+
+
+def get_hash_cache():
+    """Return the active `HashCache` or None."""
+    return _cache
@@ -0,0 +1,91 @@
+"""Journal of finished uploads
+
+Uploading a large directory can take hours. An `UploadJournal` records each
+file once it is uploaded, so that running the same upload again after a
+failure skips everything that already made it to the OSF.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from .utils import makedirs
+from .utils import mtime_ns
+from .utils import user_cache_dir
+
+
+def journal_path(*key):
+    """Default journal location for an upload identified by `key`.
+
+    Use for example the project, the destination and the local source, so
+    that repeating the same command finds the journal again.
+    """
+    name = hashlib.sha1(
+        json.dumps([str(part) for part in key]).encode('utf-8')).hexdigest()
+    return os.path.join(user_cache_dir(), 'uploads', name + '.journal')
+
+
+class UploadJournal(object):
+    """Append-only record of uploaded files stored at `path`.
+
+    Every line holds the local and remote path plus size and modification
+    time of the local file. A file counts as done only while its size and
+    modification time are unchanged. Lines are flushed to disk as they are
+    written, a line cut short by a crash is ignored.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._done = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        key = (entry['local'], entry['remote'])
+                        self._done[key] = (entry['size'], entry['mtime_ns'])
+                    except (ValueError, KeyError):
+                        continue
+        else:
+            makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fp = open(path, 'a')
+
+    def _key(self, local_path, remote_path):
+        return os.path.abspath(local_path), remote_path
+
+    def done(self, local_path, remote_path):
+        """True if `local_path` was uploaded to `remote_path` unchanged."""
+        recorded = self._done.get(self._key(local_path, remote_path))
+        if recorded is None:
+            return False
+        try:
+            st = os.stat(local_path)
+        except OSError:
+            return False
+        return recorded == (st.st_size, mtime_ns(st))
+
+    def record(self, local_path, remote_path, st):
+        """Note that `local_path` was uploaded to `remote_path`.
+
+        `st` is the `os.stat` result of the file taken before the upload.
+        """
+        local_path, remote_path = self._key(local_path, remote_path)
+        entry = {'local': local_path, 'remote': remote_path,
+                 'size': st.st_size, 'mtime_ns': mtime_ns(st)}
+        with self._lock:
+            self._done[(local_path, remote_path)] = (entry['size'],
+                                                     entry['mtime_ns'])
+            self._fp.write(json.dumps(entry) + '\n')
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+
+    def close(self):
+        self._fp.close()
+
+    def remove(self):
+        """Close and delete the journal, call once the upload is complete."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
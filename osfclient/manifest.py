@@ -0,0 +1,132 @@
+"""Manifest of cloned files
+
+`clone` writes a `Manifest` into the output directory that lists every file
+it wrote together with what the remote file looked like at the time and the
+size and modification time of the local copy. A later `clone --update`
+skips every file whose remote and local side both still match the manifest
+without opening it, so only added and changed files cost more than a
+`stat`.
+"""
+import json
+import os
+
+from .utils import makedirs
+from .utils import mtime_ns
+
+
+MANIFEST_NAME = '.osfclient-manifest.json'
+
+# version of the manifest format
+VERSION = 1
+
+
+def _remote(file_):
+    """What the manifest records about the remote `file_`."""
+    return {'id': file_.id, 'size': file_.size,
+            'md5': (file_.hashes or {}).get('md5'),
+            'date_modified': file_.date_modified}
+
+
+class Manifest(object):
+    """Files written by `clone` below `root`, by path relative to `root`.
+
+    A missing or unreadable manifest is treated as empty.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, MANIFEST_NAME)
+        self.entries = {}
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') == VERSION:
+                self.entries = manifest['files']
+        except (IOError, OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def _key(self, local_path):
+        return os.path.relpath(local_path, self.root).replace(os.sep, '/')
+
+    def _local_path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def unchanged(self, file_, local_path):
+        """True if neither `file_` nor `local_path` changed since recorded.
+
+        Remote files without md5 and modification date are never
+        considered unchanged.
+        """
+        entry = self.entries.get(self._key(local_path))
+        if entry is None:
+            return False
+        remote = _remote(file_)
+        if remote['md5'] is None and remote['date_modified'] is None:
+            return False
+        if any(entry.get(name) != value for name, value in remote.items()):
+            return False
+        return self._local_unchanged(entry, local_path)
+
+    def _local_unchanged(self, entry, local_path):
+        try:
+            st = os.stat(local_path)
+        except OSError:
+            return False
+        return (st.st_size, mtime_ns(st)) == \
+            (entry.get('local_size'), entry.get('mtime_ns'))
+
+    def record(self, file_, local_path):
+        """Note that `local_path` now holds the contents of `file_`."""
+        st = os.stat(local_path)
+        entry = _remote(file_)
+        entry.update(local_size=st.st_size, mtime_ns=mtime_ns(st))
+        self.entries[self._key(local_path)] = entry
+
+    def forget(self, local_path):
+        """Drop the entry of `local_path`."""
+        self.entries.pop(self._key(local_path), None)
+
+    def _stale_keys(self, seen, listed):
+        seen = set(self._key(path) for path in seen)
+        return [key for key in sorted(set(self.entries) - seen)
+                if listed is None or listed(key)]
+
+    def stale(self, seen, listed=None):
+        """Local paths `remove_stale(seen, listed)` would delete."""
+        return [self._local_path(key)
+                for key in self._stale_keys(seen, listed)
+                if self._local_unchanged(self.entries[key],
+                                         self._local_path(key))]
+
+    def remove_stale(self, seen, listed=None):
+        """Delete local files whose remote file is gone.
+
+        `seen` holds the local paths of all files that are still in the
+        remote listing. Entries of other files are dropped, their local
+        copies are deleted unless they were modified locally. Returns the
+        deleted paths.
+
+        If the listing was filtered, `listed` is called with the path of
+        an entry relative to the root and entries it returns False for
+        are kept: their remote files were not listed, not removed.
+        """
+        removed = []
+        for key in self._stale_keys(seen, listed):
+            entry = self.entries.pop(key)
+            local_path = self._local_path(key)
+            if self._local_unchanged(entry, local_path):
+                os.remove(local_path)
+                removed.append(local_path)
+        return removed
+
+    def save(self):
+        """Write the manifest, replacing the old one atomically."""
+        makedirs(self.root, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': VERSION, 'files': self.entries}, f,
+                      sort_keys=True)
+        if hasattr(os, 'replace'):
+            os.replace(tmp_path, self.path)
+        else:
+            # python 2, can not replace on windows
+            os.rename(tmp_path, self.path)
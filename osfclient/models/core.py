@@ -1,6 +1,16 @@
 import numbers
+import time
+
+from requests.exceptions import ConnectionError
 
 from .session import OSFSession
+from ..throttle import get_limiter
+from ..upload import UploadStream
+from ..upload import is_seekable
+
+
+# server side errors worth trying an upload again for
+RETRY_STATUS_CODES = (500, 502, 503, 504)
 
 
 # Base class for all models and the user facing API object
@@ -25,6 +35,52 @@ class OSFCore(object):
     def _put(self, url, *args, **kwargs):
         return self.session.put(url, *args, **kwargs)
 
+    def _put_file(self, url, fp, progress=None, **kwargs):
+        """PUT the rest of `fp` to `url`.
+
+        The upload is hashed while it is sent and checked against the
+        hashes in the response. `progress` is called with the number of
+        bytes sent, it gets a negative number when an upload restarts.
+
+        Failed uploads are retried from the current position of `fp` as
+        configured with `OSFSession.set_upload_retries`. WaterButler can
+        not resume a partial upload, every attempt sends the whole body.
+        Streams that can not be rewound are not retried.
+
+        The response gets the number of `upload_attempts` made and the
+        `upload_digests` of the body sent last.
+        """
+        retries = self.session.upload_retries
+        if retries and not is_seekable(fp):
+            retries = 0
+        if retries:
+            start = fp.tell()
+
+        attempt = 0
+        while True:
+            body = UploadStream(fp, get_limiter(), progress)
+            try:
+                response = self._put(url, data=body, **kwargs)
+            except ConnectionError:
+                if attempt >= retries:
+                    raise
+            else:
+                if attempt >= retries or \
+                   response.status_code not in RETRY_STATUS_CODES:
+                    if response.status_code in (200, 201):
+                        body.verify(response, getattr(self, 'path', url))
+                    # lets callers tell a conflict with an earlier attempt
+                    # of this upload from one with another file
+                    response.upload_attempts = attempt + 1
+                    response.upload_digests = body.hexdigests()
+                    return response
+
+            if progress is not None and body.n_bytes:
+                progress(-body.n_bytes)
+            time.sleep(self.session.upload_backoff * 2 ** attempt)
+            attempt += 1
+            fp.seek(start)
+
     def _post(self, url, *args, **kwargs):
         return self.session.post(url, *args, **kwargs)
 
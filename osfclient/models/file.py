@@ -1,24 +1,60 @@
 from tqdm import tqdm
 
 from .core import OSFCore
+from .reader import RemoteFileReader
+from ..archive import extract_stream
 from ..exceptions import FolderExistsException, UnauthorizedException
+from ..throttle import ThrottledReader
+from ..throttle import get_limiter
+from ..upload import upload_source
 
 
-def copyfileobj(fsrc, fdst, total, length=16*1024):
+def copyfileobj(fsrc, fdst, total, length=16*1024, progress=None,
+                throttle=True):
     """Copy data from file-like object fsrc to file-like object fdst
 
-    This is like shutil.copyfileobj but with a progressbar.
+    This is like shutil.copyfileobj but with a progressbar. Respects the
+    bandwidth limit set with `osfclient.throttle.set_bandwidth_limit()`
+    unless `throttle` is False, as for copies between local files.
+
+    Instead of showing a progress bar the number of bytes copied is passed
+    to `progress` if given.
     """
-    with tqdm(unit='bytes', total=total, unit_scale=True) as pbar:
+    limiter = get_limiter() if throttle else None
+    if progress is None:
+        pbar = tqdm(unit='bytes', total=total, unit_scale=True)
+        progress = pbar.update
+    else:
+        pbar = None
+    try:
         while 1:
             buf = fsrc.read(length)
             if not buf:
                 break
+            if limiter is not None:
+                limiter.consume(len(buf))
             fdst.write(buf)
-            pbar.update(len(buf))
+            progress(len(buf))
+    finally:
+        if pbar is not None:
+            pbar.close()
+
+
+class _Tee(object):
+    """Write to a file and a second writer at the same time."""
+    def __init__(self, fp, other):
+        self.fp = fp
+        self.other = other
+
+    def write(self, data):
+        self.fp.write(data)
+        self.other.write(data)
 
 
 class File(OSFCore):
+    # the `Storage` this file was listed from
+    _storage = None
+
     def _update_attributes(self, file):
         if not file:
             return
@@ -45,49 +81,126 @@ class File(OSFCore):
     def __str__(self):
         return '<File [{0}, {1}]>'.format(self.id, self.path)
 
-    def write_to(self, fp):
+    def write_to(self, fp, cache=None, progress=None):
         """Write contents of this file to a local file.
 
         Pass in a filepointer `fp` that has been opened for writing in
-        binary mode.
+        binary mode. `progress` is called with the number of bytes written
+        instead of showing a progress bar.
+
+        Pass a `BlobStore` as `cache` to copy the contents from it instead
+        of downloading them, if they are stored already. Otherwise the
+        downloaded contents are added to the store.
         """
         if 'b' not in fp.mode:
             raise ValueError("File has to be opened in binary mode.")
 
+        if cache is not None:
+            blob = cache.open(self.hashes)
+            if blob is not None:
+                with blob:
+                    # a local copy, the bandwidth limit is for the network
+                    copyfileobj(blob, fp, self.size, progress=progress,
+                                throttle=False)
+                return
+
         try:
             response = self._get(self._download_url, stream=True)
         except UnauthorizedException:
             response = self._get(self._upload_url, stream=True)
         if response.status_code == 200:
             response.raw.decode_content = True
-            copyfileobj(response.raw, fp,
-                        int(response.headers['Content-Length']))
+            writer = None
+            if cache is not None:
+                writer = cache.writer(self.hashes)
+            if writer is None:
+                copyfileobj(response.raw, fp,
+                            int(response.headers['Content-Length']),
+                            progress=progress)
+                return
+
+            try:
+                copyfileobj(response.raw, _Tee(fp, writer),
+                            int(response.headers['Content-Length']),
+                            progress=progress)
+            except Exception:
+                writer.abort()
+                raise
+            writer.commit()
 
         else:
             raise RuntimeError("Response has status "
                                "code {}.".format(response.status_code))
 
+    def open(self, **kwargs):
+        """Open this file for random access reading.
+
+        Returns a seekable, read-only binary file-like object. Only the
+        parts of the file that are read are downloaded, using HTTP Range
+        requests. Keyword arguments are passed on to `RemoteFileReader`,
+        use them to tune `block_size`, `cache_size` and `max_readahead`.
+        """
+        return RemoteFileReader(self, **kwargs)
+
+    def _get_ranged(self, start, end):
+        headers = {'Range': 'bytes={}-{}'.format(start, end)}
+        try:
+            response = self._get(self._download_url, headers=headers)
+        except UnauthorizedException:
+            response = self._get(self._upload_url, headers=headers)
+        if response.status_code not in (200, 206, 416):
+            raise RuntimeError("Response has status "
+                               "code {}.".format(response.status_code))
+        return response
+
+    def _get_range(self, start, end):
+        """Fetch bytes `start` to `end` (inclusive) of this file."""
+        response = self._get_ranged(start, end)
+        if response.status_code == 416:
+            return b''
+        elif response.status_code == 200:
+            # the server ignored the Range header and sent everything
+            return response.content[start:end + 1]
+        return response.content
+
+    def _get_size(self):
+        """Ask the server for the size of this file."""
+        response = self._get_ranged(0, 0)
+        content_range = response.headers.get('Content-Range', '')
+        if '/' in content_range:
+            total = content_range.rsplit('/', 1)[1]
+            if total != '*':
+                return int(total)
+        if response.status_code == 200:
+            return len(response.content)
+        return 0
+
+    def _forget(self):
+        # the cached listing of our folder no longer matches
+        if self._storage is not None:
+            self._storage._forget_file(self.path)
+
     def remove(self):
         """Remove this file from the remote storage."""
         response = self._delete(self._delete_url)
         if response.status_code != 204:
             raise RuntimeError('Could not delete {}.'.format(self.path))
+        self._forget()
 
-    def update(self, fp):
+    def update(self, fp, progress=None):
         """Update the remote file from a local file.
 
         Pass in a filepointer `fp` that has been opened for writing in
-        binary mode.
+        binary mode. `progress` is called with the number of bytes sent.
         """
-        if 'b' not in fp.mode:
-            raise ValueError("File has to be opened in binary mode.")
+        fp = upload_source(fp)
 
         url = self._upload_url
         # peek at the file to check if it is an ampty file which needs special
         # handling in requests. If we pass a file like object to data that
         # turns out to be of length zero then no file is created on the OSF
         if fp.peek(1):
-            response = self._put(url, data=fp)
+            response = self._put_file(url, fp, progress)
         else:
             response = self._put(url, data=b'')
 
@@ -112,9 +225,13 @@ class File(OSFCore):
             raise RuntimeError('Could not move {} (status '
                                'code: {}).'.format(self.path,
                                                    response.status_code))
+        self._forget()
 
 
 class ContainerMixin:
+    # the `Storage` this container belongs to, it caches folders by path
+    _storage = None
+
     def _iter_children(self, url, kind, klass, recurse=None,
                        target_filter=None):
         """Iterate over all children of `kind`
@@ -131,7 +248,9 @@ class ContainerMixin:
                 continue
             kind_ = child['attributes']['kind']
             if kind_ == kind:
-                yield klass(child, self.session)
+                obj = klass(child, self.session)
+                obj._storage = self._storage
+                yield obj
             if kind_ != 'file' and recurse is not None:
                 # recurse into a child and add entries to `children`
                 url = self._get_attribute(child, *recurse)
@@ -151,6 +270,43 @@ class ContainerMixin:
         """Iterate over top-level folders in this folder."""
         return self._iter_children(self._files_url, 'folder', Folder)
 
+    def _get_zip(self):
+        """Response streaming this folder as zip archive."""
+        # WaterButler zips a folder when it is downloaded with ?zip=
+        response = self._get(self._new_file_url, params={'zip': ''},
+                             stream=True)
+        if response.status_code != 200:
+            raise RuntimeError("Response has status code {} while "
+                               "downloading {} as zip.".format(
+                                   response.status_code,
+                                   self._new_file_url))
+        response.raw.decode_content = True
+        return response
+
+    def download_zip(self, fp, progress=None):
+        """Write this folder with everything below it to `fp` as zip.
+
+        The archive is built by the server and streamed with a single
+        request. Pass in a filepointer `fp` opened for writing in binary
+        mode. `progress` is called with the number of bytes written instead
+        of showing a progress bar.
+        """
+        response = self._get_zip()
+        total = response.headers.get('Content-Length')
+        copyfileobj(response.raw, fp, int(total) if total else None,
+                    progress=progress)
+
+    def extract_zip(self, path, progress=None):
+        """Download this folder as zip and extract it below `path`.
+
+        Files are extracted while the archive is downloaded, `progress` is
+        called with the number of bytes extracted. Returns the local paths
+        of the files.
+        """
+        response = self._get_zip()
+        return extract_stream(ThrottledReader(response.raw, get_limiter()),
+                              path, progress=progress)
+
     def create_folder(self, name, exist_ok=False):
         url = self._new_folder_url
         # Create a new sub-folder
@@ -164,7 +320,9 @@ class ContainerMixin:
                     return folder
 
         elif response.status_code == 201:
-            return _WaterButlerFolder(response.json()['data'], self.session)
+            folder = _WaterButlerFolder(response.json()['data'], self.session)
+            folder._storage = self._storage
+            return folder
 
         else:
             raise RuntimeError("Response has status code {} while creating "
@@ -202,11 +360,17 @@ class Folder(OSFCore, ContainerMixin):
     def __str__(self):
         return '<Folder [{0}, {1}]>'.format(self.id, self.path)
 
+    def _forget(self):
+        # this folder moved or is gone, cached lookups are wrong now
+        if self._storage is not None:
+            self._storage._forget_folder(self.path)
+
     def remove(self):
         """Remove this folder from the remote storage."""
         response = self._delete(self._delete_url)
         if response.status_code != 204:
             raise RuntimeError('Could not delete {}.'.format(self.path))
+        self._forget()
 
     def move_to(self, storage, to_folder, to_foldername=None, force=False):
         """Move this file to the remote storage."""
@@ -224,6 +388,7 @@ class Folder(OSFCore, ContainerMixin):
             raise RuntimeError('Could not move {} (status '
                                'code: {}).'.format(self.path,
                                                    response.status_code))
+        self._forget()
 
 
 class _WaterButlerFolder(OSFCore, ContainerMixin):
@@ -249,3 +414,32 @@ class _WaterButlerFolder(OSFCore, ContainerMixin):
         self._new_folder_url = self._get_attribute(file, 'links', 'new_folder')
         self._new_file_url = self._get_attribute(file, 'links', 'upload')
         self._move_url = self._get_attribute(file, 'links', 'move')
+
+
+class _WaterButlerFile(File):
+    """A slimmed down `File` built from the WaterButler response to an upload
+
+    This representation is enough to compare the file with a local one
+    and to update, move or remove it.
+
+    Users should never see this, always show them a full `File`.
+    """
+    def _update_attributes(self, file):
+        if not file:
+            return
+
+        self.id = self._get_attribute(file, 'id')
+
+        self._endpoint = None
+        self._download_url = self._get_attribute(file, 'links', 'download')
+        self._upload_url = self._get_attribute(file, 'links', 'upload')
+        self._delete_url = self._get_attribute(file, 'links', 'delete')
+        self._move_url = self._get_attribute(file, 'links', 'move')
+        self.osf_path = self._get_attribute(file, 'attributes', 'path')
+        self.path = self._get_attribute(file, 'attributes', 'materialized')
+        self.name = self._get_attribute(file, 'attributes', 'name')
+        self.date_created = None
+        self.date_modified = file['attributes'].get('modified')
+        self.size = self._get_attribute(file, 'attributes', 'size')
+        self.hashes = self._get_attribute(file,
+                                          'attributes', 'extra', 'hashes')
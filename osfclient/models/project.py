@@ -3,6 +3,7 @@ from .storage import Storage
 
 
 class Project(OSFCore):
+    _children_url = None
     _types = [
         'nodes',
         'registrations'
@@ -24,6 +25,12 @@ class Project(OSFCore):
         storages = ['relationships', 'files', 'links', 'related', 'href']
         self._storages_url = self._get_attribute(project, *storages)
 
+        children = ['relationships', 'children', 'links', 'related', 'href']
+        try:
+            self._children_url = self._get_attribute(project, *children)
+        except KeyError:
+            self._children_url = None
+
     def __str__(self):
         return '<Project [{0}]>'.format(self.id)
 
@@ -46,3 +53,15 @@ class Project(OSFCore):
         stores = stores['data']
         for store in stores:
             yield Storage(store, self.session)
+
+    @property
+    def children(self):
+        """Iterate over the child components of this project.
+
+        Only direct children are listed, use `children` of each of them to
+        find their components.
+        """
+        if self._children_url is None:
+            return
+        for child in self._follow_next(self._children_url):
+            yield Project({'data': child}, self.session)
@@ -0,0 +1,158 @@
+"""Random access to remote files.
+
+`RemoteFileReader` is what `File.open()` returns. It fetches the parts of a
+file that are actually read with HTTP Range requests and keeps recently used
+blocks in memory.
+"""
+from collections import OrderedDict
+import io
+import os
+
+
+# 256 KiB blocks keep small reads (headers, index tables) cheap, sequential
+# reads ramp up the read-ahead window so large scans need few requests.
+DEFAULT_BLOCK_SIZE = 256 * 1024
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024
+DEFAULT_MAX_READAHEAD = 64
+
+
+class RemoteFileReader(io.RawIOBase):
+    """Seekable, read-only binary file-like object for a remote `File`.
+
+    Data is fetched in blocks of `block_size` bytes. Blocks are kept in a
+    least recently used cache which never holds more than `cache_size`
+    bytes. When reads are sequential each request fetches more blocks in one
+    go (up to `max_readahead` blocks), random access falls back to fetching
+    a single block.
+    """
+    def __init__(self, file_, block_size=DEFAULT_BLOCK_SIZE,
+                 cache_size=DEFAULT_CACHE_SIZE,
+                 max_readahead=DEFAULT_MAX_READAHEAD):
+        super(RemoteFileReader, self).__init__()
+        if block_size <= 0:
+            raise ValueError("block_size has to be positive.")
+        self._file = file_
+        self.name = file_.path
+        self.block_size = block_size
+        self.cache_size = max(cache_size, block_size)
+        self.max_readahead = max(max_readahead, 1)
+
+        self._pos = 0
+        self._blocks = OrderedDict()
+        self._cached_bytes = 0
+        self._readahead = 1
+        # index of the block following the last run of fetched blocks, a
+        # miss on this block means we are reading sequentially
+        self._next_block = None
+
+        self.size = file_.size
+        if self.size is None:
+            self.size = file_._get_size()
+
+    @property
+    def mode(self):
+        return 'rb'
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._checkClosed()
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError("Invalid whence ({}).".format(whence))
+
+        if pos < 0:
+            raise ValueError("Negative seek position {}.".format(pos))
+        self._pos = pos
+        return self._pos
+
+    def readinto(self, b):
+        self._checkClosed()
+        view = memoryview(b)
+        wanted = min(len(view), max(self.size - self._pos, 0))
+
+        copied = 0
+        while copied < wanted:
+            index, offset = divmod(self._pos, self.block_size)
+            block = self._get_block(index)
+            chunk = block[offset:offset + wanted - copied]
+            if not chunk:
+                # the remote file is shorter than advertised
+                break
+            view[copied:copied + len(chunk)] = chunk
+            copied += len(chunk)
+            self._pos += len(chunk)
+
+        return copied
+
+    def readall(self):
+        self._checkClosed()
+        remaining = max(self.size - self._pos, 0)
+        buf = bytearray(remaining)
+        n = self.readinto(buf)
+        return bytes(buf[:n])
+
+    def close(self):
+        self._blocks.clear()
+        self._cached_bytes = 0
+        super(RemoteFileReader, self).close()
+
+    def _n_blocks(self):
+        return (self.size + self.block_size - 1) // self.block_size
+
+    def _get_block(self, index):
+        """Return block `index`, fetching it (and read-ahead) if needed."""
+        if index in self._blocks:
+            # re-insert to mark the block as most recently used
+            block = self._blocks.pop(index)
+            self._blocks[index] = block
+            return block
+
+        if index == self._next_block:
+            self._readahead = min(self._readahead * 2, self.max_readahead)
+        else:
+            self._readahead = 1
+
+        # never fetch more than fits in the cache, never past the end of the
+        # file and stop at the first block we already have
+        max_blocks = max(self.cache_size // self.block_size, 1)
+        count = 1
+        limit = min(self._readahead, max_blocks, self._n_blocks() - index)
+        while count < limit and (index + count) not in self._blocks:
+            count += 1
+
+        start = index * self.block_size
+        end = min((index + count) * self.block_size, self.size) - 1
+        data = self._file._get_range(start, end)
+        self._next_block = index + count
+
+        first = None
+        for i in range(count):
+            block = data[i * self.block_size:(i + 1) * self.block_size]
+            if i == 0:
+                first = block
+            if not block:
+                break
+            self._store_block(index + i, block)
+
+        return first
+
+    def _store_block(self, index, block):
+        self._blocks[index] = block
+        self._cached_bytes += len(block)
+        while self._cached_bytes > self.cache_size and len(self._blocks) > 1:
+            _, evicted = self._blocks.popitem(last=False)
+            self._cached_bytes -= len(evicted)
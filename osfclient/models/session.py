@@ -1,10 +1,15 @@
 import requests
+from requests.adapters import HTTPAdapter
 
 from ..exceptions import UnauthorizedException
 
 
 class OSFSession(requests.Session):
     auth = None
+    # how often to retry a failed file upload and the delay before the
+    # first retry in seconds, see `set_upload_retries`
+    upload_retries = 0
+    upload_backoff = 1.
     __attrs__ = requests.Session.__attrs__ + ['base_url']
 
     def __init__(self):
@@ -25,6 +30,24 @@ class OSFSession(requests.Session):
     def set_endpoint(self, base_url):
         self.base_url = base_url
 
+    def set_pool_size(self, size):
+        """Keep up to `size` connections open per host.
+
+        Use this when `size` threads share this session.
+        """
+        adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def set_upload_retries(self, retries, backoff=1.):
+        """Retry file uploads that fail up to `retries` times.
+
+        Uploads are retried after connection errors and 5xx responses. The
+        delay starts at `backoff` seconds and doubles after each attempt.
+        """
+        self.upload_retries = retries
+        self.upload_backoff = backoff
+
     def basic_auth(self, username, password):
         self.auth = (username, password)
         if 'Authorization' in self.headers:
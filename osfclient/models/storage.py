@@ -1,5 +1,6 @@
 import os
 import six
+import threading
 
 from requests.exceptions import ConnectionError
 
@@ -7,10 +8,15 @@ from .core import OSFCore
 from .file import ContainerMixin
 from .file import File
 from .file import Folder
+from .file import _WaterButlerFile
+from .file import _WaterButlerFolder
 from ..utils import checksum
 from ..utils import file_empty
 from ..utils import get_local_file_size
 from ..utils import norm_remote_path
+from ..upload import StreamSource
+from ..upload import is_seekable
+from ..upload import upload_source
 
 
 if six.PY2:
@@ -21,10 +27,44 @@ if six.PY2:
         """
 
 
+# files at least this large are looked up before uploading them
+PREFLIGHT_SIZE = 2**20
+
+
+def _body_size(fp):
+    """Size of the local file `fp` or 0 if it is unknown."""
+    try:
+        return get_local_file_size(fp)
+    except (AttributeError, TypeError, ValueError, OSError):
+        return 0
+
+
+def _has_digests(file_, digests):
+    """True if the remote `file_` has the `digests` of an upload."""
+    remote = file_.hashes or {}
+    matched = False
+    for hash_type, digest in digests.items():
+        remote_digest = remote.get(hash_type)
+        if remote_digest:
+            if remote_digest.lower() != digest:
+                return False
+            matched = True
+    return matched
+
+
 class Storage(OSFCore, ContainerMixin):
     _files_key = ('relationships', 'files', 'links', 'related', 'href')
 
     def _update_attributes(self, storage):
+        self._storage = self
+        # folder instances by normalized path, '' is the storage itself
+        self._folder_cache = {}
+        # files directly inside a folder by folder path, name -> `File`
+        self._listings = {}
+        self._cache_lock = threading.RLock()
+        # events of the folders being created, by path
+        self._creating = {}
+
         if not storage:
             return
 
@@ -70,81 +110,280 @@ class Storage(OSFCore, ContainerMixin):
         return self._iter_children(self._files_url, 'file', File,
                                    self._files_key, target_filter)
 
-    def create_file(self, path, fp, force=False, update=False):
+    def create_folder(self, name, exist_ok=False):
+        """Create the folder `name` in this storage.
+
+        `name` can be a path like `a/b/c`, missing parent folders are
+        created. Folders are cached by path, so each folder is created or
+        looked up only once per `Storage` instance.
+        """
+        path = norm_remote_path(name)
+        parent_path, folder_name = os.path.split(path)
+        parent = self._folder(parent_path)
+
+        while True:
+            with self._cache_lock:
+                if exist_ok and path in self._folder_cache:
+                    return self._folder_cache[path]
+                creating = self._creating.get(path)
+                if creating is None:
+                    creating = self._creating[path] = threading.Event()
+                    break
+            # another thread is creating this folder, use its result
+            creating.wait()
+
+        # the lock is not held while talking to the server so that other
+        # folders can be created at the same time
+        try:
+            if parent is self:
+                folder = super(Storage, self).create_folder(folder_name,
+                                                            exist_ok)
+            else:
+                folder = parent.create_folder(folder_name, exist_ok)
+            folder._storage = self
+            with self._cache_lock:
+                self._folder_cache[path] = folder
+                if isinstance(folder, _WaterButlerFolder):
+                    # we just created it, nothing to list
+                    self._listings[path] = {}
+        finally:
+            with self._cache_lock:
+                del self._creating[path]
+            creating.set()
+        return folder
+
+    def _folder(self, path):
+        """Return the folder at `path`, create it if it does not exist."""
+        path = norm_remote_path(path) if path else ''
+        if path in ('', '.'):
+            return self
+        with self._cache_lock:
+            if path in self._folder_cache:
+                return self._folder_cache[path]
+        return self.create_folder(path, exist_ok=True)
+
+    def _forget_folder(self, path):
+        """Drop `path` and everything below it from the folder cache."""
+        path = norm_remote_path(path)
+        with self._cache_lock:
+            for cache in (self._folder_cache, self._listings):
+                for cached in list(cache):
+                    if cached == path or cached.startswith(path + '/'):
+                        del cache[cached]
+            self._listings.pop(os.path.dirname(path), None)
+
+    def _forget_file(self, path):
+        """Drop the cached listing of the folder containing `path`."""
+        directory = os.path.dirname(norm_remote_path(path))
+        with self._cache_lock:
+            self._listings.pop(directory, None)
+
+    def _listing(self, directory, refresh=False):
+        """Files directly inside the folder `directory`, by name.
+
+        The folder is listed once and the result cached, so checking many
+        files in the same folder costs a single request.
+        """
+        directory = norm_remote_path(directory) if directory else ''
+        if directory == '.':
+            directory = ''
+        with self._cache_lock:
+            if not refresh and directory in self._listings:
+                return self._listings[directory]
+
+        self._folder(directory)
+        with self._cache_lock:
+            if not refresh and directory in self._listings:
+                # the folder was just created
+                return self._listings[directory]
+
+        folder = self._listable_folder(directory)
+        listing = {}
+        if folder is not None:
+            for file_ in folder._iter_children(folder._files_url, 'file',
+                                               File):
+                listing[file_.name] = file_
+
+        with self._cache_lock:
+            self._listings[directory] = listing
+        return listing
+
+    def _listable_folder(self, path):
+        """The folder at `path` in a form that can be listed.
+
+        Folders created by this instance are cached as they were returned
+        by WaterButler, which can not be listed. Those are looked up in the
+        listing of their parent instead. Returns None if the folder is not
+        found there.
+        """
+        folder = self._folder(path)
+        if getattr(folder, '_files_url', None) is not None:
+            return folder
+        if folder is self:
+            return None
+
+        parent_path, name = os.path.split(path)
+        parent = self._listable_folder(parent_path)
+        if parent is None:
+            return None
+        for listed in parent._iter_children(parent._files_url, 'folder',
+                                            Folder):
+            if listed.name == name:
+                listed._storage = self
+                with self._cache_lock:
+                    self._folder_cache[path] = listed
+                return listed
+        return None
+
+    def _remember_file(self, directory, response):
+        """Add the file uploaded with `response` to the cached listing."""
+        with self._cache_lock:
+            listing = self._listings.get(directory)
+        if listing is None:
+            return
+        try:
+            file_ = _WaterButlerFile(response.json()['data'], self.session)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            # we can not tell what was stored, list the folder next time
+            with self._cache_lock:
+                self._listings.pop(directory, None)
+            return
+        file_._storage = self
+        with self._cache_lock:
+            listing[file_.name] = file_
+
+    def _existing_file(self, path, refresh=False):
+        """Return the remote `File` at `path` or None if there is none."""
+        directory, fname = os.path.split(norm_remote_path(path))
+        return self._listing(directory, refresh).get(fname)
+
+    def _update_existing(self, file_, fp, force, progress=None):
+        """Overwrite `file_` with `fp` unless unchanged and not `force`.
+
+        Returns False if nothing was uploaded.
+        """
+        if not force:
+            if checksum(fp.name) == file_.hashes.get('md5'):
+                return False
+        # we might have read from `fp` while trying to create the file
+        fp.seek(0)
+        file_.update(fp, progress=progress)
+        return True
+
+    def create_file(self, path, fp, force=False, update=False,
+                    progress=None):
         """Store a new file at `path` in this storage.
 
         The contents of the file descriptor `fp` (opened in 'rb' mode)
         will be uploaded to `path` which is the full path at
-        which to store the file.
+        which to store the file. `fp` can also be a stream that can not be
+        seeked, like `sys.stdin.buffer`, or an iterable of bytes. Those are
+        sent as they are read and are not retried.
 
         To force overwrite of an existing file, set `force=True`.
         To overwrite an existing file only if the files differ, set `update=True`
+
+        `progress` is called with the number of bytes sent while uploading.
+        The upload is hashed on the way and checked against the hashes the
+        server reports, a `ChecksumMismatchException` is raised if they
+        differ.
+
+        With `force` or `update` the folder of `path` is listed once (and
+        cached) to decide whether to create or update the file. Without
+        them large files are checked for in the listing before uploading.
+
+        Returns False if the file was left alone because it is unchanged,
+        True if its contents were uploaded.
         """
-        if 'b' not in fp.mode:
-            raise ValueError("File has to be opened in binary mode.")
+        fp = upload_source(fp)
+        if update and not force and isinstance(fp, StreamSource):
+            raise ValueError("Can not compare a stream with the remote "
+                             "file, use force to overwrite it.")
 
         # all paths are assumed to be absolute
         path = norm_remote_path(path)
 
         directory, fname = os.path.split(path)
-        directories = directory.split(os.path.sep)
+
+        if force or update:
+            # look the file up in the (cached) listing of its folder instead
+            # of finding out about it from a failed upload
+            file_ = self._existing_file(path)
+            if file_ is not None:
+                return self._update_existing(file_, fp, force, progress)
+
+        elif _body_size(fp) >= PREFLIGHT_SIZE:
+            # the server only rejects an existing file once it has received
+            # the whole body, check before sending it
+            if self._existing_file(path) is not None:
+                raise FileExistsError(path)
+
         # navigate to the right parent object for our file
-        parent = self
-        for directory in directories:
-            # skip empty directory names
-            if directory:
-                parent = parent.create_folder(directory, exist_ok=True)
+        parent = self._folder(directory)
 
         url = parent._new_file_url
 
-        # When uploading a large file (>a few MB) that already exists
-        # we sometimes get a ConnectionError instead of a status == 409.
-        connection_error = False
+        connection_error = None
 
         # peek at the file to check if it is an empty file which needs special
         # handling in requests. If we pass a file like object to data that
         # turns out to be of length zero then no file is created on the OSF.
         # See: https://github.com/osfclient/osfclient/pull/135
-        if file_empty(fp):
+        if isinstance(fp, StreamSource):
+            empty = not fp.peek()
+        else:
+            empty = file_empty(fp)
+        if empty:
             response = self._put(url, params={'name': fname}, data=b'')
         else:
             try:
-                response = self._put(url, params={'name': fname}, data=fp)
-            except ConnectionError:
-                connection_error = True
+                response = self._put_file(url, fp, progress,
+                                          params={'name': fname})
+            except ConnectionError as e:
+                connection_error = e
+
+            if connection_error is None and response.status_code == 404 and \
+               parent is not self and is_seekable(fp):
+                # the cached parent folder was removed behind our back
+                self._forget_folder(directory)
+                parent = self._folder(directory)
+                fp.seek(0)
+                response = self._put_file(parent._new_file_url, fp,
+                                          progress, params={'name': fname})
 
-        if connection_error or response.status_code == 409:
+        if connection_error is not None:
+            # the server may drop the connection instead of answering 409,
+            # find out whether the file exists instead of guessing
+            file_ = self._existing_file(path, refresh=True)
+            if file_ is None:
+                raise connection_error
             if not force and not update:
-                # one-liner to get file size from file pointer from
-                # https://stackoverflow.com/a/283719/2680824
-                file_size_bytes = get_local_file_size(fp)
-                large_file_cutoff = 2**20 # 1 MB in bytes
-                if connection_error and file_size_bytes < large_file_cutoff:
-                    msg = (
-                        "There was a connection error which might mean {} " +
-                        "already exists. Try again with the `--force` flag " +
-                        "specified."
-                    ).format(path)
-                    raise RuntimeError(msg)
-                else:
-                    # note in case of connection error, we are making an inference here
-                    raise FileExistsError(path)
+                raise FileExistsError(path)
+            return self._update_existing(file_, fp, force, progress)
 
-            else:
-                # find the upload URL for the file we are trying to update
-                for file_ in self.files:
-                    if norm_remote_path(file_.path) == path:
-                        if not force:
-                            if checksum(path) == file_.hashes.get('md5'):
-                                # If the hashes are equal and force is False,
-                                # we're done here
-                                break
-                        # in the process of attempting to upload the file we
-                        # moved through it -> reset read position to beginning
-                        # of the file
-                        fp.seek(0)
-                        file_.update(fp)
-                        break
-                else:
-                    raise RuntimeError("Could not create a new file at "
-                                       "({}) nor update it.".format(path))
+        elif response.status_code == 409:
+            if getattr(response, 'upload_attempts', 1) > 1:
+                # an earlier attempt may have been stored before its answer
+                # was lost, then the conflict is with our own upload
+                file_ = self._existing_file(path, refresh=True)
+                if file_ is not None and \
+                   _has_digests(file_, response.upload_digests):
+                    return True
+
+            if not force and not update:
+                raise FileExistsError(path)
+
+            # created by someone else since we listed the folder
+            file_ = self._existing_file(path, refresh=True)
+            if file_ is None:
+                raise RuntimeError("Could not create a new file at "
+                                   "({}) nor update it.".format(path))
+            return self._update_existing(file_, fp, force, progress)
+
+        elif response.status_code not in (200, 201):
+            raise RuntimeError('Could not create {} (status '
+                               'code: {}).'.format(path,
+                                                   response.status_code))
+
+        self._remember_file(directory, response)
+        return True
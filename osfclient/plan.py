@@ -0,0 +1,204 @@
+"""Transfer plans
+
+A `TransferPlan` lists what `clone`, `fetch` or `upload` would do without
+doing it: the files that would be transferred or linked, the local files
+that would be deleted and how many files would be skipped. It is built
+from the remote listings and the local files only, nothing is written.
+
+Plans can be written as JSON and run later with `osf apply`.
+
+Durations are estimated with a `CostModel` for each direction. Clones and
+uploads store the latency and bandwidth they observed in the user's cache
+directory, so estimates follow the connection actually used.
+"""
+import json
+import os
+
+from .scheduler import CostModel
+from .scheduler import predict_makespan
+from .utils import makedirs
+from .utils import user_cache_dir
+
+
+# version of the plan format
+VERSION = 1
+
+# actions that move file contents
+TRANSFERS = ('download', 'upload')
+
+
+def rates_path():
+    """Location of the observed transfer rates in the user's cache."""
+    return os.path.join(user_cache_dir(), 'rates.json')
+
+
+def _load_rates(path):
+    try:
+        with open(path) as f:
+            rates = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    return rates if isinstance(rates, dict) else {}
+
+
+def load_model(direction, path=None):
+    """`CostModel` with the rates last observed for `direction`.
+
+    `direction` is 'download' or 'upload'. Without observations the
+    defaults of `CostModel` are used.
+    """
+    model = CostModel()
+    rates = _load_rates(path or rates_path()).get(direction)
+    try:
+        model.latency = float(rates['latency'])
+        model.bandwidth = float(rates['bandwidth'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    return model
+
+
+def save_model(direction, model, path=None):
+    """Store the latency and bandwidth of `model` for `direction`."""
+    path = path or rates_path()
+    rates = _load_rates(path)
+    rates[direction] = {'latency': model.latency,
+                        'bandwidth': model.bandwidth}
+    makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(rates, f, sort_keys=True)
+    if hasattr(os, 'replace'):
+        os.replace(tmp_path, path)
+    else:
+        # python 2, can not replace on windows
+        os.rename(tmp_path, path)
+
+
+def _format_size(n_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n_bytes < 1000:
+            break
+        n_bytes /= 1000.
+    else:
+        unit = 'TB'
+    return '{:.1f} {}'.format(n_bytes, unit) if unit != 'B' else \
+        '{} B'.format(int(n_bytes))
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '{}h {:02d}m'.format(hours, minutes)
+    if minutes:
+        return '{}m {:02d}s'.format(minutes, seconds)
+    return '{}s'.format(seconds)
+
+
+class TransferPlan(object):
+    """What `command` would do with `options`, using `jobs` workers.
+
+    Each entry of `files` is a dict with the `action` ('download',
+    'upload', 'link' or 'delete'), the `local` path, the `project`,
+    `storage` and `remote` path of the remote file and its `size` (None if
+    unknown). Skipped files are only counted in `skipped`, by reason.
+    """
+    def __init__(self, command, options=None, jobs=1):
+        self.command = command
+        self.options = dict(options or {})
+        self.jobs = jobs
+        self.files = []
+        self.skipped = {}
+
+    def add(self, action, local, project=None, storage=None, remote=None,
+            size=None, **extra):
+        """Add a file the plan would `action`."""
+        entry = dict(extra, action=action, local=local, project=project,
+                     storage=storage, remote=remote, size=size)
+        self.files.append(entry)
+        return entry
+
+    def skip(self, reason, n=1):
+        """Count `n` files skipped for `reason`, e.g. 'unchanged'."""
+        if n:
+            self.skipped[reason] = self.skipped.get(reason, 0) + n
+
+    def _count(self, action):
+        return sum(1 for entry in self.files if entry['action'] == action)
+
+    @property
+    def transfers(self):
+        """Entries that move file contents."""
+        return [entry for entry in self.files
+                if entry['action'] in TRANSFERS]
+
+    @property
+    def n_bytes(self):
+        return sum(entry['size'] or 0 for entry in self.transfers)
+
+    def estimate(self, model):
+        """Predicted seconds to run the plan at the rates of `model`."""
+        sizes = [entry['size'] or 0 for entry in self.transfers]
+        if not sizes:
+            return 0.
+        return predict_makespan(sizes, self.jobs, model)
+
+    def summary(self, model):
+        """Counts, bytes and estimated seconds of the plan as a dict."""
+        transfers = self.transfers
+        return {'files': len(transfers),
+                'bytes': self.n_bytes,
+                'unknown_size': sum(1 for entry in transfers
+                                    if entry['size'] is None),
+                'linked': self._count('link'),
+                'deleted': self._count('delete'),
+                'skipped': dict(self.skipped),
+                'seconds': self.estimate(model),
+                'latency': model.latency,
+                'bandwidth': model.bandwidth}
+
+    def describe(self, model):
+        """The summary as human readable lines."""
+        summary = self.summary(model)
+        verb = 'upload' if self.command == 'upload' else 'download'
+        parts = ['Would {} {} files ({})'.format(
+            verb, summary['files'], _format_size(summary['bytes']))]
+        if summary['linked']:
+            parts.append('link {}'.format(summary['linked']))
+        if summary['deleted']:
+            parts.append('delete {}'.format(summary['deleted']))
+        for reason, n in sorted(summary['skipped'].items()):
+            parts.append('skip {} {}'.format(n, reason))
+        lines = [', '.join(parts) + '.']
+        if summary['unknown_size']:
+            lines.append('The size of {} files is unknown.'.format(
+                summary['unknown_size']))
+        lines.append('Estimated {} at {:.2f} MB/s and {:.2f}s per file with '
+                     '{} jobs.'.format(_format_duration(summary['seconds']),
+                                       model.bandwidth / 1e6, model.latency,
+                                       self.jobs))
+        return '\n'.join(lines)
+
+    def dump(self, fp, model):
+        """Write the plan and its summary as JSON to the text file `fp`."""
+        json.dump({'version': VERSION, 'command': self.command,
+                   'options': self.options, 'jobs': self.jobs,
+                   'files': self.files, 'skipped': self.skipped,
+                   'summary': self.summary(model)},
+                  fp, indent=1, sort_keys=True)
+        fp.write('\n')
+
+    @classmethod
+    def load(cls, fp):
+        """Read a plan written by `dump` from the text file `fp`."""
+        try:
+            data = json.load(fp)
+        except ValueError as e:
+            raise ValueError('Not a transfer plan: {}'.format(e))
+        if not isinstance(data, dict) or data.get('version') != VERSION:
+            raise ValueError('Not a transfer plan of version {}.'.format(
+                VERSION))
+        plan = cls(data['command'], data.get('options'), data.get('jobs', 1))
+        plan.files = data.get('files', [])
+        plan.skipped = data.get('skipped', {})
+        return plan
@@ -0,0 +1,191 @@
+"""Size-aware scheduling of many uploads
+
+Uploading files in the order they are found either ends with one huge file
+running alone while all other workers idle, or lets thousands of tiny files
+hold up the large ones. `UploadScheduler` sorts files into two lanes:
+
+* large files get dedicated workers and are started largest first, so the
+  longest uploads begin as early as possible
+* small files are run through the remaining workers
+
+A `CostModel` fitted to the uploads that finished predicts how long the
+work left in each lane takes. Workers whose lane runs dry, or whose lane is
+far ahead of the other one, help out in the other lane.
+"""
+from collections import deque
+import heapq
+import threading
+import time
+
+
+# files at least this large get the large file lanes
+LARGE_FILE_SIZE = 16 * 2**20
+
+# a worker only leaves its lane if the other lane has this many times more
+# predicted work per worker
+REBALANCE_FACTOR = 2.
+
+
+class CostModel(object):
+    """Predict transfer durations as `latency + size / bandwidth`.
+
+    Starts from a guess and is refitted (least squares) to every observed
+    upload or download.
+    """
+    def __init__(self, latency=0.5, bandwidth=10e6):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._n = 0
+        self._sx = self._sy = self._sxx = self._sxy = 0.
+        self._lock = threading.Lock()
+
+    def observe(self, size, seconds):
+        """Refit the model to a transfer of `size` bytes in `seconds`."""
+        with self._lock:
+            self._n += 1
+            self._sx += size
+            self._sy += seconds
+            self._sxx += size * size
+            self._sxy += size * seconds
+
+            n = self._n
+            variance = n * self._sxx - self._sx ** 2
+            if n > 1 and variance > 0:
+                slope = (n * self._sxy - self._sx * self._sy) / variance
+                latency = (self._sy - slope * self._sx) / n
+            else:
+                slope = self._sy / self._sx if self._sx else 0.
+                latency = 0. if self._sx else self._sy / n
+            if slope > 0:
+                self.bandwidth = 1. / slope
+            self.latency = max(latency, 0.)
+
+    @property
+    def n_observed(self):
+        """Number of transfers the model was fitted to."""
+        return self._n
+
+    def predict(self, size):
+        """Predicted seconds to upload `size` bytes."""
+        return self.latency + size / self.bandwidth
+
+
+def predict_makespan(sizes, workers, model):
+    """Seconds `workers` need for uploads of `sizes`, largest first."""
+    finish = [0.] * max(workers, 1)
+    for size in sorted(sizes, reverse=True):
+        heapq.heappush(finish, heapq.heappop(finish) + model.predict(size))
+    return max(finish)
+
+
+class _Lane(object):
+    def __init__(self, items, workers):
+        # largest first
+        self.queue = deque(sorted(items, key=lambda item: item[1],
+                                  reverse=True))
+        self.workers = workers
+        self.n_bytes = sum(size for _, size in items)
+
+    def backlog(self, model):
+        """Predicted seconds of work left per worker of this lane."""
+        if not self.queue:
+            return 0.
+        total = len(self.queue) * model.latency + \
+            self.n_bytes / model.bandwidth
+        return total / max(self.workers, 1)
+
+    def pop(self):
+        item = self.queue.popleft()
+        self.n_bytes -= item[1]
+        return item
+
+
+class UploadScheduler(object):
+    """Hand out `items`, (item, size) pairs, to `jobs` workers.
+
+    Worker `i` calls `next(i)` for its next item until it gets None and
+    reports every finished item with `done`.
+    """
+    def __init__(self, items, jobs, large_size=LARGE_FILE_SIZE, model=None):
+        self.jobs = jobs
+        self.model = model or CostModel()
+        large = [item for item in items if item[1] >= large_size]
+        small = [item for item in items if item[1] < large_size]
+
+        n_large = min(len(large), jobs // 2) if small else jobs
+        self.large = _Lane(large, n_large)
+        self.small = _Lane(small, jobs - n_large)
+
+        self._sizes = [size for _, size in items]
+        self.n_bytes = sum(self._sizes)
+        self.n_done = 0
+        self.n_skipped = 0
+        self.predicted = predict_makespan(self._sizes, jobs, self.model)
+        self.started = None
+        self.finished = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def _lanes(self, worker):
+        """The lane of `worker` and the other lane."""
+        if worker < self.large.workers:
+            return self.large, self.small
+        return self.small, self.large
+
+    def next(self, worker):
+        """Next (item, size) for `worker` or None if there is nothing left."""
+        with self._lock:
+            if self.started is None:
+                self.started = time.time()
+            if self._cancelled:
+                return None
+            own, other = self._lanes(worker)
+            lane = own
+            if not own.queue:
+                lane = other
+            elif other.queue and other.backlog(self.model) > \
+                    REBALANCE_FACTOR * own.backlog(self.model):
+                lane = other
+            if not lane.queue:
+                return None
+            return lane.pop()
+
+    def done(self, size, seconds):
+        """Report that an item of `size` bytes took `seconds`."""
+        self.model.observe(size, seconds)
+        with self._lock:
+            self.n_done += 1
+            self.finished = time.time()
+
+    def skip(self, size):
+        """Report that an item of `size` bytes needed no upload.
+
+        Nothing was transferred, so the model does not learn from it.
+        """
+        with self._lock:
+            self.n_skipped += 1
+            self.n_bytes -= size
+            self.finished = time.time()
+
+    def cancel(self):
+        """Hand out no further items."""
+        with self._lock:
+            self._cancelled = True
+
+    @property
+    def elapsed(self):
+        if self.started is None or self.finished is None:
+            return 0.
+        return self.finished - self.started
+
+    def summary(self):
+        """Predicted and actual makespan as a human readable string."""
+        replayed = predict_makespan(self._sizes, self.jobs, self.model)
+        summary = ('Uploaded {} files ({:.1f} MB) in {:.1f}s, predicted '
+                   '{:.1f}s ({:.1f}s at the observed {:.2f} MB/s per upload).'
+                   ).format(self.n_done, self.n_bytes / 1e6, self.elapsed,
+                            self.predicted, replayed,
+                            self.model.bandwidth / 1e6)
+        if self.n_skipped:
+            summary += ' Skipped {} unchanged files.'.format(self.n_skipped)
+        return summary
@@ -0,0 +1,10 @@
+from mock import patch
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def save_model():
+    # do not store the rates observed by tests in the user's cache
+    with patch('osfclient.cli.save_model') as save_model:
+        yield save_model
@@ -399,3 +399,38 @@ def files_node(project_id, storage, file_names=['hello.txt'],
     }"""
     return json.loads(wrapper % {'files': json.dumps(files),
                                  'n_files': len(files)})
+
+
+def uploaded_file(osf_id, path, storage='osfstorage', md5=None):
+    """WaterButler's answer to uploading the file at `path`."""
+    template = """{
+    "data": {
+        "id": "%(storage)s/%(osf_id)s",
+        "type": "files",
+        "attributes": {
+            "extra": {
+                "hashes": {
+                    "sha256": null,
+                    "md5": %(md5)s
+                }
+            },
+            "kind": "file",
+            "name": "%(name)s",
+            "path": "/%(osf_id)s",
+            "provider": "%(storage)s",
+            "materialized": "/%(path)s",
+            "modified": "2017-03-20T16:24:57+00:00",
+            "size": 3
+        },
+        "links": {
+            "move": "https://files.osf.io/v1/resources/9zpcy/providers/%(storage)s/%(osf_id)s",
+            "upload": "https://files.osf.io/v1/resources/9zpcy/providers/%(storage)s/%(osf_id)s?kind=file",
+            "delete": "https://files.osf.io/v1/resources/9zpcy/providers/%(storage)s/%(osf_id)s",
+            "download": "https://files.osf.io/v1/resources/9zpcy/providers/%(storage)s/%(osf_id)s"
+        }
+    }
+    }"""
+    return json.loads(template % dict(osf_id=osf_id, path=path,
+                                      name=path.split('/')[-1],
+                                      storage=storage,
+                                      md5=json.dumps(md5)))
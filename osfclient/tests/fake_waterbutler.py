@@ -0,0 +1,143 @@
+"""Minimal local stand-in for the WaterButler upload API
+
+Runs an HTTP server in a thread that accepts file uploads like
+``PUT /v1/resources/<project>/providers/<provider>/?name=<name>``
+(create) and ``PUT /v1/resources/<project>/providers/<provider>/<name>``
+(update) and keeps the uploaded files in memory. Bodies may be sent with
+a Content-Length or with chunked transfer encoding.
+
+Failures can be injected to test retries: `drop` is the number of uploads
+for which the connection is closed without a response after reading the
+body, `errors` is a list of status codes returned for the next uploads
+`lost` is the number of uploads that are stored but answered by closing
+the connection and `corrupt` is the number of uploads stored with their
+last byte changed.
+Responses report the md5 and sha256 of the stored file like WaterButler.
+"""
+import hashlib
+import json
+import threading
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from six.moves.BaseHTTPServer import HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import parse_qs
+from six.moves.urllib.parse import urlparse
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, body=None):
+        data = json.dumps(body or {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if not size:
+                # skip trailers up to the final empty line
+                while self.rfile.readline().strip():
+                    pass
+                return b''.join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_PUT(self):
+        wb = self.server.waterbutler
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = self._read_chunked()
+            chunked = True
+        else:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length)
+            chunked = False
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        prefix = '/v1/resources/{}/providers/{}/'.format(wb.project,
+                                                        wb.provider)
+        if not url.path.startswith(prefix):
+            return self._respond(404)
+        name = url.path[len(prefix):]
+        # kind defaults to file, a name means a new file in the folder
+        creating = 'name' in query
+        if creating:
+            name = name + query['name'][0]
+
+        with wb.lock:
+            wb.requests.append((self.command, self.path, len(body)))
+            wb.chunked.append(chunked)
+            if wb.drop:
+                wb.drop -= 1
+                self.close_connection = True
+                self.connection.close()
+                return
+            if wb.errors:
+                return self._respond(wb.errors.pop(0))
+            if creating and name in wb.files:
+                return self._respond(409)
+            if not creating and name not in wb.files:
+                return self._respond(404)
+            if wb.corrupt:
+                wb.corrupt -= 1
+                last = b'\0' if body[-1:] != b'\0' else b'\1'
+                body = body[:-1] + last
+            wb.files[name] = body
+            if wb.lost:
+                wb.lost -= 1
+                self.close_connection = True
+                self.connection.close()
+                return
+
+        status = 201 if creating else 200
+        hashes = {'md5': hashlib.md5(body).hexdigest(),
+                  'sha256': hashlib.sha256(body).hexdigest()}
+        self._respond(status, {'data': {'attributes': {
+            'name': name, 'extra': {'hashes': hashes}}}})
+
+
+class FakeWaterButler(object):
+    """Context manager running the fake server on a free local port."""
+    def __init__(self, project='f3szh', provider='osfstorage'):
+        self.project = project
+        self.provider = provider
+        self.files = {}
+        self.requests = []
+        self.drop = 0
+        self.errors = []
+        self.lost = 0
+        self.corrupt = 0
+        # whether each request used chunked transfer encoding
+        self.chunked = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/v1/resources/{}/providers/{}/'.format(
+            self._server.server_address[1], self.project, self.provider)
+
+    def __enter__(self):
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.waterbutler = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -10,10 +10,14 @@ def MockFile(name):
     path = PropertyMock(return_value=name)
     type(mock).path = path
     mock._path_mock = path
+    type(mock).id = PropertyMock(return_value='id-' + name)
     hashes_dict = dict(md5='0' * 32, sha256='0' * 64)
     hashes = PropertyMock(return_value=hashes_dict)
     type(mock).hashes = hashes
     mock._hashes_mock = hashes
+    # unknown size and date, comparisons fall back to the hash
+    type(mock).size = PropertyMock(return_value=None)
+    type(mock).date_modified = PropertyMock(return_value=None)
     return mock
 
 
@@ -43,6 +47,9 @@ def MockStorage(name):
     name = PropertyMock(return_value=name)
     type(mock).name = name
     mock._name_mock = name
+    provider = PropertyMock(return_value=name.return_value)
+    type(mock).provider = provider
+    mock._provider_mock = provider
     matched_files = MagicMock(side_effect=make_matched_files(mock))
     type(mock).matched_files = matched_files
     mock._matched_files_mock = matched_files
@@ -50,7 +57,7 @@ def MockStorage(name):
 
 
 def MockProject(name):
-    mock = MagicMock(name='Project-%s' % name,
+    mock = MagicMock(name='Project-%s' % name, id=name, children=[],
                      storages=[MockStorage('osfstorage'), MockStorage('gh')])
     storage = MagicMock(name='Project-%s-storage' % name,
                         return_value=MockStorage('osfstorage'))
@@ -63,11 +70,25 @@ def MockProject(name):
 def MockArgs(username=None, password=None, output=None, project=None,
              source=None, destination=None, local=None, remote=None,
              target=None, force=False, update=False, recursive=False,
-             base_url=None, long_format=False, base_path=None):
+             base_url=None, long_format=False, base_path=None, cache=None,
+             cache_size=None, dedupe=False, limit_rate=None,
+             jobs=1, hash_cache=False, hash_cache_path=None,
+             trust_mtime=False, retries=0,
+             resume=False, delete=False, projects=None,
+             projects_from=None, children=False, include=None,
+             exclude=None, dry_run=False, json=False, plan=None,
+             archive=False, to_tar=None, to_zip=None):
     args = MagicMock(spec=['username', 'password', 'output', 'project',
                            'source', 'destination', 'target', 'force',
                            'recursive', 'base_url', 'long_format',
-                           'base_path'])
+                           'base_path', 'cache', 'cache_size', 'dedupe',
+                           'limit_rate', 'jobs', 'hash_cache',
+                           'hash_cache_path', 'trust_mtime', 'retries',
+                           'resume',
+                           'delete', 'projects', 'projects_from',
+                           'children', 'include', 'exclude', 'dry_run',
+                           'json', 'plan', 'archive', 'to_tar',
+                           'to_zip'])
     args._username_mock = PropertyMock(return_value=username)
     type(args).username = args._username_mock
     args._password_mock = PropertyMock(return_value=password)
@@ -106,6 +127,60 @@ def MockArgs(username=None, password=None, output=None, project=None,
     args._recursive_mock = PropertyMock(return_value=recursive)
     type(args).recursive = args._recursive_mock
 
+    args._cache_mock = PropertyMock(return_value=cache)
+    type(args).cache = args._cache_mock
+    args._cache_size_mock = PropertyMock(return_value=cache_size)
+    type(args).cache_size = args._cache_size_mock
+
+    args._dedupe_mock = PropertyMock(return_value=dedupe)
+    type(args).dedupe = args._dedupe_mock
+
+    args._limit_rate_mock = PropertyMock(return_value=limit_rate)
+    type(args).limit_rate = args._limit_rate_mock
+
+    args._jobs_mock = PropertyMock(return_value=jobs)
+    type(args).jobs = args._jobs_mock
+
+    args._hash_cache_mock = PropertyMock(return_value=hash_cache)
+    type(args).hash_cache = args._hash_cache_mock
+    args._hash_cache_path_mock = PropertyMock(return_value=hash_cache_path)
+    type(args).hash_cache_path = args._hash_cache_path_mock
+
+    args._trust_mtime_mock = PropertyMock(return_value=trust_mtime)
+    type(args).trust_mtime = args._trust_mtime_mock
+
+    args._retries_mock = PropertyMock(return_value=retries)
+    type(args).retries = args._retries_mock
+    args._resume_mock = PropertyMock(return_value=resume)
+    type(args).resume = args._resume_mock
+    args._delete_mock = PropertyMock(return_value=delete)
+    type(args).delete = args._delete_mock
+    args._projects_mock = PropertyMock(return_value=projects)
+    type(args).projects = args._projects_mock
+    args._projects_from_mock = PropertyMock(return_value=projects_from)
+    type(args).projects_from = args._projects_from_mock
+    args._children_mock = PropertyMock(return_value=children)
+    type(args).children = args._children_mock
+    args._include_mock = PropertyMock(return_value=include)
+    type(args).include = args._include_mock
+    args._exclude_mock = PropertyMock(return_value=exclude)
+    type(args).exclude = args._exclude_mock
+
+    args._dry_run_mock = PropertyMock(return_value=dry_run)
+    type(args).dry_run = args._dry_run_mock
+    args._json_mock = PropertyMock(return_value=json)
+    type(args).json = args._json_mock
+    args._plan_mock = PropertyMock(return_value=plan)
+    type(args).plan = args._plan_mock
+
+    args._archive_mock = PropertyMock(return_value=archive)
+    type(args).archive = args._archive_mock
+
+    args._to_tar_mock = PropertyMock(return_value=to_tar)
+    type(args).to_tar = args._to_tar_mock
+    args._to_zip_mock = PropertyMock(return_value=to_zip)
+    type(args).to_zip = args._to_zip_mock
+
     return args
 
 
@@ -116,3 +191,18 @@ class FakeResponse:
 
     def json(self):
         return self._json
+
+
+class UploadBody:
+    """Compares equal to an upload body that reads from `fp`."""
+    def __init__(self, fp):
+        self._fp = fp
+
+    def __eq__(self, other):
+        return getattr(other, '_fp', None) is self._fp
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<UploadBody {!r}>'.format(self._fp)
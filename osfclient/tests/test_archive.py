@@ -0,0 +1,170 @@
+"""Test extracting zip archives from a stream"""
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from osfclient.archive import TarStreamWriter, ZipStreamWriter
+from osfclient.archive import extract_stream, iter_entries
+
+
+class _Unseekable(object):
+    """Readable stream returning at most `size` bytes per read."""
+    def __init__(self, data, size=1000):
+        self._fp = io.BytesIO(data)
+        self._size = size
+
+    def read(self, n=-1):
+        if n < 0 or n > self._size:
+            n = self._size
+        return self._fp.read(n)
+
+
+class _Pipe(io.RawIOBase):
+    """Writable stream that can not seek, zipfile adds data descriptors."""
+    def __init__(self):
+        self.data = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.data.write(data)
+
+
+FILES = {'a.txt': b'hello',
+         'sub/b.bin': os.urandom(100000),
+         # looks like the start of a data descriptor
+         'sub/deeper/c': b'PK\x07\x08' * 100,
+         'empty': b''}
+
+
+def _archive(method, streamed):
+    out = _Pipe() if streamed else io.BytesIO()
+    with zipfile.ZipFile(out, 'w', method) as archive:
+        archive.writestr('sub/', b'')
+        for name, data in sorted(FILES.items()):
+            if streamed and hasattr(archive, 'open'):
+                with archive.open(zipfile.ZipInfo(name), 'w') as f:
+                    f.write(data)
+            else:
+                archive.writestr(name, data)
+    return out.data.getvalue() if streamed else out.getvalue()
+
+
+@pytest.mark.parametrize('method', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+@pytest.mark.parametrize('streamed', [False, True])
+def test_extract_stream(tmpdir, method, streamed):
+    data = _archive(method, streamed)
+    written = []
+
+    paths = extract_stream(_Unseekable(data), str(tmpdir),
+                           progress=written.append)
+
+    assert sorted(paths) == sorted(str(tmpdir.join(*name.split('/')))
+                                   for name in FILES)
+    for name, contents in FILES.items():
+        assert tmpdir.join(*name.split('/')).read_binary() == contents
+    assert sum(written) == sum(len(contents) for contents in FILES.values())
+
+
+def test_skip_unread_entries():
+    data = _archive(zipfile.ZIP_DEFLATED, True)
+
+    names = [entry.name for entry in iter_entries(_Unseekable(data))]
+
+    assert names == ['sub/', 'a.txt', 'empty', 'sub/b.bin', 'sub/deeper/c']
+
+
+def test_bad_crc(tmpdir):
+    data = _archive(zipfile.ZIP_STORED, False)
+    data = data.replace(b'hello', b'jello')
+
+    with pytest.raises(zipfile.BadZipfile):
+        extract_stream(_Unseekable(data), str(tmpdir))
+
+
+def test_unsafe_path(tmpdir):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w') as archive:
+        archive.writestr('../evil.txt', b'evil')
+
+    with pytest.raises(zipfile.BadZipfile):
+        extract_stream(_Unseekable(out.getvalue()), str(tmpdir.join('dest')))
+    assert not tmpdir.join('evil.txt').exists()
+
+
+def test_not_a_zip(tmpdir):
+    with pytest.raises(zipfile.BadZipfile):
+        extract_stream(_Unseekable(b'<html>Not found</html>'), str(tmpdir))
+
+
+class _Output(object):
+    """Writable stream without tell and seek, like a pipe."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def _writes(data):
+    def write(fp):
+        assert 'b' in fp.mode
+        for start in range(0, len(data), 1000):
+            fp.write(data[start:start + 1000])
+    return write
+
+
+def test_tar_stream():
+    out = _Output()
+    archive = TarStreamWriter(out)
+    for name, data in sorted(FILES.items()):
+        archive.add('p/' + name, len(data), 1500000000, _writes(data))
+    # unknown size
+    archive.add('p/unknown', None, 1500000000, _writes(b'spooled'))
+    archive.close()
+
+    assert len(out.getvalue()) % tarfile.RECORDSIZE == 0
+    with tarfile.open(fileobj=io.BytesIO(out.getvalue())) as tar:
+        members = tar.getmembers()
+        assert [m.name for m in members] == \
+            ['p/' + name for name in sorted(FILES)] + ['p/unknown']
+        for member in members[:-1]:
+            assert tar.extractfile(member).read() == FILES[member.name[2:]]
+            assert member.mtime == 1500000000
+        assert tar.extractfile(members[-1]).read() == b'spooled'
+
+
+def test_tar_stream_size_changed():
+    archive = TarStreamWriter(_Output())
+
+    with pytest.raises(RuntimeError):
+        archive.add('short', 10, 0, _writes(b'12345'))
+    with pytest.raises(RuntimeError):
+        archive.add('long', 3, 0, _writes(b'12345'))
+
+
+def test_zip_stream():
+    out = _Output()
+    archive = ZipStreamWriter(out)
+    for name, data in sorted(FILES.items()):
+        archive.add('p/' + name, len(data), 1500000000, _writes(data))
+    archive.add('p/unknown', None, 0, _writes(b'no size'))
+    archive.close()
+
+    with zipfile.ZipFile(io.BytesIO(out.getvalue())) as zf:
+        assert zf.testzip() is None
+        assert zf.read('p/sub/b.bin') == FILES['sub/b.bin']
+        assert zf.read('p/unknown') == b'no size'
+    # can be extracted while it is streamed
+    names = [entry.name for entry in iter_entries(_Unseekable(out.getvalue()))]
+    assert names == ['p/' + name for name in sorted(FILES)] + ['p/unknown']
@@ -0,0 +1,129 @@
+"""Test the content-addressed blob store"""
+import hashlib
+import os
+import time
+
+from mock import patch
+
+import pytest
+
+from osfclient.blobstore import BlobStore
+
+
+def _hashes(content):
+    return {'md5': hashlib.md5(content).hexdigest(),
+            'sha256': hashlib.sha256(content).hexdigest()}
+
+
+def test_add_and_get(tmpdir):
+    store = BlobStore(str(tmpdir.join('store')))
+    src = tmpdir.join('src.txt')
+    src.write_binary(b'hello world')
+    hashes = _hashes(b'hello world')
+
+    assert store.path_for(hashes) is None
+    assert store.add(str(src), hashes)
+    blob = store.path_for(hashes)
+    # stored under the stronger hash
+    assert os.path.basename(blob) == hashes['sha256']
+
+    dest = tmpdir.join('dest.txt')
+    assert store.get(hashes, str(dest))
+    assert dest.read_binary() == b'hello world'
+    # blobs are read-only so hard-linked files can't corrupt the store
+    assert not os.access(blob, os.W_OK) or os.getuid() == 0
+
+
+def test_get_replaces_existing_file(tmpdir):
+    store = BlobStore(str(tmpdir.join('store')))
+    src = tmpdir.join('src.txt')
+    src.write_binary(b'new')
+    store.add(str(src), _hashes(b'new'))
+
+    dest = tmpdir.join('dest.txt')
+    dest.write_binary(b'old')
+    assert store.get(_hashes(b'new'), str(dest))
+    assert dest.read_binary() == b'new'
+
+
+def test_miss(tmpdir):
+    store = BlobStore(str(tmpdir.join('store')))
+    dest = tmpdir.join('dest.txt')
+
+    assert not store.get(_hashes(b'nope'), str(dest))
+    assert not dest.exists()
+    assert store.open({}) is None
+    assert store.writer({'md5': None}) is None
+
+
+def test_add_rejects_wrong_content(tmpdir):
+    store = BlobStore(str(tmpdir.join('store')))
+    src = tmpdir.join('src.txt')
+    src.write_binary(b'hello world')
+
+    assert not store.add(str(src), _hashes(b'something else'))
+    assert store.size() == 0
+    # no temporary files left behind
+    leftovers = [f for _, _, fnames in os.walk(store.root) for f in fnames
+                 if f != '.lock']
+    assert leftovers == []
+
+
+def test_lru_eviction(tmpdir):
+    store = BlobStore(str(tmpdir.join('store')), max_size=25)
+    contents = [b'a' * 10, b'b' * 10]
+    for content in contents:
+        src = tmpdir.join('src')
+        src.write_binary(content)
+        store.add(str(src), _hashes(content))
+    # mark the first blob as recently used
+    past = time.time() - 100
+    os.utime(store.path_for(_hashes(contents[1])), (past, past))
+    store.open(_hashes(contents[0])).close()
+
+    src = tmpdir.join('src')
+    src.write_binary(b'c' * 10)
+    store.add(str(src), _hashes(b'c' * 10))
+
+    assert store.size() <= 25
+    assert store.path_for(_hashes(contents[0])) is not None
+    assert store.path_for(_hashes(contents[1])) is None
+    assert store.path_for(_hashes(b'c' * 10)) is not None
+
+
+def test_store_is_scanned_when_full(tmpdir):
+    store = BlobStore(str(tmpdir.join('store')), max_size=25)
+    src = tmpdir.join('src')
+    with patch.object(BlobStore, '_blobs',
+                      side_effect=store._blobs) as blobs:
+        for content in (b'a' * 10, b'b' * 10):
+            src.write_binary(content)
+            store.add(str(src), _hashes(content))
+        # the first blob counts what is stored, the second fits
+        assert blobs.call_count == 1
+
+        src.write_binary(b'c' * 10)
+        store.add(str(src), _hashes(b'c' * 10))
+        assert blobs.call_count == 2
+
+    assert store.size() <= 25
+
+
+def test_linked_blobs_are_kept(tmpdir):
+    store = BlobStore(str(tmpdir.join('store')), max_size=15)
+    src = tmpdir.join('src')
+    src.write_binary(b'a' * 10)
+    store.add(str(src), _hashes(b'a' * 10))
+    checkout = tmpdir.join('checkout')
+    assert store.get(_hashes(b'a' * 10), str(checkout))
+    if os.stat(str(checkout)).st_nlink == 1:
+        pytest.skip('no hard links')
+    past = time.time() - 100
+    os.utime(store.path_for(_hashes(b'a' * 10)), (past, past))
+
+    src.write_binary(b'b' * 10)
+    store.add(str(src), _hashes(b'b' * 10))
+
+    # removing the linked blob would free nothing
+    assert store.path_for(_hashes(b'a' * 10)) is not None
+    assert store.path_for(_hashes(b'b' * 10)) is not None
@@ -1,16 +1,31 @@
 """Test `osf clone` command."""
 
 import os
+import tarfile
+import zipfile
 
-from mock import patch, mock_open, call
+from mock import ANY, patch, mock_open, call
+
+import pytest
 
 from osfclient import OSF
 from osfclient.cli import clone
+from osfclient.hashcache import get_hash_cache
 
 from osfclient.tests.mocks import MockProject
 from osfclient.tests.mocks import MockArgs
 
 
+@pytest.fixture(autouse=True)
+def manifest():
+    # the files of these tests are not written, see test_manifest.py for
+    # cloning with a manifest
+    with patch('osfclient.cli.Manifest') as Manifest:
+        Manifest.return_value.unchanged.return_value = False
+        Manifest.return_value.remove_stale.return_value = []
+        yield Manifest.return_value
+
+
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
 def test_clone_project(OSF_project):
     # check that `osf clone` opens files with the right names and modes
@@ -41,7 +56,7 @@ def test_clone_project(OSF_project):
             assert call(full_path, 'wb') in mock_open_func.mock_calls
 
 
-@patch('osfclient.cli.checksum', return_value = '0' * 32)
+@patch('osfclient.compare.checksum', return_value = '0' * 32)
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
 def test_clone_project_update_file_exists_and_matches(OSF_project, checksum):
     # check that `osf clone --update` downloads all files except for any that
@@ -83,7 +98,7 @@ def test_clone_project_update_file_exists_and_matches(OSF_project, checksum):
                 assert call(full_path, 'wb') in mock_open_func.mock_calls
 
 
-@patch('osfclient.cli.checksum', return_value = '1' * 32)
+@patch('osfclient.compare.checksum', return_value = '1' * 32)
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
 def test_clone_project_update_file_exists_and_differs(OSF_project, checksum):
     # check that `osf clone --update` downloads all files and overwrites
@@ -120,3 +135,266 @@ def test_clone_project_update_file_exists_and_differs(OSF_project, checksum):
                                      fname)
 
             assert call(full_path, 'wb') in mock_open_func.mock_calls
+
+
+@patch('osfclient.cli.link_or_copy')
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_project_dedupe(OSF_project, link_or_copy):
+    # all mock files have the same md5, so only the first one is downloaded
+    # and every other path is linked to it
+    args = MockArgs(project='1234', dedupe=True)
+
+    mock_open_func = mock_open()
+
+    with patch('osfclient.cli.open', mock_open_func):
+        with patch('osfclient.cli.makedirs'):
+            with patch('osfclient.cli.os.getenv', side_effect='SECRET'):
+                clone(args)
+
+    first = os.path.join('1234', 'osfstorage', 'a/a/a')
+    assert call(first, 'wb') in mock_open_func.mock_calls
+    opened = [c for c in mock_open_func.mock_calls if c[1][1:] == ('wb',)]
+    assert len(opened) == 1
+
+    # two storages with two files each, three of them are duplicates
+    assert link_or_copy.call_count == 3
+    for c in link_or_copy.call_args_list:
+        assert c[0][0] == first
+
+
+@patch('osfclient.compare.checksum', return_value='0' * 32)
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_project_update_prehashes_local_files(OSF_project, checksum):
+    # existing local files are hashed concurrently before comparing them
+    args = MockArgs(project='1234', update=True)
+
+    def exists(file_path):
+        return file_path.startswith('1234/osfstorage/')
+
+    with patch('osfclient.cli.open', mock_open()):
+        with patch('osfclient.cli.makedirs'):
+            with patch('osfclient.cli.os.path.exists', side_effect=exists):
+                with patch('osfclient.cli.checksum_many',
+                           return_value=iter([])) as checksum_many:
+                    with patch('osfclient.cli.get_hash_cache'):
+                        clone(args)
+
+    checksum_many.assert_called_once_with(['1234/osfstorage/a/a/a',
+                                           '1234/osfstorage/b/b/b'],
+                                          ignore_errors=True)
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_project_jobs(OSF_project, tmpdir, capsys):
+    # with --jobs files are downloaded concurrently, a failing file does
+    # not stop the others but makes the command fail at the end
+    args = MockArgs(project='1234', output=str(tmpdir), jobs=3)
+    broken = OSF_project.return_value.storages[1].files[0]
+    broken.write_to.side_effect = RuntimeError('boom')
+
+    with pytest.raises(SystemExit) as e:
+        clone(args)
+
+    assert '1 files could not be downloaded' in str(e.value)
+    out, err = capsys.readouterr()
+    assert 'Downloaded 3 files' in out
+    assert 'gh/a/a/a: boom' in err
+
+    for store in OSF_project.return_value.storages:
+        for f in store.files:
+            assert f.write_to.call_count == 1
+    assert tmpdir.join('osfstorage', 'b', 'b', 'b').check()
+
+
+@patch('osfclient.cli.link_or_copy')
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_project_jobs_dedupe(OSF_project, link_or_copy, tmpdir):
+    args = MockArgs(project='1234', output=str(tmpdir), jobs=2, dedupe=True)
+
+    clone(args)
+
+    first = os.path.join(str(tmpdir), 'osfstorage', 'a/a/a')
+    assert link_or_copy.call_count == 3
+    for c in link_or_copy.call_args_list:
+        assert c[0][0] == first
+
+
+def _projects(ids, children=None):
+    children = children or {}
+    projects = {}
+    for project_id in ids:
+        project = MockProject(project_id)
+        project.children = [MockProject(child_id) for child_id in
+                            children.get(project_id, [])]
+        projects[project_id] = project
+    return projects
+
+
+def test_clone_several_projects(tmpdir, capsys):
+    projects = _projects(['p1', 'p2'], children={'p2': ['c1']})
+    project_list = tmpdir.join('projects.txt')
+    project_list.write('p1\n# a comment\n\np2  # with components\n')
+    args = MockArgs(output=str(tmpdir.join('out')), jobs=2,
+                    projects_from=str(project_list), children=True)
+
+    with patch.object(OSF, 'project', side_effect=projects.get) as project:
+        with patch('osfclient.models.OSFSession.set_pool_size') as pool_size:
+            clone(args)
+
+    assert project.call_args_list == [call('p1'), call('p2')]
+    pool_size.assert_called_once_with(2)
+    children = projects['p2'].children
+    for p in list(projects.values()) + children:
+        out = tmpdir.join('out', p.id)
+        assert out.join('osfstorage', 'a', 'a', 'a').check()
+        assert out.join('gh', 'b', 'b', 'b').check()
+        for store in p.storages:
+            for f in store.files:
+                assert f.write_to.call_count == 1
+
+    out = capsys.readouterr()[0]
+    for project_id in ('p1', 'p2', 'c1'):
+        assert '{}: 4 files, 4 written, 0 unchanged, 0 failed.'.format(
+            project_id) in out
+
+
+def test_clone_projects_list(tmpdir):
+    projects = _projects(['p1', 'p2'])
+    args = MockArgs(output=str(tmpdir), projects='p1, p2')
+
+    with patch.object(OSF, 'project', side_effect=projects.get):
+        clone(args)
+
+    assert tmpdir.join('p1', 'osfstorage', 'a', 'a', 'a').check()
+    assert tmpdir.join('p2', 'gh', 'b', 'b', 'b').check()
+
+
+def test_clone_projects_single_id(tmpdir):
+    projects = _projects(['abc'])
+    # no -p, the only project comes from --projects
+    args = MockArgs(projects='abc')
+
+    with patch.object(OSF, 'project', side_effect=projects.get), \
+            tmpdir.as_cwd():
+        clone(args)
+
+    assert tmpdir.join('abc', 'osfstorage', 'a', 'a', 'a').check()
+    assert tmpdir.join('abc', 'gh', 'b', 'b', 'b').check()
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_archive(OSF_project):
+    args = MockArgs(project='1234', archive=True)
+
+    with patch('osfclient.cli.makedirs') as mock_makedirs, \
+            patch('osfclient.cli.open') as mock_open:
+        clone(args)
+
+    assert not mock_open.called
+    for store in OSF_project.return_value.storages:
+        path = os.path.join('1234', store._name_mock.return_value)
+        store.extract_zip.assert_called_once_with(path, progress=ANY)
+        mock_makedirs.assert_any_call(path, exist_ok=True)
+        # nothing is listed
+        assert not store._matched_files_mock.called
+
+
+def test_clone_archive_conflicts():
+    args = MockArgs(project='1234', archive=True, update=True,
+                    include=['*.csv'])
+
+    with pytest.raises(SystemExit) as e:
+        clone(args)
+
+    assert e.value.code == \
+        '--archive can not be used with --update, --include.'
+
+
+def _writes_path(file_):
+    # MockFile has no size, the archive spools it
+    def write_to(fp, cache=None, progress=None):
+        fp.write(file_.path.encode('utf-8'))
+    file_.write_to.side_effect = write_to
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_to_tar(OSF_project, tmpdir):
+    for store in OSF_project.return_value.storages:
+        for file_ in store.files:
+            _writes_path(file_)
+    path = str(tmpdir.join('project.tar'))
+    args = MockArgs(project='1234', to_tar=path)
+
+    with patch('osfclient.cli.makedirs') as mock_makedirs:
+        clone(args)
+
+    assert not mock_makedirs.called
+    with tarfile.open(path) as tar:
+        assert tar.getnames() == ['1234/osfstorage/a/a/a',
+                                  '1234/osfstorage/b/b/b',
+                                  '1234/gh/a/a/a', '1234/gh/b/b/b']
+        assert tar.extractfile('1234/gh/b/b/b').read() == b'b/b/b'
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_to_zip(OSF_project, tmpdir):
+    for store in OSF_project.return_value.storages:
+        for file_ in store.files:
+            _writes_path(file_)
+    path = str(tmpdir.join('project.zip'))
+    args = MockArgs(project='1234', to_zip=path, include=['a/**'])
+
+    clone(args)
+
+    with zipfile.ZipFile(path) as zf:
+        assert zf.namelist() == ['1234/osfstorage/a/a/a', '1234/gh/a/a/a']
+        assert zf.read('1234/gh/a/a/a') == b'/a/a/a'
+
+
+def test_clone_to_tar_conflicts():
+    args = MockArgs(project='1234', to_tar='-', update=True, jobs=4)
+
+    with pytest.raises(SystemExit) as e:
+        clone(args)
+
+    assert e.value.code == '--to-tar can not be used with --update, --jobs.'
+
+
+def test_clone_to_tar_keeps_file_if_setup_fails(tmpdir):
+    # the output is only opened once the credentials are known
+    archive = tmpdir.join('project.tar')
+    archive.write('old')
+    args = MockArgs(project='1234', to_tar=str(archive))
+
+    with patch('osfclient.cli._setup_osf',
+               side_effect=SystemExit('no password')):
+        with pytest.raises(SystemExit):
+            clone(args)
+
+    assert archive.read() == 'old'
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_to_tar_removes_partial_file(OSF_project, tmpdir):
+    store = OSF_project.return_value.storages[0]
+    store.files[0].write_to.side_effect = IOError('connection lost')
+    path = str(tmpdir.join('project.tar'))
+    args = MockArgs(project='1234', to_tar=path)
+
+    with pytest.raises(IOError):
+        clone(args)
+
+    assert not os.path.exists(path)
+
+
+@patch('osfclient.compare.checksum', return_value='0' * 32)
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_project_update_drops_hash_cache(OSF_project, checksum):
+    # the in-memory hash cache only lasts as long as the command
+    args = MockArgs(project='1234', update=True)
+
+    with patch('osfclient.cli.open', mock_open()):
+        with patch('osfclient.cli.makedirs'):
+            clone(args)
+
+    assert get_hash_cache() is None
@@ -0,0 +1,81 @@
+import hashlib
+import os
+
+from mock import MagicMock, patch
+
+from osfclient.compare import Comparer
+
+
+def _local(tmpdir, data=b'hello', mtime=1500000000):
+    path = str(tmpdir.join('data'))
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _remote(data=b'hello', date_modified='2017-07-14T02:40:00.000000Z'):
+    # 1500000000 is 2017-07-14T02:40:00Z
+    return MagicMock(size=len(data), date_modified=date_modified,
+                     hashes={'md5': hashlib.md5(data).hexdigest()})
+
+
+def test_size_differs(tmpdir):
+    path = _local(tmpdir)
+    comparer = Comparer()
+
+    with patch('osfclient.compare.checksum') as checksum:
+        assert not comparer.matches(path, _remote(b'hello world'))
+
+    assert checksum.call_count == 0
+    assert comparer.counts == {'size': 1, 'mtime': 0, 'hash': 0}
+
+
+def test_same_size_is_hashed(tmpdir):
+    path = _local(tmpdir)
+    comparer = Comparer()
+
+    assert comparer.needs_hash(path, _remote())
+    assert comparer.matches(path, _remote())
+    assert not comparer.matches(path, _remote(b'jello'))
+    assert comparer.counts == {'size': 0, 'mtime': 0, 'hash': 2}
+
+
+def test_trust_mtime(tmpdir):
+    # local file written after the remote one was modified
+    path = _local(tmpdir, mtime=1500000001)
+    comparer = Comparer(trust_mtime=True)
+
+    with patch('osfclient.compare.checksum') as checksum:
+        assert not comparer.needs_hash(path, _remote(b'jello'))
+        assert comparer.matches(path, _remote(b'jello'))
+
+    assert checksum.call_count == 0
+    assert comparer.counts == {'size': 0, 'mtime': 1, 'hash': 0}
+
+
+def test_trust_mtime_remote_newer(tmpdir):
+    path = _local(tmpdir, mtime=1499999999)
+    comparer = Comparer(trust_mtime=True)
+
+    assert not comparer.matches(path, _remote(b'jello'))
+    assert comparer.counts == {'size': 0, 'mtime': 0, 'hash': 1}
+
+
+def test_unknown_size_and_hashes(tmpdir):
+    path = _local(tmpdir)
+    remote = MagicMock(size=None, date_modified=None, hashes={})
+    comparer = Comparer(trust_mtime=True)
+
+    assert not comparer.matches(path, remote)
+    assert comparer.counts['hash'] == 1
+
+
+def test_summary(tmpdir):
+    path = _local(tmpdir)
+    comparer = Comparer()
+    comparer.matches(path, _remote(b'hello world'))
+    comparer.matches(path, _remote())
+
+    assert comparer.summary() == \
+        'Compared 2 local files: 1 by size, 0 by mtime, 1 by hash.'
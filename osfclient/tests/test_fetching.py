@@ -161,7 +161,7 @@ def test_fetch_local_file_exists_update_files_differ(OSF_project, os_makedirs):
 
     with patch('osfclient.cli.open', mock_open_func):
         with patch('osfclient.cli.os.path.exists', side_effect=exists):
-            with patch('osfclient.cli.checksum', side_effect=simple_checksum):
+            with patch('osfclient.compare.checksum', side_effect=simple_checksum):
                 fetch(args)
 
     OSF_project.assert_called_once_with('1234')
@@ -176,7 +176,8 @@ def test_fetch_local_file_exists_update_files_differ(OSF_project, os_makedirs):
 
 @patch('osfclient.cli.makedirs')
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
-def test_fetch_local_file_exists_update_files_match(OSF_project, os_makedirs):
+def test_fetch_local_file_exists_update_files_match(OSF_project, os_makedirs,
+                                                    capsys):
     # check that `osf fetch --update` does not overwrite local file if it
     # matches the remote
     args = MockArgs(project='1234', remote='osfstorage/a/a/a', update=True)
@@ -194,7 +195,7 @@ def test_fetch_local_file_exists_update_files_match(OSF_project, os_makedirs):
 
     with patch('osfclient.cli.open', mock_open_func):
         with patch('osfclient.cli.os.path.exists', side_effect=exists):
-            with patch('osfclient.cli.checksum', side_effect=simple_checksum):
+            with patch('osfclient.compare.checksum', side_effect=simple_checksum):
                 fetch(args)
 
     OSF_project.assert_called_once_with('1234')
@@ -205,6 +206,9 @@ def test_fetch_local_file_exists_update_files_match(OSF_project, os_makedirs):
     # should create a file in the same directory when no local
     # filename is specified
     assert mock.call('a', 'wb') not in mock_open_func.mock_calls
+    # the check that decided is reported
+    out, _ = capsys.readouterr()
+    assert 'Compared 1 local files: 0 by size, 0 by mtime, 1 by hash.' in out
 
 
 @patch('osfclient.cli.makedirs')
@@ -228,7 +232,7 @@ def test_fetch_local_file_exists_force_overrides_update(OSF_project, os_makedirs
 
     with patch('osfclient.cli.open', mock_open_func):
         with patch('osfclient.cli.os.path.exists', side_effect=exists):
-            with patch('osfclient.cli.checksum', side_effect=simple_checksum):
+            with patch('osfclient.compare.checksum', side_effect=simple_checksum):
                 fetch(args)
 
     OSF_project.assert_called_once_with('1234')
@@ -263,8 +267,12 @@ def test_fetch_last_file(OSF_project, os_path_exists, os_makedirs):
     # should create a file in the same directory when no local
     # filename is specified
     assert mock.call('b', 'wb') in mock_open_func.mock_calls
-    for f in store.files:
-        assert f._path_mock.called
+    # the listing is pruned to the path of the file, other files are
+    # never looked at
+    assert store._matched_files_mock.called
+    first, last = store.files
+    assert not first._path_mock.called
+    assert last._path_mock.called
 
 
 @patch('osfclient.cli.makedirs')
@@ -1,4 +1,6 @@
+import hashlib
 import io
+import zipfile
 from mock import call
 from mock import patch
 from mock import MagicMock
@@ -6,6 +8,7 @@ from mock import PropertyMock
 
 import pytest
 
+from osfclient.blobstore import BlobStore
 from osfclient.models import OSFCore
 from osfclient.models import File
 from osfclient.models import Folder
@@ -402,3 +405,214 @@ def test_move_file_failed():
     assert f._post.called
 
     assert 'Could not move' in e.value.args[0]
+
+
+def _ranged_get(content, calls):
+    # serve HTTP Range requests from `content` and record requested ranges
+    def fake_get(url, headers):
+        start, end = headers['Range'][len('bytes='):].split('-')
+        start, end = int(start), int(end)
+        calls.append((start, end))
+        res = FakeResponse(206, {})
+        res.content = content[start:end + 1]
+        res.headers = {'Content-Range': 'bytes {}-{}/{}'.format(
+            start, end, len(content))}
+        return res
+    return fake_get
+
+
+def test_open_file_random_access():
+    content = bytes(bytearray(range(256))) * 40
+    calls = []
+
+    f = File({})
+    f.path = '/data.bin'
+    f.size = len(content)
+    f._download_url = 'http://example.com/download_url/'
+
+    with patch.object(File, '_get',
+                      side_effect=_ranged_get(content, calls)) as mock_get:
+        with f.open(block_size=1024) as fp:
+            assert fp.seekable()
+            assert fp.read(10) == content[:10]
+            fp.seek(5000)
+            assert fp.read(100) == content[5000:5100]
+            fp.seek(-10, io.SEEK_END)
+            assert fp.read() == content[-10:]
+            # served from the block cache
+            fp.seek(2)
+            assert fp.read(5) == content[2:7]
+
+    assert calls == [(0, 1023), (4096, 5119), (9216, 10239)]
+    assert mock_get.call_args_list[0] == call(
+        'http://example.com/download_url/', headers={'Range': 'bytes=0-1023'})
+
+
+def test_open_file_sequential_readahead():
+    content = b'x' * (64 * 1024)
+    calls = []
+
+    f = File({})
+    f.path = '/data.bin'
+    f.size = len(content)
+    f._download_url = 'http://example.com/download_url/'
+
+    with patch.object(File, '_get', side_effect=_ranged_get(content, calls)):
+        with f.open(block_size=1024, max_readahead=8) as fp:
+            data = b''
+            while True:
+                chunk = fp.read(1000)
+                if not chunk:
+                    break
+                data += chunk
+
+    assert data == content
+    # each sequential miss doubles the number of blocks fetched at once
+    sizes = [(end - start + 1) // 1024 for start, end in calls]
+    assert sizes[:4] == [1, 2, 4, 8]
+    assert max(sizes) == 8
+    assert sum(sizes) == 64
+
+
+def test_open_file_cache_bounded_by_bytes():
+    content = b'y' * (16 * 1024)
+    calls = []
+
+    f = File({})
+    f.path = '/data.bin'
+    f.size = len(content)
+    f._download_url = 'http://example.com/download_url/'
+
+    with patch.object(File, '_get', side_effect=_ranged_get(content, calls)):
+        fp = f.open(block_size=1024, cache_size=2048)
+        for offset in (0, 4096, 8192):
+            fp.seek(offset)
+            fp.read(1)
+        assert fp._cached_bytes <= 2048
+        # block 0 was evicted, reading it again needs a new request
+        fp.seek(0)
+        fp.read(1)
+
+    assert len(calls) == 4
+
+
+def test_open_file_unknown_size():
+    content = b'hello world'
+    calls = []
+
+    f = File({})
+    f.path = '/hello.txt'
+    f.size = None
+    f._download_url = 'http://example.com/download_url/'
+
+    with patch.object(File, '_get', side_effect=_ranged_get(content, calls)):
+        fp = f.open()
+        assert fp.size == len(content)
+        assert fp.read() == content
+
+
+def test_write_to_fills_blob_store(tmpdir):
+    file_content = b"hello world"
+    store = BlobStore(str(tmpdir.join('store')))
+
+    def fake_get(url, stream):
+        res = FakeResponse(200, {})
+        res.raw = io.BytesIO(file_content)
+        res.headers = {'Content-Length': str(len(file_content))}
+        return res
+
+    f = File({})
+    f.size = len(file_content)
+    f.hashes = {'md5': hashlib.md5(file_content).hexdigest()}
+    f._download_url = "http://example.com/download_url/"
+
+    with patch.object(File, "_get", side_effect=fake_get) as mock_get:
+        fp = io.BytesIO()
+        fp.mode = "b"
+        f.write_to(fp, cache=store)
+        assert fp.getvalue() == file_content
+        assert store.path_for(f.hashes) is not None
+
+        # second time around the contents come from the store
+        fp = io.BytesIO()
+        fp.mode = "b"
+        f.write_to(fp, cache=store)
+        assert fp.getvalue() == file_content
+
+    assert mock_get.call_count == 1
+
+
+def test_blob_store_copy_is_not_throttled(tmpdir):
+    file_content = b"hello world"
+    store = BlobStore(str(tmpdir.join('store')))
+    src = tmpdir.join('src')
+    src.write_binary(file_content)
+    f = File({})
+    f.size = len(file_content)
+    f.hashes = {'md5': hashlib.md5(file_content).hexdigest()}
+    assert store.add(str(src), f.hashes)
+    limiter = MagicMock()
+
+    with patch('osfclient.models.file.get_limiter', return_value=limiter):
+        fp = io.BytesIO()
+        fp.mode = "b"
+        f.write_to(fp, cache=store, progress=lambda n: None)
+
+    assert fp.getvalue() == file_content
+    # only network transfers take from the bandwidth limit
+    assert not limiter.consume.called
+
+
+def _zip_get(content, status_code=200):
+    def fake_get(url, params, stream):
+        assert params == {'zip': ''}
+        res = FakeResponse(status_code, {})
+        res.raw = io.BytesIO(content)
+        res.headers = {}
+        return res
+    return fake_get
+
+
+def _zip_content():
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('hello.txt', b'hello')
+        archive.writestr('sub/bye.txt', b'bye')
+    return out.getvalue()
+
+
+def test_download_zip():
+    folder = Folder({})
+    folder._new_file_url = 'http://wb.example.com/v1/resources/f3szh/' \
+                           'providers/osfstorage/foo123/'
+    content = _zip_content()
+
+    with patch.object(Folder, '_get',
+                      side_effect=_zip_get(content)) as mock_get:
+        fp = io.BytesIO()
+        folder.download_zip(fp, progress=lambda n: None)
+
+    assert fp.getvalue() == content
+    assert mock_get.call_args[0] == (folder._new_file_url,)
+
+
+def test_extract_zip(tmpdir):
+    folder = Folder({})
+    folder._new_file_url = 'http://wb.example.com/v1/resources/f3szh/' \
+                           'providers/osfstorage/foo123/'
+
+    with patch.object(Folder, '_get', side_effect=_zip_get(_zip_content())):
+        paths = folder.extract_zip(str(tmpdir))
+
+    assert sorted(paths) == [str(tmpdir.join('hello.txt')),
+                             str(tmpdir.join('sub', 'bye.txt'))]
+    assert tmpdir.join('sub', 'bye.txt').read_binary() == b'bye'
+
+
+def test_download_zip_fails():
+    folder = Folder({})
+    folder._new_file_url = 'http://wb.example.com/'
+
+    with patch.object(Folder, '_get', side_effect=_zip_get(b'', 404)):
+        with pytest.raises(RuntimeError):
+            folder.download_zip(io.BytesIO())
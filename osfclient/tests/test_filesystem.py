@@ -0,0 +1,175 @@
+"""Test the fsspec filesystem"""
+from mock import patch
+
+import pytest
+
+pytest.importorskip('fsspec')
+
+from osfclient import OSF
+from osfclient.filesystem import OSFFileSystem
+from osfclient.models import OSFCore
+from osfclient.models import File
+from osfclient.models import Folder
+from osfclient.models import Project
+from osfclient.models import Storage
+
+from osfclient.tests import fake_responses
+from osfclient.tests.mocks import FakeResponse
+
+
+_storages_url = 'https://api.osf.io/v2/nodes/f3szh/files/'
+_root_url = 'https://api.osf.io/v2/nodes/f3szh/files/osfstorage/'
+_data_url = 'https://api.osf.io/v2/nodes/9zpcy/files/osfstorage/data123/'
+
+
+def _fake_get(called):
+    def fake_get(url):
+        called.append(url)
+        if url == _storages_url:
+            return FakeResponse(200, fake_responses.storage_node('f3szh'))
+        elif url == _root_url:
+            json = fake_responses.files_node('f3szh', 'osfstorage',
+                                             file_names=['hello.txt'],
+                                             file_sizes=['11'],
+                                             folder_names=['data'])
+            return FakeResponse(200, json)
+        elif url == _data_url:
+            json = fake_responses.files_node('f3szh', 'osfstorage',
+                                             file_names=['a.csv', 'b.csv'],
+                                             file_sizes=['3', '4'])
+            return FakeResponse(200, json)
+        raise ValueError(url)
+    return fake_get
+
+
+@pytest.fixture
+def fs():
+    called = []
+    project = Project(fake_responses.project_node)
+    with patch.object(OSF, 'project', return_value=project):
+        with patch.object(OSFCore, '_get', side_effect=_fake_get(called)):
+            fs = OSFFileSystem(skip_instance_cache=True)
+            fs._called = called
+            yield fs
+
+
+def test_ls(fs):
+    assert fs.ls('osf://f3szh', detail=False) == ['f3szh/osfstorage']
+    assert sorted(fs.ls('f3szh/osfstorage', detail=False)) == [
+        'f3szh/osfstorage/data', 'f3szh/osfstorage/hello.txt']
+
+    entries = fs.ls('f3szh/osfstorage/data')
+    assert sorted(e['name'] for e in entries) == [
+        'f3szh/osfstorage/data/a.csv', 'f3szh/osfstorage/data/b.csv']
+    assert all(e['type'] == 'file' for e in entries)
+    assert fs.isdir('f3szh/osfstorage/data')
+    assert fs.info('f3szh/osfstorage/hello.txt')['size'] == 11
+
+
+def test_listings_are_cached(fs):
+    fs.ls('f3szh/osfstorage/data')
+    fs.ls('f3szh/osfstorage/data')
+    fs.info('f3szh/osfstorage/data/a.csv')
+
+    assert fs._called.count(_data_url) == 1
+    assert fs._called.count(_root_url) == 1
+
+    fs.invalidate_cache('f3szh/osfstorage/data')
+    fs.ls('f3szh/osfstorage/data')
+    assert fs._called.count(_data_url) == 2
+
+
+def test_open_reads_ranges(fs):
+    content = b'hello world'
+
+    def fake_range(self, start, end):
+        return content[start:end + 1]
+
+    with patch.object(File, '_get_range', fake_range):
+        with fs.open('osf://f3szh/osfstorage/hello.txt', 'rb') as f:
+            f.seek(6)
+            assert f.read() == b'world'
+
+
+def test_get_downloads_concurrently(fs, tmpdir):
+    def fake_write_to(self, fp):
+        fp.write(self.name.encode())
+
+    with patch.object(File, 'write_to', fake_write_to):
+        fs.get('f3szh/osfstorage/data', str(tmpdir.join('out')),
+               recursive=True)
+
+    for name in ('a.csv', 'b.csv'):
+        with open(str(tmpdir.join('out', name)), 'rb') as f:
+            assert f.read() == name.encode()
+
+
+def test_put_uses_create_file(fs, tmpdir):
+    local = tmpdir.join('local.txt')
+    local.write('data')
+
+    with patch.object(Storage, 'create_file') as mock_create:
+        fs.put(str(local), 'f3szh/osfstorage/data/new.txt')
+
+    assert mock_create.call_count == 1
+    args, kwargs = mock_create.call_args
+    assert args[0] == 'data/new.txt'
+    assert kwargs == {'force': True}
+    # the listing of the target folder was invalidated
+    assert 'f3szh/osfstorage/data' not in fs.dircache
+
+
+def test_rm_and_mv(fs):
+    with patch.object(File, 'remove') as mock_remove:
+        fs.rm('f3szh/osfstorage/data/a.csv')
+    assert mock_remove.call_count == 1
+
+    with pytest.raises(IsADirectoryError):
+        fs.rm('f3szh/osfstorage/data')
+
+    with patch.object(Folder, 'remove') as mock_remove:
+        fs.rm('f3szh/osfstorage/data', recursive=True)
+    assert mock_remove.call_count == 1
+
+    with patch.object(File, 'move_to') as mock_move:
+        fs.mv('f3szh/osfstorage/hello.txt', 'f3szh/osfstorage/data/bye.txt')
+    args, kwargs = mock_move.call_args
+    assert isinstance(args[1], Folder)
+    assert args[1].name == 'data'
+    assert kwargs == {'to_filename': 'bye.txt'}
+
+
+def test_put_rm_put(fs, tmpdir):
+    # removing a file forgets the listing create_file looked it up in
+    local = tmpdir.join('local.txt')
+    local.write('data')
+    removed = []
+    fake_get = _fake_get(fs._called)
+
+    def get(url):
+        if url == _root_url and removed:
+            json = fake_responses.files_node('f3szh', 'osfstorage',
+                                             file_names=[],
+                                             folder_names=['data'])
+            return FakeResponse(200, json)
+        return fake_get(url)
+
+    def put(url, params=None, data=None):
+        if url.endswith('hello.txt'):
+            # updating the removed file fails
+            return FakeResponse(404 if removed else 200, None)
+        return FakeResponse(201, None)
+
+    def delete(url):
+        removed.append(url)
+        return FakeResponse(204, None)
+
+    with patch.object(OSFCore, '_get', side_effect=get), \
+            patch.object(OSFCore, '_put', side_effect=put) as mock_put, \
+            patch.object(OSFCore, '_delete', side_effect=delete):
+        fs.put(str(local), 'f3szh/osfstorage/hello.txt')
+        fs.rm('f3szh/osfstorage/hello.txt')
+        fs.put(str(local), 'f3szh/osfstorage/hello.txt')
+
+    assert len(removed) == 1
+    assert mock_put.call_args[1]['params'] == {'name': 'hello.txt'}
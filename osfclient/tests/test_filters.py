@@ -0,0 +1,134 @@
+"""Test include/exclude glob filters"""
+from mock import patch
+
+from osfclient.filters import Glob
+from osfclient.filters import PathFilter
+from osfclient.filters import PathPattern
+from osfclient.filters import glob_escape
+from osfclient.models import OSFCore
+from osfclient.models import Storage
+
+from osfclient.tests import fake_responses
+from osfclient.tests.mocks import FakeResponse
+
+
+def test_glob_match():
+    assert Glob('*.csv').match('a.csv')
+    assert Glob('*.csv').match('data/sub/a.csv')
+    assert not Glob('*.csv').match('a.csv.gz')
+    assert Glob('**/*.csv').match('a.csv')
+    assert Glob('**/*.csv').match('x/y/a.csv')
+    assert Glob('data/*.csv').match('data/a.csv')
+    assert not Glob('data/*.csv').match('data/sub/a.csv')
+    assert not Glob('data/*.csv').match('other/data/a.csv')
+    assert Glob('/data/**').match('data/sub/a.csv')
+    assert Glob('data/**/a.csv').match('data/a.csv')
+    assert Glob('data/**/a.csv').match('data/x/y/a.csv')
+    assert Glob('file?.[ch]').match('file1.c')
+    assert not Glob('file?.[!ch]').match('file1.c')
+    assert Glob('a+b (1).txt').match('a+b (1).txt')
+
+
+def test_glob_escape():
+    path = 'data/[draft] *final?.txt'
+    assert Glob(glob_escape(path)).match(path)
+    assert not Glob(glob_escape(path)).match('data/d *final?.txt')
+
+
+def test_exclude():
+    path_filter = PathFilter(exclude=['raw/**', '*.tmp'])
+
+    assert path_filter.match('data/a.csv')
+    assert not path_filter.match('raw/a.csv')
+    assert not path_filter.match('data/a.tmp')
+    assert not path_filter.may_contain('/raw/')
+    assert path_filter.may_contain('/data/')
+
+
+def test_exclude_folder_by_name():
+    path_filter = PathFilter(exclude=['raw'])
+
+    assert not path_filter.may_contain('/raw/')
+    assert not path_filter.may_contain('/data/raw/')
+    # files below the folder are excluded too, not only its listing
+    assert not path_filter.match('raw/x.csv')
+    assert not path_filter.match('data/raw/deep/x.csv')
+    assert path_filter.match('data/x.csv')
+
+
+def test_include_with_negation():
+    path_filter = PathFilter(include=['**/*.csv', '!raw/**'])
+
+    assert path_filter.match('/a.csv')
+    assert path_filter.match('/data/x/a.csv')
+    assert not path_filter.match('/data/a.txt')
+    assert not path_filter.match('/raw/a.csv')
+    assert not path_filter.may_contain('/raw/')
+
+
+def test_include_prunes_folders():
+    path_filter = PathFilter(include=['data/2019/*.csv'])
+
+    assert path_filter.may_contain('/data/')
+    assert path_filter.may_contain('/data/2019/')
+    assert not path_filter.may_contain('/data/2018/')
+    assert not path_filter.may_contain('/data/2019/sub/')
+    assert not path_filter.may_contain('/other/')
+
+
+def test_no_patterns():
+    path_filter = PathFilter()
+
+    assert not path_filter
+    assert path_filter.match('anything')
+    assert path_filter.may_contain('anywhere')
+
+
+def test_path_pattern_segments():
+    assert PathPattern('/p1/p2/').match('/p1/p2/a.txt')
+    assert PathPattern('/p1/p2/').match('/p1/')
+    assert not PathPattern('/p1/p2/').match('/p1/p2x/a.txt')
+    assert PathPattern('/p1%/').match('/p1-x/a.txt')
+    assert PathPattern('/%p1/').match('/x-p1/a.txt')
+    assert not PathPattern('/%p1/').match('/p1-x/a.txt')
+    assert PathPattern('/%p1%/').match('/x-p1-x/')
+    assert PathPattern('/p1/*.csv').match('/p1/a.csv')
+    assert not PathPattern('/p1/*.csv').match('/p1/a.txt')
+    assert PathPattern('').match('/anything/')
+
+
+def test_path_pattern_pruning():
+    pattern = PathPattern('/data/2019%/')
+
+    assert pattern.may_match_below('/data/')
+    assert pattern.may_match_below('/data/2019-01/')
+    assert not pattern.may_match_below('/data/2018-01/')
+    assert not pattern.may_match_below('/raw/')
+    assert pattern({'attributes': {'materialized_path': '/data/2019/a'}})
+
+
+@patch.object(OSFCore, '_get')
+def test_excluded_folder_is_not_listed(OSFCore_get):
+    store = Storage({})
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    data_url = 'https://api.osf.io/v2/nodes/9zpcy/files/osfstorage/data123/'
+
+    def get(url):
+        if url == store._files_url:
+            return FakeResponse(200, fake_responses.files_node(
+                'f3szh', 'osfstorage', file_names=['top.csv'],
+                folder_names=['raw', 'data']))
+        elif url == data_url:
+            return FakeResponse(200, fake_responses.files_node(
+                'f3szh', 'osfstorage',
+                file_names=['data/a.csv', 'data/b.txt']))
+        raise ValueError(url)
+    OSFCore_get.side_effect = get
+
+    path_filter = PathFilter(include=['**/*.csv'], exclude=['raw'])
+    files = list(store.matched_files(path_filter))
+
+    assert sorted(f.name for f in files) == ['data/a.csv', 'top.csv']
+    assert path_filter.pruned == ['/raw/']
+    assert [c[0][0] for c in OSFCore_get.call_args_list] == \
+        [store._files_url, data_url]
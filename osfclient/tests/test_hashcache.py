@@ -0,0 +1,93 @@
+import hashlib
+import os
+import time
+
+from mock import patch
+
+from osfclient.hashcache import HashCache
+from osfclient.hashcache import set_hash_cache
+from osfclient.utils import checksum
+
+
+def _write(path, data, age=60):
+    with open(path, 'wb') as f:
+        f.write(data)
+    then = time.time() - age
+    os.utime(path, (then, then))
+
+
+def test_put_and_get(tmpdir):
+    path = str(tmpdir.join('data'))
+    _write(path, b'hello')
+    cache = HashCache(str(tmpdir.join('hashes.sqlite')))
+
+    assert cache.get(path) is None
+    cache.put(path, {'md5': 'abc'}, os.stat(path))
+    cache.put(path, {'sha256': 'def'}, os.stat(path))
+
+    assert cache.get(path, 'md5') == 'abc'
+    assert cache.get(path, 'sha256') == 'def'
+
+
+def test_persistent(tmpdir):
+    path = str(tmpdir.join('data'))
+    _write(path, b'hello')
+    db = str(tmpdir.join('hashes.sqlite'))
+    cache = HashCache(db)
+    cache.put(path, {'md5': 'abc'}, os.stat(path))
+    cache.close()
+
+    assert HashCache(db).get(path) == 'abc'
+
+
+def test_modified_file_is_not_cached(tmpdir):
+    path = str(tmpdir.join('data'))
+    _write(path, b'hello')
+    cache = HashCache(str(tmpdir.join('hashes.sqlite')))
+    cache.put(path, {'md5': 'abc'}, os.stat(path))
+
+    _write(path, b'hello world', age=30)
+
+    assert cache.get(path) is None
+
+
+def test_changed_while_hashing(tmpdir):
+    path = str(tmpdir.join('data'))
+    _write(path, b'hello')
+    cache = HashCache(str(tmpdir.join('hashes.sqlite')))
+    st = os.stat(path)
+    _write(path, b'hello world')
+
+    cache.put(path, {'md5': 'abc'}, st)
+
+    assert cache.get(path) is None
+
+
+def test_recently_modified_file_is_not_cached(tmpdir):
+    path = str(tmpdir.join('data'))
+    _write(path, b'hello', age=0)
+    cache = HashCache(str(tmpdir.join('hashes.sqlite')))
+
+    cache.put(path, {'md5': 'abc'}, os.stat(path))
+
+    assert cache.get(path) is None
+
+
+def test_checksum_uses_cache(tmpdir):
+    path = str(tmpdir.join('data'))
+    _write(path, b'hello')
+    cache = HashCache(str(tmpdir.join('hashes.sqlite')))
+
+    try:
+        set_hash_cache(cache)
+        assert checksum(path) == hashlib.md5(b'hello').hexdigest()
+        with patch('osfclient.utils.open', create=True) as fake_open:
+            assert checksum(path) == hashlib.md5(b'hello').hexdigest()
+        # the file was not read a second time
+        assert fake_open.call_count == 0
+        assert checksum(path, 'sha256') == \
+            hashlib.sha256(b'hello').hexdigest()
+    finally:
+        set_hash_cache(None)
+
+    assert cache.get(path, 'md5') == hashlib.md5(b'hello').hexdigest()
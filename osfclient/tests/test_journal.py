@@ -0,0 +1,57 @@
+import os
+
+from osfclient.journal import UploadJournal
+from osfclient.journal import journal_path
+
+
+def test_record_and_resume(tmpdir):
+    local = tmpdir.join('a.txt')
+    local.write('hello')
+    path = str(tmpdir.join('upload.journal'))
+
+    journal = UploadJournal(path)
+    assert not journal.done(str(local), 'remote/a.txt')
+    journal.record(str(local), 'remote/a.txt', os.stat(str(local)))
+    journal.close()
+
+    journal = UploadJournal(path)
+    assert journal.done(str(local), 'remote/a.txt')
+    assert not journal.done(str(local), 'remote/b.txt')
+
+
+def test_changed_file_is_not_done(tmpdir):
+    local = tmpdir.join('a.txt')
+    local.write('hello')
+    journal = UploadJournal(str(tmpdir.join('upload.journal')))
+    journal.record(str(local), 'a.txt', os.stat(str(local)))
+
+    local.write('hello world')
+
+    assert not journal.done(str(local), 'a.txt')
+
+
+def test_truncated_line_is_ignored(tmpdir):
+    local = tmpdir.join('a.txt')
+    local.write('hello')
+    path = str(tmpdir.join('upload.journal'))
+    journal = UploadJournal(path)
+    journal.record(str(local), 'a.txt', os.stat(str(local)))
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('{"local": "/b.txt", "rem')
+
+    journal = UploadJournal(path)
+    assert journal.done(str(local), 'a.txt')
+
+    journal.remove()
+    assert not os.path.exists(path)
+
+
+def test_journal_path(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+    path = journal_path('f3szh', 'osfstorage', 'remote', '/local')
+
+    assert path.startswith(os.path.join(str(tmpdir), 'osfclient', 'uploads'))
+    assert path == journal_path('f3szh', 'osfstorage', 'remote', '/local')
+    assert path != journal_path('f3szh', 'osfstorage', 'remote', '/other')
@@ -28,3 +28,32 @@ def test_command_prints_help(command, capsys):
     out, err = capsys.readouterr()
     expected = 'usage: osf %s' % command
     assert expected in err
+
+
+def test_clone_archive_and_to_tar(capsys):
+    test_args = ['osf', '-p', '1234', 'clone', '--archive', '--to-tar', '-']
+    with patch.object(sys, 'argv', test_args):
+        with pytest.raises(SystemExit) as e:
+            main()
+
+    assert e.value.code == 2
+    out, err = capsys.readouterr()
+    assert 'not allowed with argument --archive' in err
+
+
+@pytest.mark.parametrize("options, hash_cache, path",
+                         [(['--hash-cache'], True, None),
+                          (['--hash-cache-path', 'h.db'], False, 'h.db'),
+                          ([], False, None)])
+def test_hash_cache_options(options, hash_cache, path):
+    # --hash-cache takes no value, the command after it is parsed as such
+    test_args = ['osf', '-p', '1234'] + options + ['clone', '--update', 'dir']
+    with patch.object(sys, 'argv', test_args):
+        with patch('osfclient.__main__.clone', return_value=None) as clone:
+            main()
+
+    args = clone.call_args[0][0]
+    assert args.hash_cache is hash_cache
+    assert args.hash_cache_path == path
+    assert args.output == 'dir'
+    assert args.update
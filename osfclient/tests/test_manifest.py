@@ -0,0 +1,159 @@
+"""Test the manifest of cloned files and incremental clones"""
+from mock import patch, MagicMock, PropertyMock
+
+from osfclient import OSF
+from osfclient.cli import clone
+from osfclient.manifest import MANIFEST_NAME
+from osfclient.manifest import Manifest
+
+from osfclient.tests.mocks import MockArgs
+from osfclient.tests.mocks import MockFile
+from osfclient.tests.mocks import MockProject
+
+
+def _remote(md5='0' * 32, date_modified='2017-07-14T02:40:00Z'):
+    return MagicMock(id='abc', size=5, hashes={'md5': md5},
+                     date_modified=date_modified)
+
+
+def test_record_and_unchanged(tmpdir):
+    local = tmpdir.join('osfstorage', 'foo.txt')
+    local.write('hello', ensure=True)
+    manifest = Manifest(str(tmpdir))
+
+    assert not manifest.unchanged(_remote(), str(local))
+    manifest.record(_remote(), str(local))
+    assert manifest.unchanged(_remote(), str(local))
+    assert 'osfstorage/foo.txt' in manifest.entries
+
+    # remote changes
+    assert not manifest.unchanged(_remote(md5='1' * 32), str(local))
+    assert not manifest.unchanged(_remote(date_modified='2018'), str(local))
+    # local changes
+    local.write('hello world')
+    assert not manifest.unchanged(_remote(), str(local))
+
+
+def test_no_hash_no_date_is_never_unchanged(tmpdir):
+    local = tmpdir.join('foo.txt')
+    local.write('hello')
+    remote = _remote(md5=None, date_modified=None)
+    manifest = Manifest(str(tmpdir))
+    manifest.record(remote, str(local))
+
+    assert not manifest.unchanged(remote, str(local))
+
+
+def test_save_and_load(tmpdir):
+    local = tmpdir.join('foo.txt')
+    local.write('hello')
+    manifest = Manifest(str(tmpdir))
+    manifest.record(_remote(), str(local))
+    manifest.save()
+
+    assert Manifest(str(tmpdir)).unchanged(_remote(), str(local))
+    assert not tmpdir.join(MANIFEST_NAME + '.tmp').check()
+
+
+def test_broken_manifest_is_empty(tmpdir):
+    tmpdir.join(MANIFEST_NAME).write('{"version": 1, "fil')
+
+    assert Manifest(str(tmpdir)).entries == {}
+
+
+def test_remove_stale(tmpdir):
+    kept = tmpdir.join('kept.txt')
+    gone = tmpdir.join('gone.txt')
+    edited = tmpdir.join('edited.txt')
+    manifest = Manifest(str(tmpdir))
+    for local in (kept, gone, edited):
+        local.write('hello')
+        manifest.record(_remote(), str(local))
+    edited.write('local changes')
+
+    removed = manifest.remove_stale([str(kept)])
+
+    assert removed == [str(gone)]
+    assert kept.check() and edited.check() and not gone.check()
+    assert list(manifest.entries) == ['kept.txt']
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_incremental_clone(OSF_project, tmpdir, capsys):
+    project = OSF_project.return_value
+    files = [f for store in project.storages for f in store.files]
+
+    clone(MockArgs(project='1234', output=str(tmpdir)))
+
+    assert tmpdir.join(MANIFEST_NAME).check()
+    assert all(f.write_to.call_count == 1 for f in files)
+
+    # nothing changed: no file is downloaded or even hashed
+    capsys.readouterr()
+    with patch('osfclient.compare.checksum') as checksum:
+        clone(MockArgs(project='1234', output=str(tmpdir), update=True))
+    assert checksum.call_count == 0
+    assert all(f.write_to.call_count == 1 for f in files)
+    assert 'Skipped 4 files unchanged' in capsys.readouterr()[0]
+
+    # one remote file changed
+    type(files[0]).date_modified = PropertyMock(return_value='2020-01-01')
+    with patch('osfclient.compare.checksum', return_value='1' * 32):
+        clone(MockArgs(project='1234', output=str(tmpdir), update=True))
+    assert [f.write_to.call_count for f in files] == [2, 1, 1, 1]
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_delete(OSF_project, tmpdir):
+    store = OSF_project.return_value.storages[1]
+    clone(MockArgs(project='1234', output=str(tmpdir)))
+    removed = tmpdir.join('gh', 'b', 'b', 'b')
+    assert removed.check()
+
+    store.files = store.files[:1]
+    clone(MockArgs(project='1234', output=str(tmpdir), update=True,
+                   delete=True))
+
+    assert not removed.check()
+    assert tmpdir.join('gh', 'a', 'a', 'a').check()
+    assert 'gh/b/b/b' not in Manifest(str(tmpdir)).entries
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_delete_excluded(OSF_project, tmpdir, capsys):
+    store = OSF_project.return_value.storages[1]
+    clone(MockArgs(project='1234', output=str(tmpdir)))
+    store.files = store.files[:1]
+    capsys.readouterr()
+
+    # excluded files are not listed, that does not make them stale
+    clone(MockArgs(project='1234', output=str(tmpdir), update=True,
+                   delete=True, exclude=['b/**']))
+
+    assert 'Deleted' not in capsys.readouterr()[0]
+    assert tmpdir.join('osfstorage', 'b', 'b', 'b').check()
+    assert tmpdir.join('gh', 'b', 'b', 'b').check()
+
+    clone(MockArgs(project='1234', output=str(tmpdir), update=True,
+                   delete=True, include=['b/**']))
+
+    assert not tmpdir.join('gh', 'b', 'b', 'b').check()
+    assert tmpdir.join('osfstorage', 'b', 'b', 'b').check()
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_delete_excluded_folder(OSF_project, tmpdir, capsys):
+    store = OSF_project.return_value.storages[0]
+    store.files = [MockFile('/a/a/a'), MockFile('/raw/x.csv')]
+    clone(MockArgs(project='1234', output=str(tmpdir)))
+    kept = tmpdir.join('osfstorage', 'raw', 'x.csv')
+    assert kept.check()
+    capsys.readouterr()
+
+    # the excluded folder is not listed at all
+    store.files = store.files[:1]
+    clone(MockArgs(project='1234', output=str(tmpdir), update=True,
+                   delete=True, exclude=['raw']))
+
+    assert 'Deleted' not in capsys.readouterr()[0]
+    assert kept.check()
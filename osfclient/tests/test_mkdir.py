@@ -41,9 +41,9 @@ def test_make_sub_folder(OSF_project):
 
     MockProject = OSF_project.return_value
     MockStorage = MockProject._storage_mock.return_value
-    for f in MockStorage.folders:
-        if f._path_mock.return_value == '/a':
-            assert call.create_folder('new') in f.mock_calls
+    assert call.create_folder('a/new') in MockStorage.mock_calls
+    # no need to crawl the existing folders
+    assert call.folders not in MockStorage.mock_calls
 
 
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
@@ -79,10 +79,7 @@ def test_make_recursive_sub_folder(OSF_project):
 
     MockProject = OSF_project.return_value
     MockStorage = MockProject._storage_mock.return_value
-    for f in MockStorage.folders:
-        if f._path_mock.return_value == '/a':
-            assert call.create_folder('new1') in f.mock_calls
-            assert call.create_folder().create_folder('new2') in f.mock_calls
+    assert call.create_folder('a/new1/new2') in MockStorage.mock_calls
 
 
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
@@ -100,8 +97,7 @@ def test_make_recursive_root_folder(OSF_project):
 
     MockProject = OSF_project.return_value
     MockStorage = MockProject._storage_mock.return_value
-    assert call.create_folder('new1') in MockStorage.mock_calls
-    assert call.create_folder('new1') in MockStorage.mock_calls
+    assert call.create_folder('new1/new2') in MockStorage.mock_calls
 
 
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
@@ -0,0 +1,275 @@
+"""Test transfer plans, `--dry-run` and `osf apply`"""
+import io
+import json
+import os
+
+from mock import ANY, MagicMock, patch
+
+import pytest
+
+from osfclient import OSF
+from osfclient.cli import apply_, clone, upload
+from osfclient.plan import TransferPlan, load_model, save_model
+from osfclient.scheduler import CostModel
+
+from osfclient.tests.mocks import MockArgs
+from osfclient.tests.mocks import MockProject
+
+
+@pytest.fixture(autouse=True)
+def model():
+    model = CostModel(latency=1., bandwidth=1e6)
+    with patch('osfclient.cli.load_model', return_value=model):
+        yield model
+
+
+def test_plan_summary(model):
+    plan = TransferPlan('clone', jobs=2)
+    plan.add('download', 'a', size=3 * 10**6)
+    plan.add('download', 'b', size=10**6)
+    plan.add('download', 'c')
+    plan.add('link', 'd', source='a')
+    plan.skip('unchanged', 5)
+    plan.skip('existing', 0)
+
+    summary = plan.summary(model)
+
+    assert summary['files'] == 3
+    assert summary['bytes'] == 4 * 10**6
+    assert summary['unknown_size'] == 1
+    assert summary['linked'] == 1
+    assert summary['skipped'] == {'unchanged': 5}
+    # 3 MB on one worker, 1 MB and an empty file on the other
+    assert summary['seconds'] == 4.
+    assert plan.describe(model).splitlines() == [
+        'Would download 3 files (4.0 MB), link 1, skip 5 unchanged.',
+        'The size of 1 files is unknown.',
+        'Estimated 4s at 1.00 MB/s and 1.00s per file with 2 jobs.']
+
+
+def test_plan_round_trip(model):
+    plan = TransferPlan('upload', {'update': True}, jobs=4)
+    plan.add('upload', 'local.txt', project='1234', storage='osfstorage',
+             remote='a/local.txt', size=12)
+    plan.skip('unchanged')
+    fp = io.StringIO()
+    plan.dump(fp, model)
+
+    fp.seek(0)
+    loaded = TransferPlan.load(fp)
+
+    assert loaded.command == 'upload'
+    assert loaded.options == {'update': True}
+    assert loaded.jobs == 4
+    assert loaded.files == plan.files
+    assert loaded.skipped == {'unchanged': 1}
+
+
+def test_load_not_a_plan():
+    with pytest.raises(ValueError):
+        TransferPlan.load(io.StringIO(u'{"files": []}'))
+    with pytest.raises(ValueError):
+        TransferPlan.load(io.StringIO(u'not json'))
+
+
+def test_observed_rates(tmpdir):
+    path = str(tmpdir.join('cache', 'rates.json'))
+    default = load_model('download', path)
+    assert default.bandwidth == CostModel().bandwidth
+
+    model = CostModel()
+    model.observe(10**6, 1.5)
+    model.observe(3 * 10**6, 3.5)
+    save_model('download', model, path)
+
+    loaded = load_model('download', path)
+    assert loaded.bandwidth == pytest.approx(10**6)
+    assert loaded.latency == pytest.approx(0.5)
+    assert load_model('upload', path).bandwidth == CostModel().bandwidth
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_dry_run_writes_nothing(OSF_project, capsys):
+    args = MockArgs(project='1234', dry_run=True)
+
+    with patch('osfclient.cli.open') as mock_open, \
+            patch('osfclient.cli.makedirs') as mock_makedirs, \
+            patch('osfclient.cli.Manifest') as Manifest:
+        clone(args)
+
+    assert not mock_open.called
+    assert not mock_makedirs.called
+    assert not Manifest.return_value.save.called
+    out, _ = capsys.readouterr()
+    assert out.startswith('Would download 4 files')
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_dry_run_json(OSF_project, capsys):
+    args = MockArgs(project='1234', dry_run=True, json=True)
+
+    with patch('osfclient.cli.Manifest') as Manifest:
+        Manifest.return_value.unchanged.return_value = False
+        clone(args)
+
+    out, _ = capsys.readouterr()
+    plan = json.loads(out)
+    assert plan['command'] == 'clone'
+    assert plan['summary']['files'] == 4
+    assert sorted((f['storage'], f['remote'], f['local'])
+                  for f in plan['files']) == [
+        ('gh', 'a/a/a', os.path.join('1234', 'gh', 'a/a/a')),
+        ('gh', 'b/b/b', os.path.join('1234', 'gh', 'b/b/b')),
+        ('osfstorage', 'a/a/a', os.path.join('1234', 'osfstorage', 'a/a/a')),
+        ('osfstorage', 'b/b/b', os.path.join('1234', 'osfstorage', 'b/b/b'))]
+    assert all(f['action'] == 'download' and f['project'] == '1234'
+               for f in plan['files'])
+
+
+def _remote_file(path, md5):
+    return MagicMock(path=path, hashes={'md5': md5})
+
+
+def test_upload_dry_run(tmpdir, capsys):
+    tmpdir.join('data', 'same.txt').write('same', ensure=True)
+    tmpdir.join('data', 'new.txt').write('new', ensure=True)
+    tmpdir.join('data', 'changed.txt').write('changed', ensure=True)
+    args = MockArgs(username='joe@example.com', project='1234',
+                    source=str(tmpdir.join('data')), destination='remote',
+                    recursive=True, update=True, dry_run=True, json=True)
+    project = MockProject('1234')
+    store = project._storage_mock.return_value
+    # md5 of 'same'
+    store.matched_files.side_effect = lambda target_filter: [
+        _remote_file('/remote/data/same.txt',
+                     '51037a4a37730f52c8732586d3aaa316'),
+        _remote_file('/remote/data/changed.txt', '0' * 32)]
+
+    with patch.object(OSF, 'project', return_value=project), \
+            patch('osfclient.cli.os.getenv', return_value='secret'):
+        upload(args)
+
+    assert not store.create_file.called
+    plan = json.loads(capsys.readouterr()[0])
+    assert plan['skipped'] == {'unchanged': 1}
+    assert sorted((f['remote'], f['size'], f.get('replace', False))
+                  for f in plan['files']) == [
+        ('remote/data/changed.txt', 7, True),
+        ('remote/data/new.txt', 3, False)]
+
+
+def _write_plan(tmpdir, plan):
+    path = tmpdir.join('plan.json')
+    with open(str(path), 'w') as f:
+        plan.dump(f, CostModel())
+    return str(path)
+
+
+def test_apply_downloads(tmpdir):
+    root = str(tmpdir.join('out'))
+    plan = TransferPlan('clone')
+    plan.add('download', os.path.join(root, 'a'), project='1234',
+             storage='osfstorage', remote='a/a/a', root=root)
+    plan.add('link', os.path.join(root, 'copy'), project='1234',
+             storage='osfstorage', remote='b/b/b',
+             source=os.path.join(root, 'a'), root=root)
+    args = MockArgs(project='1234', plan=_write_plan(tmpdir, plan))
+    project = MockProject('1234')
+
+    with patch.object(OSF, 'project', return_value=project), \
+            patch('osfclient.cli._download') as download, \
+            patch('osfclient.cli._link_copy') as link_copy, \
+            patch('osfclient.cli.Manifest') as Manifest:
+        apply_(args)
+
+    files = project._storage_mock.return_value.files
+    download.assert_called_once_with(files[0], os.path.join(root, 'a'),
+                                     progress=ANY)
+    link_copy.assert_called_once_with(os.path.join(root, 'a'),
+                                      os.path.join(root, 'copy'))
+    Manifest.assert_called_once_with(root)
+    assert Manifest.return_value.record.call_count == 2
+    assert Manifest.return_value.save.called
+
+
+def test_apply_missing_remote_file(tmpdir):
+    plan = TransferPlan('fetch')
+    plan.add('download', str(tmpdir.join('gone')), project='1234',
+             storage='osfstorage', remote='gone')
+    args = MockArgs(project='1234', plan=_write_plan(tmpdir, plan))
+
+    with patch.object(OSF, 'project', return_value=MockProject('1234')), \
+            patch('osfclient.cli._download') as download:
+        with pytest.raises(SystemExit) as e:
+            apply_(args)
+
+    assert not download.called
+    assert e.value.code == '1 files could not be downloaded.'
+
+
+def test_apply_uploads(tmpdir):
+    local = tmpdir.join('local.txt')
+    local.write('hello')
+    plan = TransferPlan('upload', {'force': False, 'update': True})
+    plan.add('upload', str(local), project='1234', storage='osfstorage',
+             remote='remote/local.txt', size=5)
+    args = MockArgs(username='joe@example.com', project='1234',
+                    plan=_write_plan(tmpdir, plan))
+    project = MockProject('1234')
+
+    with patch.object(OSF, 'project', return_value=project), \
+            patch('osfclient.cli.os.getenv', return_value='secret'):
+        apply_(args)
+
+    store = project._storage_mock.return_value
+    store.create_file.assert_called_once_with(
+        'remote/local.txt', ANY, force=False, update=True, progress=ANY)
+
+
+def test_unchanged_uploads_are_not_observed(model, save_model, tmpdir):
+    tmpdir.join('data', 'new.txt').write('new', ensure=True)
+    tmpdir.join('data', 'same.txt').write('same', ensure=True)
+    args = MockArgs(username='joe@example.com', project='1234',
+                    source=str(tmpdir.join('data')), destination='remote',
+                    recursive=True, update=True)
+    project = MockProject('1234')
+    store = project._storage_mock.return_value
+    # only one of the two files is uploaded, the other is unchanged
+    store.create_file.side_effect = lambda name, *args, **kwargs: \
+        name.endswith('new.txt')
+
+    with patch.object(OSF, 'project', return_value=project), \
+            patch('osfclient.cli.os.getenv', return_value='secret'):
+        upload(args)
+
+    assert store.create_file.call_count == 2
+    assert model.n_observed == 1
+    save_model.assert_called_once_with('upload', model)
+
+
+def test_clone_plan_records_provider(tmpdir, capsys):
+    # storages are found by provider, their local folder is named after
+    # the storage
+    project = MockProject('1234')
+    project.storages[1]._provider_mock.return_value = 'github'
+    args = MockArgs(project='1234', output=str(tmpdir), dry_run=True,
+                    json=True)
+
+    with patch.object(OSF, 'project', return_value=project):
+        clone(args)
+
+    out, _ = capsys.readouterr()
+    path = tmpdir.join('plan.json')
+    path.write(out)
+    plan = json.loads(out)
+    assert sorted(set((f['storage'], os.path.relpath(f['local'], str(tmpdir))
+                       .split(os.sep)[0]) for f in plan['files'])) == [
+        ('github', 'gh'), ('osfstorage', 'osfstorage')]
+
+    with patch.object(OSF, 'project', return_value=project), \
+            patch('osfclient.cli._download'), \
+            patch('osfclient.cli.Manifest'):
+        apply_(MockArgs(project='1234', plan=str(path)))
+
+    assert sorted(c[0][0] for c in project._storage_mock.call_args_list) \
+        == ['github', 'osfstorage']
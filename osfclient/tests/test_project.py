@@ -86,3 +86,26 @@ def test_pass_down_session_to_storages(OSFCore_get):
 
     for store in project.storages:
         assert store.session == project.session
+
+
+@patch.object(OSFCore, '_get')
+def test_children(OSFCore_get):
+    project = Project(fake_responses.project_node)
+    assert project._children_url == \
+        'https://api.osf.io/v2/nodes/f3szh/children/'
+
+    child = dict(fake_responses.project_node['data'], id='abc12')
+    OSFCore_get.return_value = FakeResponse(200, {'data': [child],
+                                                  'links': {'next': None}})
+
+    children = list(project.children)
+
+    OSFCore_get.assert_called_once_with(
+        'https://api.osf.io/v2/nodes/f3szh/children/')
+    assert [c.id for c in children] == ['abc12']
+    assert isinstance(children[0], Project)
+    assert children[0].session is project.session
+
+
+def test_no_children():
+    assert list(Project({}).children) == []
@@ -0,0 +1,138 @@
+"""Test retried uploads against a local stand-in WaterButler"""
+import hashlib
+
+from mock import patch
+
+import pytest
+
+from requests.exceptions import ConnectionError
+
+from osfclient.models import File
+from osfclient.models import Storage
+from osfclient.tests.fake_waterbutler import FakeWaterButler
+
+
+@pytest.fixture
+def waterbutler():
+    with FakeWaterButler() as wb:
+        yield wb
+
+
+def _local_file(tmpdir, data=b'x' * 100000):
+    local = tmpdir.join('foo.txt')
+    local.write_binary(data)
+    return str(local), data
+
+
+def _store(waterbutler, retries):
+    store = Storage({})
+    store._new_file_url = waterbutler.url
+    store.session.set_upload_retries(retries, backoff=0)
+    return store
+
+
+def test_retry_after_dropped_connection(tmpdir, waterbutler):
+    path, data = _local_file(tmpdir)
+    waterbutler.drop = 2
+    store = _store(waterbutler, 2)
+
+    with open(path, 'rb') as fp:
+        store.create_file('foo.txt', fp)
+
+    assert waterbutler.files == {'foo.txt': data}
+    # every attempt sent the whole file
+    assert [r[2] for r in waterbutler.requests] == [len(data)] * 3
+
+
+def test_retry_after_server_error(tmpdir, waterbutler):
+    path, data = _local_file(tmpdir)
+    waterbutler.errors = [503, 502]
+    store = _store(waterbutler, 2)
+
+    with open(path, 'rb') as fp:
+        store.create_file('foo.txt', fp)
+
+    assert waterbutler.files == {'foo.txt': data}
+    assert len(waterbutler.requests) == 3
+
+
+def test_give_up_after_retries(tmpdir, waterbutler):
+    path, data = _local_file(tmpdir)
+    waterbutler.errors = [503, 503]
+    store = _store(waterbutler, 1)
+
+    with open(path, 'rb') as fp:
+        with pytest.raises(RuntimeError):
+            store.create_file('foo.txt', fp)
+
+    assert waterbutler.files == {}
+    assert len(waterbutler.requests) == 2
+
+
+def test_no_retries_by_default(tmpdir, waterbutler):
+    path, data = _local_file(tmpdir)
+    waterbutler.drop = 1
+    store = _store(waterbutler, 0)
+
+    with open(path, 'rb') as fp:
+        with pytest.raises(ConnectionError):
+            store.create_file('foo.txt', fp)
+
+    assert len(waterbutler.requests) == 1
+
+
+def test_retry_update(tmpdir, waterbutler):
+    path, data = _local_file(tmpdir)
+    waterbutler.files['foo.txt'] = b'old'
+    waterbutler.drop = 1
+    file_ = File({})
+    file_.path = '/foo.txt'
+    file_._upload_url = waterbutler.url + 'foo.txt'
+    file_.session.set_upload_retries(1, backoff=0)
+
+    with open(path, 'rb') as fp:
+        file_.update(fp)
+
+    assert waterbutler.files == {'foo.txt': data}
+
+
+def _listing(waterbutler):
+    # what listing the folder would show, from the files the server has
+    def listing(directory, refresh=False):
+        files = {}
+        for name, data in waterbutler.files.items():
+            file_ = File({})
+            file_.name = name
+            file_.hashes = {'md5': hashlib.md5(data).hexdigest()}
+            files[name] = file_
+        return files
+    return listing
+
+
+def test_retry_conflicts_with_own_upload(tmpdir, waterbutler):
+    # the first attempt was stored but its answer lost, the retry conflicts
+    path, data = _local_file(tmpdir)
+    waterbutler.lost = 1
+    store = _store(waterbutler, 1)
+
+    with patch.object(Storage, '_listing', side_effect=_listing(waterbutler)):
+        with open(path, 'rb') as fp:
+            assert store.create_file('foo.txt', fp)
+
+    assert waterbutler.files == {'foo.txt': data}
+    assert len(waterbutler.requests) == 2
+
+
+def test_retry_conflicts_with_other_file(tmpdir, waterbutler):
+    path, data = _local_file(tmpdir)
+    waterbutler.files['foo.txt'] = b'other'
+    waterbutler.drop = 1
+    store = _store(waterbutler, 1)
+
+    with patch.object(Storage, '_listing', side_effect=_listing(waterbutler)):
+        with open(path, 'rb') as fp:
+            # FileExistsError, an OSError on all Pythons
+            with pytest.raises(OSError):
+                store.create_file('foo.txt', fp)
+
+    assert waterbutler.files == {'foo.txt': b'other'}
@@ -0,0 +1,99 @@
+"""Test size-aware upload scheduling"""
+import pytest
+
+from osfclient.scheduler import CostModel
+from osfclient.scheduler import UploadScheduler
+from osfclient.scheduler import predict_makespan
+
+
+MB = 2**20
+
+
+def _drain(scheduler, worker):
+    items = []
+    while True:
+        item = scheduler.next(worker)
+        if item is None:
+            return items
+        items.append(item[0])
+
+
+def test_cost_model_fit():
+    model = CostModel()
+    for size in (0, MB, 4 * MB):
+        model.observe(size, 0.25 + size / 2e6)
+
+    assert model.latency == pytest.approx(0.25)
+    assert model.bandwidth == pytest.approx(2e6)
+    assert model.predict(2e6) == pytest.approx(1.25)
+
+
+def test_cost_model_single_observation():
+    model = CostModel()
+    model.observe(10 * MB, 2.)
+
+    assert model.latency == 0
+    assert model.predict(10 * MB) == pytest.approx(2.)
+
+
+def test_predict_makespan():
+    model = CostModel(latency=0., bandwidth=1.)
+
+    assert predict_makespan([4, 3, 3, 2], 2, model) == 6
+    assert predict_makespan([4, 3, 3, 2], 1, model) == 12
+    assert predict_makespan([], 4, model) == 0
+
+
+def test_large_files_get_own_lane():
+    items = [('small%d' % i, 1000) for i in range(10)] + \
+        [('big', 100 * MB), ('bigger', 200 * MB)]
+    scheduler = UploadScheduler(items, jobs=4, large_size=MB)
+
+    # workers 0 and 1 are the large file lanes, largest first
+    assert scheduler.next(0)[0] == 'bigger'
+    assert scheduler.next(1)[0] == 'big'
+    assert scheduler.next(2)[0].startswith('small')
+    # the large lane is empty, its workers help with the small files
+    assert scheduler.next(0)[0].startswith('small')
+
+
+def test_small_lane_helps_large_lane():
+    items = [('small', 1000)] + [('big%d' % i, 100 * MB) for i in range(6)]
+    scheduler = UploadScheduler(items, jobs=2, large_size=MB)
+
+    # one worker can not keep up with the large files on its own, the
+    # small file lane is far ahead and helps out
+    assert scheduler.next(1)[0].startswith('big')
+    assert 'small' in _drain(scheduler, 1)
+
+
+def test_all_items_handed_out_once():
+    items = [('f%d' % i, i * MB // 3) for i in range(50)]
+    scheduler = UploadScheduler(items, jobs=3, large_size=4 * MB)
+
+    handed_out = []
+    for worker in (0, 1, 2):
+        handed_out.extend(_drain(scheduler, worker))
+
+    assert sorted(handed_out) == sorted(name for name, _ in items)
+
+
+def test_cancel():
+    scheduler = UploadScheduler([('a', 1), ('b', 2)], jobs=2)
+    scheduler.cancel()
+
+    assert scheduler.next(0) is None
+
+
+def test_summary():
+    scheduler = UploadScheduler([('a', MB), ('b', MB)], jobs=2,
+                                model=CostModel(latency=1., bandwidth=MB))
+    assert scheduler.predicted == pytest.approx(2.)
+
+    for worker in (0, 1):
+        scheduler.next(worker)
+        scheduler.done(MB, 0.5)
+
+    summary = scheduler.summary()
+    assert summary.startswith('Uploaded 2 files (2.1 MB) in ')
+    assert 'predicted 2.0s (0.5s at the observed' in summary
@@ -94,3 +94,11 @@ def test_get(mock_get):
 
     assert response == mock_response
     mock_get.assert_called_once_with(url)
+
+
+def test_set_pool_size():
+    session = OSFSession()
+    session.set_pool_size(16)
+
+    adapter = session.get_adapter('https://api.osf.io/v2/')
+    assert adapter._pool_maxsize == 16
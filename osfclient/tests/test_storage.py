@@ -1,6 +1,7 @@
 from mock import patch, MagicMock, call
 
 import os
+import threading
 import pytest
 import six
 
@@ -12,7 +13,7 @@ from osfclient.models import File
 from osfclient.models import Folder
 
 from osfclient.tests import fake_responses
-from osfclient.tests.mocks import FakeResponse, MockFile
+from osfclient.tests.mocks import FakeResponse, MockFile, UploadBody
 
 
 @patch.object(OSFCore, '_get')
@@ -132,7 +133,7 @@ def test_create_existing_file():
         store.create_file('foo.txt', fake_fp)
 
     store._put.assert_called_once_with(new_file_url,
-                                       data=fake_fp,
+                                       data=UploadBody(fake_fp),
                                        params={'name': 'foo.txt'})
 
     assert fake_fp.call_count == 0
@@ -170,9 +171,10 @@ def test_force_existing_file():
 
     assert fake_fp.call_count == 0
     assert call.peek(1) in fake_fp.mock_calls
-    # should have made two PUT requests, first attempt at uploading then
-    # to update the file
-    assert fake_put.call_count == 2
+    # the file is found in the folder listing, so the only PUT request
+    # updates it
+    assert fake_put.call_count == 1
+    assert fake_put.call_args[0][0].endswith('osfstorage/foo.txt')
     # should have made one GET request to list files
     assert fake_get.call_count == 1
 
@@ -217,9 +219,10 @@ def test_update_existing_file_files_differ():
 
     assert fake_fp.call_count == 0
     assert call.peek(1) in fake_fp.mock_calls
-    # should have made two PUT requests, first attempt at uploading then
-    # to update the file
-    assert fake_put.call_count == 2
+    # the file is found in the folder listing, so the only PUT request
+    # updates it
+    assert fake_put.call_count == 1
+    assert fake_put.call_args[0][0].endswith('osfstorage/foo.txt')
     # should have made one GET request to list files
     assert fake_get.call_count == 1
 
@@ -260,13 +263,14 @@ def test_update_existing_file_files_match():
                           side_effect=simple_OSFCore_get) as fake_get:
             with patch('osfclient.models.storage.checksum',
                        side_effect=simple_checksum):
-                store.create_file('foo.txt', fake_fp, update=True)
+                uploaded = store.create_file('foo.txt', fake_fp,
+                                             update=True)
 
+    assert uploaded is False
     assert fake_fp.call_count == 0
     assert call.peek(1) not in fake_fp.mock_calls
-    # should have made one PUT requests, first attempt at uploading, and no
-    # attempt to update the file since they match
-    assert fake_put.call_count == 1
+    # the file is found in the folder listing and matches, no PUT requests
+    assert fake_put.call_count == 0
     # should have made one GET request to list files
     assert fake_get.call_count == 1
 
@@ -311,10 +315,9 @@ def test_update_existing_file_files_match_force_overrides_update():
 
     assert fake_fp.call_count == 0
     assert call.peek(1) in fake_fp.mock_calls
-    # should have made two PUT requests, first attempt at uploading then
-    # to update the file, even though they match, since force=True overrides
-    # update=True
-    assert fake_put.call_count == 2
+    # should have made one PUT request to update the file, even though they
+    # match, since force=True overrides update=True
+    assert fake_put.call_count == 1
     # should have made one GET request to list files
     assert fake_get.call_count == 1
 
@@ -369,7 +372,7 @@ def test_create_new_file():
     store.create_file('foo.txt', fake_fp)
 
     store._put.assert_called_once_with(new_file_url,
-                                       data=fake_fp,
+                                       data=UploadBody(fake_fp),
                                        params={'name': 'foo.txt'})
 
     assert fake_fp.call_count == 0
@@ -406,7 +409,8 @@ def test_create_new_file_subdirectory():
         store.create_file('bar/foo.txt', fake_fp)
 
     expected = [call(new_folder_url, params={'name': 'bar'}),
-                call(new_file_url, params={'name': 'foo.txt'}, data=fake_fp)]
+                call(new_file_url, params={'name': 'foo.txt'},
+                     data=UploadBody(fake_fp))]
     assert mock_put.call_args_list == expected
     assert fake_fp.call_count == 0
 
@@ -437,44 +441,58 @@ def test_create_new_zero_length_file():
     assert fake_fp.call_count == 0
 
 
-def test_create_small_file_connection_error():
-    # turn a requests.ConnectionError into a RuntimeError with a more helpful
-    # message that the file might exist
+def _listed_store(file_names):
+    # storage whose top level folder contains `file_names`
     new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
                     'osfstorage/foo123/')
     store = Storage({})
     store._new_file_url = new_file_url
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    json = fake_responses.files_node('f3szh', 'osfstorage',
+                                     file_names=file_names)
+    store._get = MagicMock(return_value=FakeResponse(200, json))
+    return store
+
+
+def test_create_file_connection_error_file_exists():
+    # the server dropped the connection because the file exists
+    store = _listed_store(['hello.txt', 'foo.txt'])
     store._put = MagicMock(side_effect=ConnectionError)
 
     try:
-        exception = RuntimeError
+        exception = FileExistsError
     except NameError:
         exception = OSError
 
     fake_fp = MagicMock()
     fake_fp.mode = 'rb'
-    # set file size of 1 MB minus 1 byte ("small" file)
-    with patch('osfclient.models.storage.get_local_file_size',
-               return_value=2**20-1):
-        with pytest.raises(exception):
-            store.create_file('foo.txt', fake_fp)
+    with pytest.raises(exception):
+        store.create_file('foo.txt', fake_fp)
 
-    store._put.assert_called_once_with(new_file_url,
-                                       data=fake_fp,
+    store._put.assert_called_once_with(store._new_file_url,
+                                       data=UploadBody(fake_fp),
                                        params={'name': 'foo.txt'})
-
-    assert fake_fp.call_count == 0
+    assert store._get.call_count == 1
 
 
-def test_create_big_file_connection_error(monkeypatch):
-    # with a "big" file, we're more confident that a connection error means the
-    # file alredy exists, so raise FileExistsError without hedging
-    new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
-                    'osfstorage/foo123/')
-    store = Storage({})
-    store._new_file_url = new_file_url
+def test_create_file_connection_error():
+    # a connection error for a file that does not exist is passed on
+    store = _listed_store(['hello.txt'])
     store._put = MagicMock(side_effect=ConnectionError)
 
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+    with pytest.raises(ConnectionError):
+        store.create_file('foo.txt', fake_fp)
+
+    assert store._put.call_count == 1
+
+
+def test_create_big_existing_file_preflight():
+    # a large file is looked up before sending it
+    store = _listed_store(['hello.txt', 'foo.txt'])
+    store._put = MagicMock()
+
     try:
         exception = FileExistsError
     except NameError:
@@ -482,21 +500,46 @@ def test_create_big_file_connection_error(monkeypatch):
 
     fake_fp = MagicMock()
     fake_fp.mode = 'rb'
-    # set file size of 1 MB ("big" file)
     with patch('osfclient.models.storage.get_local_file_size',
                return_value=2**20):
         with pytest.raises(exception):
             store.create_file('foo.txt', fake_fp)
 
-    store._put.assert_called_once_with(new_file_url,
-                                       data=fake_fp,
+    assert store._put.call_count == 0
+
+
+def test_create_big_new_file_preflight():
+    store = _listed_store(['hello.txt'])
+    store._put = MagicMock(return_value=FakeResponse(201, None))
+
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+    with patch('osfclient.models.storage.get_local_file_size',
+               return_value=2**20):
+        store.create_file('foo.txt', fake_fp)
+
+    assert store._get.call_count == 1
+    store._put.assert_called_once_with(store._new_file_url,
+                                       data=UploadBody(fake_fp),
                                        params={'name': 'foo.txt'})
 
-    assert fake_fp.call_count == 0
+
+def test_create_small_file_skips_preflight():
+    store = _listed_store(['hello.txt'])
+    store._put = MagicMock(return_value=FakeResponse(201, None))
+
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+    with patch('osfclient.models.storage.get_local_file_size',
+               return_value=2**20 - 1):
+        store.create_file('foo.txt', fake_fp)
+
+    assert store._get.call_count == 0
 
 
 def test_update_existing_file_overrides_connection_error():
-    # successful upload even on connection error if update=True
+    # an existing file is updated directly, so no connection error from
+    # trying to create it
     new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
                     'osfstorage/foo123/')
     store = Storage({})
@@ -532,8 +575,304 @@ def test_update_existing_file_overrides_connection_error():
 
     assert fake_fp.call_count == 0
     assert call.peek(1) in fake_fp.mock_calls
-    # should have made two PUT requests, first attempt at uploading then
-    # to update the file
-    assert fake_put.call_count == 2
+    # the file is found in the folder listing, so the only PUT request
+    # updates it
+    assert fake_put.call_count == 1
+    assert fake_put.call_args[0][0].endswith('osfstorage/foo.txt')
     # should have made one GET request to list files
     assert fake_get.call_count == 1
+
+
+def test_create_files_reuses_cached_folder():
+    # uploading several files into one sub-folder creates the folder once
+    new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
+                    'osfstorage/bar12/')
+    new_folder_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
+                      'osfstorage/?kind=folder')
+    store = Storage({})
+    store._new_file_url = new_file_url
+    store._new_folder_url = new_folder_url
+
+    def simple_put(url, params={}, data=None):
+        if url == new_folder_url:
+            return FakeResponse(
+                201, {'data': fake_responses._folder('bar12', 'bar')}
+                )
+        elif url == new_file_url:
+            return FakeResponse(201, None)
+
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+
+    with patch.object(Storage, '_put', side_effect=simple_put) as mock_put:
+        store.create_file('bar/foo.txt', fake_fp)
+        store.create_file('/bar/baz.txt', fake_fp)
+        folder = store.create_folder('bar', exist_ok=True)
+
+    expected = [call(new_folder_url, params={'name': 'bar'}),
+                call(new_file_url, params={'name': 'foo.txt'},
+                     data=UploadBody(fake_fp)),
+                call(new_file_url, params={'name': 'baz.txt'},
+                     data=UploadBody(fake_fp))]
+    assert mock_put.call_args_list == expected
+    assert folder._storage is store
+
+
+def test_create_nested_folder():
+    # missing parents are created, the new folders know their storage
+    store = Storage({})
+    parent = MagicMock(name='Folder-a')
+    child = MagicMock(name='Folder-a/b')
+    parent.create_folder.return_value = child
+
+    with patch('osfclient.models.storage.ContainerMixin.create_folder',
+               return_value=parent) as mock_create:
+        folder = store.create_folder('a/b')
+
+    mock_create.assert_called_once_with('a', True)
+    parent.create_folder.assert_called_once_with('b', False)
+    assert folder is child
+    assert child._storage is store
+    assert store._folder('a') is parent
+
+
+def test_removed_folder_is_forgotten():
+    store = Storage({})
+    store._folder_cache['a'] = MagicMock()
+    store._folder_cache['a/b'] = MagicMock()
+    store._folder_cache['ab'] = MagicMock()
+
+    folder = Folder({})
+    folder.path = '/a/'
+    folder._storage = store
+    folder._delete_url = 'http://delete.me/uri'
+    folder._delete = MagicMock(return_value=FakeResponse(204, None))
+
+    folder.remove()
+
+    assert list(store._folder_cache) == ['ab']
+
+
+def test_create_file_in_stale_cached_folder():
+    # the cached folder was deleted remotely, recreate it and retry
+    store = Storage({})
+    stale = MagicMock(_new_file_url='http://stale/')
+    fresh = MagicMock(_new_file_url='http://fresh/')
+    store._folder_cache['bar'] = stale
+
+    def simple_put(url, params=None, data=None):
+        if url == 'http://stale/':
+            return FakeResponse(404, None)
+        return FakeResponse(201, None)
+
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+    with patch('osfclient.models.storage.ContainerMixin.create_folder',
+               return_value=fresh):
+        with patch.object(Storage, '_put', side_effect=simple_put) as put:
+            store.create_file('bar/foo.txt', fake_fp)
+
+    assert [c[0][0] for c in put.call_args_list] == ['http://stale/',
+                                                     'http://fresh/']
+    assert store._folder('bar') is fresh
+    fake_fp.seek.assert_called_once_with(0)
+
+
+def test_update_many_files_lists_folder_once():
+    # deciding between create and update for several files in one folder
+    # lists that folder a single time
+    new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
+                    'osfstorage/foo123/')
+    store = Storage({})
+    store._new_file_url = new_file_url
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    json = fake_responses.files_node('f3szh', 'osfstorage',
+                                     file_names=['hello.txt', 'foo.txt'])
+
+    def simple_put(url, params=None, data=None):
+        if url == new_file_url:
+            return FakeResponse(201, None)
+        return FakeResponse(200, None)
+
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+    with patch.object(OSFCore, '_put', side_effect=simple_put) as fake_put:
+        with patch.object(OSFCore, '_get',
+                          return_value=FakeResponse(200, json)) as fake_get:
+            store.create_file('foo.txt', fake_fp, force=True)
+            store.create_file('hello.txt', fake_fp, force=True)
+            store.create_file('new.txt', fake_fp, force=True)
+
+    assert fake_get.call_count == 1
+    assert [c[0][0] for c in fake_put.call_args_list] == [
+        'https://files.osf.io/v1/resources/f3szh/providers/osfstorage/foo.txt',
+        'https://files.osf.io/v1/resources/f3szh/providers/osfstorage/'
+        'hello.txt',
+        new_file_url]
+
+
+def test_update_file_created_after_listing():
+    # the file appeared after we listed its folder, the conflict makes us
+    # list the folder again and update the file
+    new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
+                    'osfstorage/foo123/')
+    store = Storage({})
+    store._new_file_url = new_file_url
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    before = fake_responses.files_node('f3szh', 'osfstorage',
+                                       file_names=['hello.txt'])
+    after = fake_responses.files_node('f3szh', 'osfstorage',
+                                      file_names=['hello.txt', 'foo.txt'])
+
+    def simple_put(url, params=None, data=None):
+        if url == new_file_url:
+            return FakeResponse(409, None)
+        return FakeResponse(200, None)
+
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+    with patch.object(OSFCore, '_put', side_effect=simple_put) as fake_put:
+        with patch.object(OSFCore, '_get',
+                          side_effect=[FakeResponse(200, before),
+                                       FakeResponse(200, after)]) as fake_get:
+            store.create_file('foo.txt', fake_fp, force=True)
+
+    assert fake_get.call_count == 2
+    assert fake_put.call_count == 2
+    assert fake_put.call_args[0][0].endswith('osfstorage/foo.txt')
+    fake_fp.seek.assert_called_once_with(0)
+
+
+def test_update_in_new_folder_skips_listing():
+    # a folder we just created is known to be empty
+    new_folder_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
+                      'osfstorage/?kind=folder')
+    store = Storage({})
+    store._new_folder_url = new_folder_url
+
+    def simple_put(url, params=None, data=None):
+        if url == new_folder_url:
+            return FakeResponse(
+                201, {'data': fake_responses._folder('bar12', 'bar')}
+                )
+        return FakeResponse(201, None)
+
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+    with patch.object(OSFCore, '_put', side_effect=simple_put) as fake_put:
+        with patch.object(OSFCore, '_get') as fake_get:
+            store.create_file('bar/foo.txt', fake_fp, update=True)
+
+    assert fake_get.call_count == 0
+    assert fake_put.call_count == 2
+
+
+def test_removed_file_is_forgotten():
+    store = Storage({})
+    store._listings['a'] = {}
+    store._listings['b'] = {}
+
+    f = File({})
+    f.path = '/a/foo.txt'
+    f._storage = store
+    f._delete_url = 'http://delete.me/uri'
+    f._delete = MagicMock(return_value=FakeResponse(204, None))
+
+    f.remove()
+
+    assert list(store._listings) == ['b']
+
+
+def test_force_twice_in_new_folder():
+    # the file created first is in the listing of the folder we created
+    new_folder_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
+                      'osfstorage/?kind=folder')
+    new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
+                    'osfstorage/bar12/')
+    uploaded = fake_responses.uploaded_file('foo12', 'bar/foo.txt')
+    store = Storage({})
+    store._new_folder_url = new_folder_url
+
+    def simple_put(url, params=None, data=None):
+        if url == new_folder_url:
+            return FakeResponse(
+                201, {'data': fake_responses._folder('bar12', 'bar')}
+                )
+        elif url == new_file_url:
+            return FakeResponse(201, uploaded)
+        return FakeResponse(200, uploaded)
+
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+    with patch.object(OSFCore, '_put', side_effect=simple_put) as fake_put:
+        with patch.object(OSFCore, '_get') as fake_get:
+            store.create_folder('bar')
+            store.create_file('bar/foo.txt', fake_fp, force=True)
+            store.create_file('bar/foo.txt', fake_fp, force=True)
+
+    assert fake_get.call_count == 0
+    assert [c[0][0] for c in fake_put.call_args_list] == [
+        new_folder_url, new_file_url,
+        uploaded['data']['links']['upload']]
+    assert store._existing_file('bar/foo.txt').path == '/bar/foo.txt'
+
+
+def test_refresh_new_folder_lists_parent():
+    # a folder we created can not be listed itself, find it in its parent
+    new_folder_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
+                      'osfstorage/?kind=folder')
+    files_url = 'https://api.osf.io/v2//nodes/9zpcy/files/osfstorage'
+    store = Storage({})
+    store._new_folder_url = new_folder_url
+    store._files_url = files_url
+    root = fake_responses.files_node('9zpcy', 'osfstorage', file_names=[],
+                                     folder_names=['bar'])
+    bar = fake_responses.files_node('9zpcy', 'osfstorage',
+                                    file_names=['foo.txt'])
+
+    def simple_get(url, *args, **kwargs):
+        if url == files_url:
+            return FakeResponse(200, root)
+        return FakeResponse(200, bar)
+
+    with patch.object(OSFCore, '_put', return_value=FakeResponse(
+            201, {'data': fake_responses._folder('bar12', 'bar')})):
+        with patch.object(OSFCore, '_get', side_effect=simple_get) as get:
+            store.create_folder('bar')
+            listing = store._listing('bar', refresh=True)
+
+    assert list(listing) == ['foo.txt']
+    assert [c[0][0] for c in get.call_args_list] == [
+        files_url,
+        'https://api.osf.io/v2/nodes/9zpcy/files/osfstorage/bar123/']
+    assert isinstance(store._folder('bar'), Folder)
+
+
+def test_create_folders_concurrently():
+    # folders are created at the same time, each of them once
+    store = Storage({})
+    started = {'a': threading.Event(), 'b': threading.Event()}
+    created = []
+    overlapped = []
+
+    def create_folder(name, exist_ok):
+        created.append(name)
+        started[name].set()
+        # both folders are being created before either is done
+        overlapped.append(started['b' if name == 'a' else 'a'].wait(5))
+        return MagicMock(name='Folder-' + name)
+
+    with patch('osfclient.models.storage.ContainerMixin.create_folder',
+               side_effect=create_folder):
+        threads = [threading.Thread(target=store.create_folder,
+                                    args=(name, True))
+                   for name in ('a', 'b', 'a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert sorted(created) == ['a', 'b']
+    assert overlapped == [True, True]
+    assert store._folder('a')._storage is store
+    assert not store._creating
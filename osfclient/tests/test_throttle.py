@@ -0,0 +1,91 @@
+"""Test bandwidth limiting"""
+import io
+import threading
+import time
+
+from mock import patch, MagicMock
+
+from osfclient import OSF
+from osfclient import throttle
+from osfclient.models import Storage
+from osfclient.throttle import BandwidthLimiter
+from osfclient.throttle import ThrottledReader
+from osfclient.upload import UploadStream
+
+from osfclient.tests.mocks import FakeResponse
+
+
+def test_limiter_rate():
+    limiter = BandwidthLimiter(100000, burst=10000)
+
+    start = time.time()
+    for _ in range(3):
+        limiter.consume(10000)
+    elapsed = time.time() - start
+
+    # the first chunk is covered by the burst, the other two take 0.1s each
+    assert 0.15 < elapsed < 1
+
+
+def test_limiter_fair_share():
+    limiter = BandwidthLimiter(1000000, burst=10000)
+    order = []
+
+    def transfer(name, n_chunks):
+        for _ in range(n_chunks):
+            limiter.consume(10000)
+            order.append(name)
+
+    big = threading.Thread(target=transfer, args=('big', 20))
+    small = threading.Thread(target=transfer, args=('small', 3))
+    big.start()
+    time.sleep(0.02)
+    small.start()
+    big.join()
+    small.join()
+
+    assert order.count('small') == 3
+    # the small transfer did not have to wait for the big one to finish
+    last_small = len(order) - 1 - order[::-1].index('small')
+    assert last_small < len(order) - 5
+
+
+def test_throttled_reader():
+    limiter = MagicMock()
+    fp = io.BytesIO(b'hello world')
+    fp.read(6)
+
+    with patch('osfclient.throttle.get_local_file_size', return_value=11):
+        reader = ThrottledReader(fp, limiter)
+        assert len(reader) == 5
+
+    assert reader.read() == b'world'
+    limiter.consume.assert_called_once_with(5)
+
+
+def test_create_file_is_throttled():
+    store = Storage({})
+    store._new_file_url = 'https://files.osf.io/v1/resources/9zpcy/'
+    store._put = MagicMock(return_value=FakeResponse(201, None))
+
+    fake_fp = MagicMock()
+    fake_fp.mode = 'rb'
+
+    throttle.set_bandwidth_limit(1024)
+    try:
+        store.create_file('foo.txt', fake_fp)
+    finally:
+        throttle.set_bandwidth_limit(None)
+
+    body = store._put.call_args[1]['data']
+    assert isinstance(body, UploadStream)
+    assert body._limiter.rate == 1024
+
+
+def test_osf_sets_bandwidth_limit():
+    try:
+        OSF(bandwidth_limit=2048)
+        assert throttle.get_limiter().rate == 2048
+    finally:
+        throttle.set_bandwidth_limit(None)
+    assert throttle.get_limiter() is None
@@ -0,0 +1,127 @@
+"""Test concurrent transfers"""
+import threading
+import time
+
+from mock import ANY, call, MagicMock
+
+import pytest
+
+from osfclient.scheduler import CostModel
+from osfclient.transfer import create_folders
+from osfclient.transfer import run_bounded
+from osfclient.transfer import upload_files
+
+
+def _fake_store():
+    # a storage whose folders record their own path
+    created = []
+    lock = threading.Lock()
+
+    def create_folder(path, exist_ok=False):
+        with lock:
+            created.append(path)
+        folder = MagicMock(name='Folder-%s' % path)
+        folder.path = path
+        return folder
+
+    store = MagicMock(name='Storage')
+    store.create_folder.side_effect = create_folder
+    store._created = created
+    return store
+
+
+def test_create_folders_parents_first():
+    store = _fake_store()
+
+    folders = create_folders(store, ['a/b/c', 'a/d', 'e', '.'], jobs=4)
+
+    created = store._created
+    assert sorted(created) == ['a', 'a/b', 'a/b/c', 'a/d', 'e']
+    for path in created:
+        if '/' in path:
+            parent = path.rsplit('/', 1)[0]
+            assert created.index(parent) < created.index(path)
+    assert folders['a/b/c'].path == 'a/b/c'
+
+
+def test_upload_files(tmpdir):
+    store = _fake_store()
+    uploads = []
+    for name in ('one.txt', 'two.txt', 'three.txt'):
+        local = tmpdir.join(name)
+        local.write(name)
+        uploads.append((str(local), 'BAR/./sub/' + name))
+
+    scheduler = upload_files(store, uploads, jobs=3, update=True)
+
+    store.session.set_pool_size.assert_called_once_with(3)
+    assert store._created == ['BAR', 'BAR/sub']
+    assert store.create_file.call_count == 3
+    for _, remote in uploads:
+        assert call(remote, ANY, force=False, update=True, progress=ANY) in \
+            store.create_file.mock_calls
+    assert scheduler.n_done == 3
+    assert 'Uploaded 3 files' in scheduler.summary()
+
+
+def test_upload_files_skipped_are_not_observed(tmpdir):
+    store = _fake_store()
+    # the first file is uploaded, the second is unchanged
+    store.create_file.side_effect = [True, False]
+    uploads = []
+    for name in ('one.txt', 'two.txt'):
+        local = tmpdir.join(name)
+        local.write(name)
+        uploads.append((str(local), name))
+    model = CostModel()
+
+    scheduler = upload_files(store, uploads, jobs=1, update=True,
+                             model=model)
+
+    assert model.n_observed == 1
+    assert scheduler.n_done == 1
+    assert scheduler.n_skipped == 1
+    assert scheduler.summary().endswith('Skipped 1 unchanged files.')
+
+
+def test_upload_files_raises_first_error(tmpdir):
+    store = _fake_store()
+    store.create_file.side_effect = RuntimeError('foo.txt')
+    local = tmpdir.join('foo.txt')
+    local.write('foo')
+
+    with pytest.raises(RuntimeError):
+        upload_files(store, [(str(local), 'foo.txt')], jobs=2)
+
+
+def test_run_bounded():
+    lock = threading.Lock()
+    running = []
+    most = []
+    listed = []
+
+    def items():
+        for i in range(20):
+            listed.append(i)
+            yield i
+
+    def work(i):
+        with lock:
+            running.append(i)
+            most.append(len(running))
+            # never more items listed than running plus queued
+            assert len(listed) - i <= 6
+        time.sleep(0.001)
+        with lock:
+            running.remove(i)
+        if i % 7 == 0:
+            raise ValueError(i)
+
+    done = []
+    failed = run_bounded(work, items(), jobs=2, max_pending=4,
+                         done=done.append)
+
+    assert sorted(item for item, _ in failed) == [0, 7, 14]
+    assert all(isinstance(error, ValueError) for _, error in failed)
+    assert sorted(done + [0, 7, 14]) == list(range(20))
+    assert max(most) <= 2
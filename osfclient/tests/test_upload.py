@@ -0,0 +1,191 @@
+"""Test hashing and verification of upload bodies"""
+import hashlib
+import io
+import os
+import threading
+
+import pytest
+
+from mock import MagicMock
+
+from osfclient.exceptions import ChecksumMismatchException
+from osfclient.models import Storage
+from osfclient.throttle import BandwidthLimiter
+from osfclient.upload import StreamSource
+from osfclient.upload import UploadStream
+from osfclient.upload import upload_source
+
+from osfclient.tests.fake_waterbutler import FakeWaterButler
+from osfclient.tests.mocks import FakeResponse
+
+
+DATA = b'hello world' * 1000
+
+
+def _hashes(data):
+    return {'md5': hashlib.md5(data).hexdigest(),
+            'sha256': hashlib.sha256(data).hexdigest()}
+
+
+def _response(hashes):
+    return FakeResponse(201, {'data': {'attributes': {
+        'extra': {'hashes': hashes}}}})
+
+
+def test_hashes_and_progress():
+    sent = []
+    body = UploadStream(io.BytesIO(DATA), progress=sent.append)
+
+    while body.read(4096):
+        pass
+
+    assert body.hexdigests() == _hashes(DATA)
+    assert body.n_bytes == len(DATA) == sum(sent)
+    assert len(sent) == 3
+
+
+def test_limiter_is_used():
+    limiter = BandwidthLimiter(10**9)
+    body = UploadStream(io.BytesIO(DATA), limiter)
+
+    body.read()
+
+    assert body.n_bytes == len(DATA)
+
+
+def test_verify():
+    body = UploadStream(io.BytesIO(DATA))
+    body.read()
+
+    body.verify(_response(_hashes(DATA)))
+    # providers without hashes are not checked
+    body.verify(_response({}))
+    body.verify(FakeResponse(201, None))
+
+    with pytest.raises(ChecksumMismatchException) as e:
+        body.verify(_response(_hashes(b'jello')), 'foo.txt')
+
+    assert 'md5' in str(e.value)
+    assert 'foo.txt' in str(e.value)
+
+
+def test_upload_is_verified(tmpdir):
+    local = tmpdir.join('foo.txt')
+    local.write_binary(DATA)
+    sent = []
+
+    with FakeWaterButler() as wb:
+        store = Storage({})
+        store._new_file_url = wb.url
+
+        with open(str(local), 'rb') as fp:
+            store.create_file('foo.txt', fp, progress=sent.append)
+
+        wb.corrupt = 1
+        with open(str(local), 'rb') as fp:
+            with pytest.raises(ChecksumMismatchException):
+                store.create_file('bar.txt', fp)
+
+    assert wb.files['foo.txt'] == DATA
+    assert sum(sent) == len(DATA)
+
+
+def test_progress_rewinds_on_retry(tmpdir):
+    local = tmpdir.join('foo.txt')
+    local.write_binary(DATA)
+    sent = []
+
+    with FakeWaterButler() as wb:
+        wb.errors = [503]
+        store = Storage({})
+        store._new_file_url = wb.url
+        store.session.set_upload_retries(1, backoff=0)
+
+        with open(str(local), 'rb') as fp:
+            store.create_file('foo.txt', fp, progress=sent.append)
+
+    assert sum(sent) == len(DATA)
+    assert -len(DATA) in sent
+
+
+def test_stream_source():
+    stream = StreamSource(iter([b'abc', b'', b'defg']))
+
+    assert stream.peek() == b'abc'
+    assert stream.read(2) == b'ab'
+    assert stream.tell() == 2
+    assert stream.read(5) == b'c'
+    assert stream.read() == b'defg'
+    assert stream.read(1) == b''
+    assert not stream.seekable()
+    with pytest.raises(io.UnsupportedOperation):
+        stream.seek(0)
+
+
+def test_upload_source():
+    fp = io.BytesIO(DATA)
+    assert upload_source(fp) is fp
+
+    with pytest.raises(ValueError):
+        upload_source(io.StringIO(u'text'))
+
+    pipe = MagicMock(spec=['read', 'seekable', 'mode'], mode='rb')
+    pipe.seekable.return_value = False
+    assert isinstance(upload_source(pipe), StreamSource)
+    assert isinstance(upload_source(iter([DATA])), StreamSource)
+
+
+def test_upload_generator_chunked():
+    chunks = [DATA[i:i + 1000] for i in range(0, len(DATA), 1000)]
+
+    with FakeWaterButler() as wb:
+        store = Storage({})
+        store._new_file_url = wb.url
+        # streams can not be rewound, so they are never retried
+        store.session.set_upload_retries(3, backoff=0)
+
+        store.create_file('foo.txt', (chunk for chunk in chunks))
+        wb.errors = [503]
+        with pytest.raises(RuntimeError):
+            store.create_file('bar.txt', iter(chunks))
+
+    assert wb.files == {'foo.txt': DATA}
+    assert wb.chunked == [True, True]
+
+
+def test_upload_empty_stream():
+    with FakeWaterButler() as wb:
+        store = Storage({})
+        store._new_file_url = wb.url
+
+        store.create_file('foo.txt', iter([]))
+
+    assert wb.files == {'foo.txt': b''}
+
+
+def test_update_from_stream_needs_force():
+    store = Storage({})
+
+    with pytest.raises(ValueError):
+        store.create_file('foo.txt', iter([DATA]), update=True)
+
+
+def test_upload_from_pipe():
+    read_fd, write_fd = os.pipe()
+    writer = threading.Thread(target=lambda: _write_and_close(write_fd))
+    writer.start()
+
+    with FakeWaterButler() as wb:
+        store = Storage({})
+        store._new_file_url = wb.url
+        with io.open(read_fd, 'rb') as pipe:
+            store.create_file('foo.txt', pipe)
+
+    writer.join()
+    assert wb.files == {'foo.txt': DATA}
+    assert wb.chunked == [True]
+
+
+def _write_and_close(fd):
+    with io.open(fd, 'wb') as f:
+        f.write(DATA)
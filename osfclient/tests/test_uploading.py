@@ -1,6 +1,8 @@
 """Test `osf upload` command"""
+import os
 
 import mock
+from mock import ANY
 from mock import call
 from mock import patch
 from mock import mock_open
@@ -9,6 +11,9 @@ import pytest
 
 from osfclient import OSF
 from osfclient.cli import upload
+from osfclient.hashcache import get_hash_cache
+from osfclient.journal import UploadJournal
+from osfclient.models import OSFSession
 
 from osfclient.tests.mocks import MockArgs
 from osfclient.tests.mocks import MockProject
@@ -54,7 +59,8 @@ def test_select_project(OSF_project):
     # assert fake_project.mock_calls == expected
 
     expected = [call.create_file('bar/bar/foo.txt', fake_open.return_value,
-                                 force=False, update=False)]
+                                 force=False, update=False,
+                                 progress=mock.ANY)]
     # we should call the create_file method on the return
     # value of _storage_mock
     assert fake_project._storage_mock.return_value.mock_calls == expected
@@ -119,10 +125,14 @@ def test_recursive_upload(OSF_project):
     assert len(fake_open.mock_calls) == 4 + 4*2
 
     fake_storage.assert_has_calls([
-        call.create_file('BAR/./bar.txt', mock.ANY, force=False, update=False),
-        call.create_file('BAR/./abc.txt', mock.ANY, force=False, update=False),
-        call.create_file('BAR/baz/bar.txt', mock.ANY, force=False, update=False),
-        call.create_file('BAR/baz/abc.txt', mock.ANY, force=False, update=False)
+        call.create_file('BAR/./bar.txt', mock.ANY, force=False, update=False,
+                         progress=mock.ANY),
+        call.create_file('BAR/./abc.txt', mock.ANY, force=False, update=False,
+                         progress=mock.ANY),
+        call.create_file('BAR/baz/bar.txt', mock.ANY, force=False, update=False,
+                         progress=mock.ANY),
+        call.create_file('BAR/baz/abc.txt', mock.ANY, force=False, update=False,
+                         progress=mock.ANY)
         ])
     # two directories with two files each -> four calls
     assert len(fake_storage.mock_calls) == 4
@@ -177,3 +187,142 @@ def test_recursive_upload_with_subdir(OSF_project):
         ])
     # two directories with two files each -> four calls
     assert len(fake_storage.mock_calls) == 4
+
+
+@patch('osfclient.cli.upload_files')
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_recursive_upload_jobs(OSF_project, upload_files):
+    # with --jobs the files are handed to the concurrent upload engine
+    args = MockArgs(username='joe@example.com',
+                    project='1234',
+                    source='foobar/',
+                    recursive=True,
+                    destination='BAR/',
+                    jobs=4)
+
+    def simple_getenv(key):
+        if key == 'OSF_PASSWORD':
+            return 'secret'
+
+    fake_storage = OSF_project.return_value.storage.return_value
+    dir_contents = [('foobar/', None, ['bar.txt']),
+                    ('foobar/baz', None, ['abc.txt'])
+                    ]
+
+    with patch('os.walk', return_value=iter(dir_contents)):
+        with patch('osfclient.cli.os.getenv', side_effect=simple_getenv):
+            with patch('osfclient.cli.os.path.isdir', return_value=True):
+                upload(args)
+
+    upload_files.assert_called_once_with(
+        fake_storage,
+        [('foobar/bar.txt', 'BAR/./bar.txt'),
+         ('foobar/baz/abc.txt', 'BAR/baz/abc.txt')],
+        4, force=False, update=False, journal=None, model=ANY)
+    assert fake_storage.create_file.call_count == 0
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_recursive_upload_resume(OSF_project, tmpdir):
+    # files recorded in the journal of an earlier run are skipped
+    source = tmpdir.mkdir('foobar')
+    source.join('bar.txt').write('bar')
+    source.join('baz.txt').write('baz')
+    journal_file = str(tmpdir.join('upload.journal'))
+
+    journal = UploadJournal(journal_file)
+    journal.record(str(source.join('bar.txt')), 'BAR/foobar/./bar.txt',
+                   os.stat(str(source.join('bar.txt'))))
+    journal.close()
+
+    args = MockArgs(username='joe@example.com',
+                    project='1234',
+                    source=str(source),
+                    recursive=True,
+                    destination='BAR/',
+                    resume=True,
+                    retries=3)
+
+    def simple_getenv(key):
+        if key == 'OSF_PASSWORD':
+            return 'secret'
+
+    fake_storage = OSF_project.return_value.storage.return_value
+
+    with patch('osfclient.cli.os.getenv', side_effect=simple_getenv):
+        with patch('osfclient.cli.journal_path', return_value=journal_file):
+            with patch.object(OSFSession, 'set_upload_retries') as retries:
+                upload(args)
+
+    retries.assert_called_once_with(3)
+    assert fake_storage.create_file.call_count == 1
+    assert fake_storage.create_file.call_args[0][0] == 'BAR/foobar/./baz.txt'
+    # the upload is complete, the journal is gone
+    assert not os.path.exists(journal_file)
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_upload_stdin(OSF_project):
+    args = MockArgs(username='joe@example.com',
+                    project='1234',
+                    source='-',
+                    destination='osfstorage/foo.tar')
+
+    def simple_getenv(key):
+        if key == 'OSF_PASSWORD':
+            return 'secret'
+
+    fake_stdin = mock.MagicMock()
+    fake_open = mock_open()
+
+    with patch('osfclient.cli.open', fake_open):
+        with patch('osfclient.cli.sys.stdin', fake_stdin):
+            with patch('osfclient.cli.os.getenv', side_effect=simple_getenv):
+                upload(args)
+
+    assert fake_open.call_count == 0
+    fake_storage = OSF_project.return_value._storage_mock.return_value
+    assert fake_storage.mock_calls == [
+        call.create_file('foo.tar', fake_stdin.buffer, force=False,
+                         update=False, progress=mock.ANY)]
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_upload_stdin_update(OSF_project):
+    # standard input can not be compared with the remote file
+    args = MockArgs(username='joe@example.com', project='1234', source='-',
+                    destination='osfstorage/foo.tar', update=True)
+
+    with patch('osfclient.cli.sys.stdin', mock.MagicMock()):
+        with patch('osfclient.cli.os.getenv', return_value='secret'):
+            with pytest.raises(SystemExit) as e:
+                upload(args)
+
+    assert '--force instead of --update' in e.value.code
+    fake_storage = OSF_project.return_value._storage_mock.return_value
+    assert not fake_storage.create_file.called
+
+
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_update_hashes_lazily(OSF_project):
+    # local files are only hashed by create_file, with an in-memory hash
+    # cache that is dropped afterwards
+    args = MockArgs(username='joe@example.com', project='1234',
+                    source='foo/bar.txt', destination='bar/foo.txt',
+                    update=True)
+    caches = []
+
+    def create_file(*args, **kwargs):
+        caches.append(get_hash_cache())
+
+    store = OSF_project.return_value._storage_mock.return_value
+    store.create_file.side_effect = create_file
+
+    with patch('osfclient.cli.open', mock_open()):
+        with patch('osfclient.cli.os.getenv', return_value='secret'):
+            with patch('osfclient.cli.checksum_many') as checksum_many:
+                upload(args)
+
+    assert not checksum_many.called
+    assert caches[0].path == ':memory:'
+    assert get_hash_cache() is None
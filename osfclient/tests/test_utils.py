@@ -1,10 +1,19 @@
+import hashlib
+import os
+
 from mock import call, patch, Mock
 
+import pytest
+
 from osfclient.utils import file_empty
 from osfclient.utils import norm_remote_path
 from osfclient.utils import makedirs
 from osfclient.utils import split_storage
 from osfclient.utils import is_path_matched
+from osfclient.utils import parse_size
+from osfclient.utils import link_or_copy
+from osfclient.utils import checksum
+from osfclient.utils import checksum_many
 
 
 def test_default_storage():
@@ -203,3 +212,102 @@ def test_is_path_matched():
                                {'attributes': {'materialized_path': 'p1/-p2-/'}})
     assert is_path_matched('p1/%p2/',
                            {'attributes': {'materialized_path': 'p1/-p2/p3/'}})
+
+
+def test_parse_size():
+    assert parse_size('123') == 123
+    assert parse_size('2k') == 2048
+    assert parse_size('1.5M') == 1536 * 1024
+    assert parse_size('10GiB') == 10 * 1024 ** 3
+    assert parse_size(42) == 42
+    with pytest.raises(ValueError):
+        parse_size('ten')
+
+
+def test_link_or_copy_falls_back_to_copy(tmpdir):
+    src = tmpdir.join('src.txt')
+    src.write('hello')
+    dst = tmpdir.join('dst.txt')
+
+    with patch('osfclient.utils.os.link', side_effect=OSError):
+        with patch('osfclient.utils.reflink', side_effect=OSError):
+            link_or_copy(str(src), str(dst))
+
+    assert dst.read() == 'hello'
+
+
+def test_link_or_copy_hard_links(tmpdir):
+    src = tmpdir.join('src.txt')
+    src.write('hello')
+    dst = tmpdir.join('dst.txt')
+
+    link_or_copy(str(src), str(dst))
+
+    assert dst.read() == 'hello'
+    assert os.stat(str(src)).st_ino == os.stat(str(dst)).st_ino
+
+
+def _make_files(tmpdir, n):
+    paths = []
+    for i in range(n):
+        path = str(tmpdir.join('f%d' % i))
+        with open(path, 'wb') as f:
+            f.write(b'x' * i * 1000)
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_checksum_many(tmpdir, processes):
+    paths = _make_files(tmpdir, 5)
+
+    results = dict(checksum_many(paths, ('md5', 'sha256'), workers=2,
+                                 processes=processes, block_size=4096))
+
+    assert sorted(results) == sorted(paths)
+    for i, path in enumerate(paths):
+        assert results[path] == {
+            'md5': hashlib.md5(b'x' * i * 1000).hexdigest(),
+            'sha256': hashlib.sha256(b'x' * i * 1000).hexdigest()}
+
+
+def test_checksum_many_errors(tmpdir):
+    paths = _make_files(tmpdir, 2) + [str(tmpdir.join('missing'))]
+
+    with pytest.raises(OSError):
+        list(checksum_many(paths))
+
+    results = dict(checksum_many(paths, ignore_errors=True))
+    assert sorted(results) == sorted(paths[:2])
+
+
+def test_checksum_many_invalid_hash_type():
+    with pytest.raises(ValueError):
+        list(checksum_many(['foo'], ('sha1',)))
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_checksum_several_hash_types(tmpdir, use_mmap):
+    path = str(tmpdir.join('data'))
+    data = os.urandom(100000)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    hashes = checksum(path, ['md5', 'sha256'], block_size=4096,
+                      use_mmap=use_mmap)
+
+    assert hashes == {'md5': hashlib.md5(data).hexdigest(),
+                      'sha256': hashlib.sha256(data).hexdigest()}
+    assert checksum(path, 'sha256', use_mmap=use_mmap) == hashes['sha256']
+
+
+def test_checksum_empty_file_mmap(tmpdir):
+    path = str(tmpdir.join('empty'))
+    open(path, 'wb').close()
+
+    assert checksum(path, use_mmap=True) == hashlib.md5(b'').hexdigest()
+
+
+def test_checksum_invalid_hash_type(tmpdir):
+    with pytest.raises(ValueError):
+        checksum(str(tmpdir.join('data')), ['md5', 'sha1'])
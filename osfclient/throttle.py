@@ -0,0 +1,106 @@
+"""Bandwidth limiting for transfers
+
+One `BandwidthLimiter` is shared by all up- and downloads of a process. Set
+it with `set_bandwidth_limit()` (or `osf --limit-rate`).
+"""
+import threading
+import time
+
+from .utils import get_local_file_size
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
+_limiter = None
+
+
+class BandwidthLimiter(object):
+    """Token bucket limiting the transfer rate to `rate` bytes per second.
+
+    Transfers call `consume()` for every chunk they move. Callers are
+    served strictly in the order they arrive, so a transfer has to wait
+    for every other active transfer to get its chunk before it gets its
+    next one. This shares the bandwidth fairly: one large file can not
+    starve many small ones.
+
+    Up to `burst` bytes (default: a tenth of a second worth of data) can be
+    sent without waiting after a pause.
+    """
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate has to be positive.")
+        self.rate = float(rate)
+        if burst is None:
+            burst = max(rate / 10., 16 * 1024)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._last = _clock()
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def _refill(self):
+        now = _clock()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def consume(self, nbytes):
+        """Block until `nbytes` may be transferred."""
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving:
+                self._cond.wait()
+
+            try:
+                # chunks larger than the burst go into debt, the following
+                # callers wait until it is paid off
+                needed = min(nbytes, self.burst)
+                self._refill()
+                while self._tokens < needed:
+                    self._cond.wait((needed - self._tokens) / self.rate)
+                    self._refill()
+                self._tokens -= nbytes
+            finally:
+                self._serving += 1
+                self._cond.notify_all()
+
+
+class ThrottledReader(object):
+    """Read from `fp` no faster than `limiter` allows.
+
+    Used as the body of uploads. It reports the remaining size of `fp` as
+    its length so `requests` still sends a Content-Length header.
+    """
+    def __init__(self, fp, limiter):
+        self._fp = fp
+        self._limiter = limiter
+        self.mode = getattr(fp, 'mode', 'rb')
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        if data and self._limiter is not None:
+            self._limiter.consume(len(data))
+        return data
+
+    def __len__(self):
+        return get_local_file_size(self._fp) - self._fp.tell()
+
+
+def set_bandwidth_limit(rate):
+    """Limit all transfers of this process to `rate` bytes per second.
+
+    Pass None to remove the limit.
+    """
+    global _limiter
+    if rate is None:
+        _limiter = None
+    else:
+        _limiter = BandwidthLimiter(rate)
+
+
+def get_limiter():
+    """Return the active `BandwidthLimiter` or None."""
+    return _limiter
+
@@ -0,0 +1,205 @@
+"""Concurrent transfers
+
+Worker pools that move many files at once. All workers share the session
+of the storage they work on.
+"""
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from concurrent.futures import wait
+import os
+import threading
+import time
+
+from tqdm import tqdm
+
+from .scheduler import UploadScheduler
+from .utils import norm_remote_path
+
+
+class Progress(object):
+    """Aggregate progress bar for many files.
+
+    Counts files and shows the rate in files per second as well as the
+    throughput in MB/s. Bytes can be reported as they are transferred with
+    `sent` or once a file is done with `update`. Safe to update from
+    several threads.
+    """
+    def __init__(self, total=None):
+        self._bar = tqdm(total=total, unit='files')
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self.n_bytes = 0
+        self.n_files = 0
+
+    def _set_rate(self, refresh):
+        elapsed = max(time.time() - self._start, 1e-6)
+        self._bar.set_postfix_str(
+            '{:.2f} MB/s'.format(self.n_bytes / elapsed / 1e6),
+            refresh=refresh)
+
+    def sent(self, n_bytes):
+        """Count `n_bytes` transferred for a file that is not done yet."""
+        with self._lock:
+            self.n_bytes += n_bytes
+            self._set_rate(refresh=False)
+
+    def update(self, n_bytes=0):
+        """Count a finished file and its `n_bytes` not reported with `sent`."""
+        with self._lock:
+            self.n_bytes += n_bytes
+            self._set_rate(refresh=False)
+            self.n_files += 1
+            self._bar.update(1)
+
+    def close(self):
+        self._bar.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _run_all(pool, func, items):
+    """Call `func` for each item on `pool`, yield results as they finish.
+
+    Stops scheduling new work and raises the first exception that occurs.
+    """
+    futures = [pool.submit(func, item) for item in items]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def run_bounded(func, items, jobs, max_pending=None, done=None):
+    """Call `func` for each item of the iterable `items` on `jobs` threads.
+
+    `items` is consumed lazily with at most `max_pending` (default
+    `4 * jobs`) items submitted but not finished, so a slow listing
+    overlaps with the work on the items it produced so far.
+
+    A failing call does not stop the others. `done` is called with every
+    item that succeeded, a list of (item, exception) pairs of the calls
+    that failed is returned.
+    """
+    if max_pending is None:
+        max_pending = 4 * jobs
+    failed = []
+    pending = {}
+
+    def collect(futures):
+        for future in futures:
+            item = pending.pop(future)
+            error = future.exception()
+            if error is not None:
+                failed.append((item, error))
+            elif done is not None:
+                done(item)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        try:
+            for item in items:
+                while len(pending) >= max_pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                pending[pool.submit(func, item)] = item
+            collect(as_completed(list(pending)))
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+    return failed
+
+
+def create_folders(store, paths, jobs=1):
+    """Create the remote folders `paths` in `store`.
+
+    Parents are created before their children, all folders at the same
+    depth are created concurrently. The folders end up in the folder cache
+    of `store`. Returns a dict mapping each path to its folder.
+    """
+    folders = {'': store}
+    by_depth = {}
+    for path in paths:
+        path = norm_remote_path(path)
+        while path and path != '.' and path not in folders:
+            folders[path] = None
+            by_depth.setdefault(path.count('/'), []).append(path)
+            path = os.path.dirname(path)
+
+    def create(path):
+        return path, store.create_folder(path, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for depth in sorted(by_depth):
+            for path, folder in _run_all(pool, create, by_depth[depth]):
+                folders[path] = folder
+
+    return folders
+
+
+def upload_files(store, files, jobs, force=False, update=False,
+                 journal=None, model=None):
+    """Upload many local files to `store` using `jobs` threads.
+
+    `files` is a list of (local path, remote path) pairs. The remote folders
+    are created first, then the files are uploaded concurrently with
+    `Storage.create_file`, which is passed `force` and `update`. Finished
+    files are recorded in the `UploadJournal` `journal` if given.
+
+    The order of the uploads is decided by an `UploadScheduler` using the
+    `CostModel` `model`, the scheduler is returned so its `summary()` can
+    be reported.
+    """
+    store.session.set_pool_size(jobs)
+    create_folders(store,
+                   [os.path.dirname(norm_remote_path(remote))
+                    for _, remote in files],
+                   jobs)
+
+    scheduler = UploadScheduler(
+        [(item, os.path.getsize(item[0])) for item in files], jobs,
+        model=model)
+    progress = Progress(total=len(files))
+
+    def upload(item):
+        local_path, remote_path = item
+        st = os.stat(local_path)
+        start = time.time()
+        with open(local_path, 'rb') as fp:
+            uploaded = store.create_file(remote_path, fp, force=force,
+                                         update=update,
+                                         progress=progress.sent)
+        # unchanged files took no time to transfer, do not learn from them
+        if uploaded is False:
+            scheduler.skip(st.st_size)
+        else:
+            scheduler.done(st.st_size, time.time() - start)
+        if journal is not None:
+            journal.record(local_path, remote_path, st)
+        progress.update()
+
+    def worker(index):
+        try:
+            while True:
+                item = scheduler.next(index)
+                if item is None:
+                    break
+                upload(item[0])
+        except BaseException:
+            scheduler.cancel()
+            raise
+
+    with progress:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for _ in _run_all(pool, worker, range(jobs)):
+                pass
+
+    return scheduler
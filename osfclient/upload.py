@@ -0,0 +1,176 @@
+"""Upload bodies
+
+`UploadStream` is what file uploads hand to `requests`. It reads the local
+file once and, on the way, applies the bandwidth limit, reports progress
+and hashes the data so the upload can be verified against the hashes the
+server reports for the stored file.
+
+Sources that can not be seeked, like pipes or generators of bytes, are
+wrapped in a `StreamSource` by `upload_source` and sent with chunked
+transfer encoding, so they never have to be staged on disk.
+"""
+import hashlib
+import io
+
+from .exceptions import ChecksumMismatchException
+from .throttle import ThrottledReader
+
+
+HASH_TYPES = ('md5', 'sha256')
+
+# bytes read at a time from streams of unknown length
+CHUNK_SIZE = 2**20
+
+
+def is_seekable(fp):
+    """True if `fp` can be rewound to retry an upload."""
+    try:
+        return fp.seekable()
+    except AttributeError:
+        # python 2 files have no seekable()
+        try:
+            fp.tell()
+        except (AttributeError, IOError, OSError):
+            return False
+        return True
+
+
+class StreamSource(object):
+    """Binary file-like view of a non-seekable stream or iterable of bytes.
+
+    Supports what uploads need: `read`, `peek` and `tell`. It can only be
+    rewound as long as nothing has been read from it.
+    """
+    mode = 'rb'
+
+    def __init__(self, source):
+        if hasattr(source, 'read'):
+            self._chunks = None
+            self._source = source
+        else:
+            self._chunks = iter(source)
+        self.name = getattr(source, 'name', '<stream>')
+        self._buffer = b''
+        self._pos = 0
+
+    def _next_chunk(self, size):
+        if self._chunks is None:
+            return self._source.read(size)
+        for chunk in self._chunks:
+            if chunk:
+                return bytes(chunk)
+        return b''
+
+    def peek(self, size=1):
+        if not self._buffer:
+            self._buffer = self._next_chunk(max(size, CHUNK_SIZE))
+        return self._buffer
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self._buffer]
+            chunk = self._next_chunk(CHUNK_SIZE)
+            while chunk:
+                chunks.append(chunk)
+                chunk = self._next_chunk(CHUNK_SIZE)
+            data = b''.join(chunks)
+            self._buffer = b''
+        else:
+            data = self._buffer or self._next_chunk(size)
+            data, self._buffer = data[:size], data[size:]
+        self._pos += len(data)
+        return data
+
+    def tell(self):
+        return self._pos
+
+    def seekable(self):
+        return False
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if (offset, whence) != (self._pos, io.SEEK_SET):
+            raise io.UnsupportedOperation('streams can not be rewound')
+        return self._pos
+
+
+def upload_source(source):
+    """Return `source` as a binary file-like object to upload.
+
+    Seekable files opened in binary mode are returned as they are. Other
+    streams, e.g. `sys.stdin.buffer`, and iterables of bytes are wrapped in
+    a `StreamSource`.
+    """
+    if hasattr(source, 'read'):
+        if isinstance(source, io.TextIOBase) or \
+           'b' not in getattr(source, 'mode', 'b'):
+            raise ValueError("File has to be opened in binary mode.")
+        if is_seekable(source):
+            return source
+    return StreamSource(source)
+
+
+class UploadStream(ThrottledReader):
+    """Read `fp` for an upload, hashing and counting what is sent.
+
+    `limiter` is a `BandwidthLimiter` or None, `progress` is called with
+    the number of bytes of every chunk that is read.
+    """
+    def __init__(self, fp, limiter=None, progress=None):
+        super(UploadStream, self).__init__(fp, limiter)
+        self._progress = progress
+        self._hashes = dict((hash_type, hashlib.new(hash_type))
+                            for hash_type in HASH_TYPES)
+        self.n_bytes = 0
+
+    def read(self, size=-1):
+        data = super(UploadStream, self).read(size)
+        if data:
+            for hash_ in self._hashes.values():
+                hash_.update(data)
+            self.n_bytes += len(data)
+            if self._progress is not None:
+                self._progress(len(data))
+        return data
+
+    def __len__(self):
+        try:
+            return super(UploadStream, self).__len__()
+        except (AttributeError, IOError, OSError, ValueError):
+            # unknown, requests falls back to chunked transfer encoding
+            raise TypeError('length of the upload is unknown')
+
+    def __bool__(self):
+        # requests tests the body, which must not depend on its length
+        return True
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        while True:
+            data = self.read(CHUNK_SIZE)
+            if not data:
+                break
+            yield data
+
+    def hexdigests(self):
+        """Digests of everything read so far by hash type."""
+        return dict((hash_type, hash_.hexdigest())
+                    for hash_type, hash_ in self._hashes.items())
+
+    def verify(self, response, path=None):
+        """Compare what was sent with the hashes in the upload `response`.
+
+        WaterButler reports the hashes of the stored file in the JSON it
+        returns for a successful upload. Providers that do not are not
+        checked. Raises `ChecksumMismatchException` on a mismatch.
+        """
+        try:
+            remote = response.json()['data']['attributes']['extra']['hashes']
+            remote = dict(remote)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return
+        for hash_type, digest in sorted(self.hexdigests().items()):
+            remote_digest = remote.get(hash_type)
+            if remote_digest and remote_digest.lower() != digest:
+                raise ChecksumMismatchException(path, hash_type, digest,
+                                                remote_digest)
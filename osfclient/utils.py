@@ -3,12 +3,35 @@
 Helpers and other assorted functions.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+import errno
 import hashlib
+import mmap
+import multiprocessing
 import os
+import re
+import shutil
 import six
+import sys
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .filters import PathPattern
+
 
 KNOWN_PROVIDERS = ['osfstorage', 'github', 'figshare', 'googledrive']
 
+# ioctl request to clone a file on Linux (btrfs, XFS, ...), from linux/fs.h
+FICLONE = 0x40049409
+
+# reads for batch hashing, a multiple of the page size
+HASH_BLOCK_SIZE = 1024 * 1024
+
 
 def norm_remote_path(path):
     """Normalize `path`.
@@ -22,6 +45,13 @@ def norm_remote_path(path):
         return path
 
 
+def user_cache_dir():
+    """Directory for osfclient's caches in the user's cache directory."""
+    cache_home = os.getenv('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'osfclient')
+
+
 def split_storage(path, default='osfstorage', normalize=True):
     """Extract storage name from file path.
 
@@ -70,29 +100,197 @@ def file_empty(fp):
         return not fp.peek()
 
 
-def checksum(file_path, hash_type='md5', block_size=65536):
+def checksum(file_path, hash_type='md5', block_size=65536, use_mmap=False):
     """Returns either the md5 or sha256 hash of a file at `file_path`.
 
     md5 is the default hash_type as it is faster than sha256
 
+    `hash_type` can also be a list like ``['md5', 'sha256']``, all digests
+    are then computed in a single pass over the file and returned as a dict
+    mapping hash type to digest.
+
     The default block size is 64 kb, which appears to be one of a few command
     choices according to https://stackoverflow.com/a/44873382/2680. The code
-    below is an extension of the example presented in that post.
+    below is an extension of the example presented in that post. Larger
+    blocks or `use_mmap=True` need fewer system calls, see
+    ``benchmarks/checksum.py``.
+
+    If a hash cache is set (see `osfclient.hashcache`) unchanged files are
+    not read again.
     """
-    if hash_type == 'md5':
-        hash_ = hashlib.md5()
-    elif hash_type == 'sha256':
-        hash_ = hashlib.sha256()
-    else:
-        raise ValueError(
-            "{} is an invalid hash_type. Expected 'md5' or 'sha256'."
-            .format(hash_type)
-        )
+    single = isinstance(hash_type, six.string_types)
+    hash_types = [hash_type] if single else list(hash_type)
+    for hash_type_ in hash_types:
+        if hash_type_ not in ('md5', 'sha256'):
+            raise ValueError(
+                "{} is an invalid hash_type. Expected 'md5' or 'sha256'."
+                .format(hash_type_)
+            )
+
+    # imported here, the hash cache module uses these utilities itself
+    from .hashcache import get_hash_cache
+    cache = get_hash_cache()
+    hashes = None
+    if cache is not None:
+        hashes = dict((hash_type_, cache.get(file_path, hash_type_))
+                      for hash_type_ in hash_types)
+        if not all(hashes.values()):
+            st = os.stat(file_path)
+            hashes = None
+
+    if hashes is None:
+        hashes = _hash_file(file_path, hash_types, block_size, use_mmap)
+        if cache is not None:
+            cache.put(file_path, hashes, st)
+
+    if single:
+        return hashes[hash_type]
+    return hashes
+
+
+def _hash_file(file_path, hash_types, block_size=HASH_BLOCK_SIZE,
+               use_mmap=False):
+    """Compute all `hash_types` of the file at `file_path` in one read."""
+    hashes = [(hash_type, hashlib.new(hash_type)) for hash_type in hash_types]
+    with open(file_path, 'rb', buffering=0) as f:
+        if use_mmap and os.fstat(f.fileno()).st_size:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(data)
+            try:
+                for start in range(0, len(data), block_size):
+                    for _, hash_ in hashes:
+                        hash_.update(view[start:start + block_size])
+            finally:
+                # the mmap can not be closed while it is exported
+                if hasattr(view, 'release'):
+                    view.release()
+                data.close()
+        else:
+            buf = bytearray(block_size)
+            view = memoryview(buf)
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                for _, hash_ in hashes:
+                    hash_.update(view[:n])
+    return dict((hash_type, hash_.hexdigest()) for hash_type, hash_ in hashes)
+
+
+def checksum_many(paths, hash_types=('md5',), workers=None, processes=False,
+                  block_size=HASH_BLOCK_SIZE, ignore_errors=False):
+    """Hash many files concurrently.
+
+    Yields `(path, hashes)` tuples in the order the files are finished,
+    `hashes` maps each of `hash_types` to the digest. Uses `workers`
+    threads (hashing releases the GIL), or processes if `processes` is
+    True. Files found in the hash cache are not read.
+
+    Errors reading a file are raised, or the file is left out of the
+    results if `ignore_errors` is True.
+    """
+    for hash_type in hash_types:
+        if hash_type not in ('md5', 'sha256'):
+            raise ValueError(
+                "{} is an invalid hash_type. Expected 'md5' or 'sha256'."
+                .format(hash_type)
+            )
+    if workers is None:
+        workers = min(32, multiprocessing.cpu_count() + 4)
 
-    with open(file_path, 'rb') as f:
-        for block in iter(lambda: f.read(block_size), b''):
-            hash_.update(block)
-    return hash_.hexdigest()
+    from .hashcache import get_hash_cache
+    cache = get_hash_cache()
+
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor(max_workers=workers) as pool:
+        futures = {}
+        for path in paths:
+            if cache is not None:
+                hashes = dict((hash_type, cache.get(path, hash_type))
+                              for hash_type in hash_types)
+                if all(hashes.values()):
+                    yield path, hashes
+                    continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                if ignore_errors:
+                    continue
+                raise
+            future = pool.submit(_hash_file, path, hash_types, block_size)
+            futures[future] = (path, st)
+
+        try:
+            for future in as_completed(futures):
+                path, st = futures[future]
+                try:
+                    hashes = future.result()
+                except (IOError, OSError):
+                    if ignore_errors:
+                        continue
+                    raise
+                if cache is not None:
+                    cache.put(path, hashes, st)
+                yield path, hashes
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def parse_size(size):
+    """Convert a human readable size like `10G` or `512k` to bytes.
+
+    Suffixes are powers of 1024, a plain number is a number of bytes.
+    """
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$',
+                     str(size), re.IGNORECASE)
+    if match is None:
+        raise ValueError("{} is not a valid size.".format(size))
+    number, unit = match.groups()
+    exponent = ' kmgt'.index(unit.lower() or ' ')
+    return int(float(number) * 1024 ** exponent)
+
+
+def reflink(src, dst):
+    """Make `dst` a copy-on-write clone of `src`.
+
+    Only works on Linux file systems that support reflinks, raises an
+    `OSError` everywhere else.
+    """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported.")
+    with open(src, 'rb') as fsrc:
+        with open(dst, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except (IOError, OSError):
+                os.remove(dst)
+                raise
+
+
+def link_or_copy(src, dst):
+    """Make `dst` a hard link to `src`, or a reflink, or a copy.
+
+    Hard links fail across file systems and on some platforms, in that
+    case a copy-on-write clone is tried before copying the contents.
+    """
+    try:
+        os.link(src, dst)
+        return
+    except (OSError, AttributeError):
+        pass
+    try:
+        reflink(src, dst)
+    except (IOError, OSError):
+        shutil.copyfile(src, dst)
+
+
+def mtime_ns(st):
+    """Modification time in nanoseconds from the `os.stat` result `st`."""
+    mtime_ns = getattr(st, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(st.st_mtime * 1e9)
+    return mtime_ns
 
 
 def get_local_file_size(fp):
@@ -102,29 +300,20 @@ def get_local_file_size(fp):
     return os.fstat(fp.fileno()).st_size
 
 
+# compiled patterns of `is_path_matched`
+_path_patterns = {}
+
+
 def is_path_matched(target_file_path, fileobj):
-    file_path = fileobj['attributes']['materialized_path']
+    """True if `fileobj` from a listing matches the `%` pattern.
+
+    Compiled patterns are cached, use `filters.PathPattern` directly to
+    filter many files.
+    """
     if target_file_path is None:
         return True
-    file_path_segs = file_path.split('/')
-    target_file_path_segs = target_file_path.split('/')
-    if file_path_segs[-1] == '':
-        file_path_segs = file_path_segs[:-1]
-    if target_file_path_segs[-1] == '':
-        target_file_path_segs = target_file_path_segs[:-1]
-    for target_file_path_seg, file_path_seg in zip(target_file_path_segs,
-                                                   file_path_segs):
-        if target_file_path_seg.startswith('%') and \
-           target_file_path_seg.endswith('%'):
-            if target_file_path_seg[1:-1] not in file_path_seg:
-                return False
-        elif target_file_path_seg.startswith('%'):
-            if not file_path_seg.endswith(target_file_path_seg[1:]):
-                return False
-        elif target_file_path_seg.endswith('%'):
-            if not file_path_seg.startswith(target_file_path_seg[:-1]):
-                return False
-        else:
-            if file_path_seg != target_file_path_seg:
-                return False
-    return True
+    pattern = _path_patterns.get(target_file_path)
+    if pattern is None:
+        pattern = _path_patterns[target_file_path] = \
+            PathPattern(target_file_path)
+    return pattern(fileobj)
@@ -72,6 +72,11 @@ setup(
     # https://packaging.python.org/en/latest/requirements.html
     install_requires=required,
 
+    # Optional features and the packages they need
+    extras_require={
+        'fsspec': ['fsspec'],
+    },
+
     # To provide executable scripts, use entry points in preference to the
     # "scripts" keyword. Entry points provide cross-platform support and allow
     # pip to create the appropriate form of executable for the target platform.
@@ -79,5 +84,8 @@ setup(
         'console_scripts': [
             'osf=osfclient.__main__:main',
         ],
+        'fsspec.specs': [
+            'osf=osfclient.filesystem:OSFFileSystem',
+        ],
     },
 )